@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""End-to-end benchmarks against a local fake jira.
+
+A mindmap of the requested shape is generated, then every case runs in a
+fresh interpreter so its peak RSS is its own:
+
+- ``untangle``: node_tree_with_depth over an untangle parse
+- ``stream``: node_tree over the streaming loader
+- ``encode``: to_jira_dct of the templates and the payload of every issue
+- ``run``: mindmap_to_jira, issues created on the fake jira
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH = Path(__file__).absolute().parent
+SRC = BENCH.parent / "src"
+sys.path[:0] = [str(BENCH), str(SRC)]
+
+from fake_jira import FakeJira  # noqa: E402
+from generate_mm import Generator, add_shape_args, shape_from_args  # noqa: E402
+
+CASES = ["untangle", "stream", "encode", "run"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def make_config(args: argparse.Namespace, url: str, working_dir: str):
+    """MMConfig for the fake jira, no prompts."""
+    from jira_freeplane.mm_settings import MMConfig
+
+    return MMConfig(
+        working_dir=working_dir,
+        project_parent_issue_key="PROJ-0",
+        jira_url=url,
+        project_key="PROJ",
+        reporter="bench",
+        noprompt=True,
+        mm_file=Path(args.mm_file),
+        skip_optional=True,
+        dry_run=False,
+        workers=args.workers,
+        state_backend="sqlite",
+        transport=args.transport,
+        rate_limit=args.rate_limit,
+        epic_link_mode=args.epic_link_mode,
+    )
+
+
+def run_case(args: argparse.Namespace) -> dict:
+    """Run one case in this process, returns its measurements."""
+    from jira_freeplane.common import LOG
+    from jira_freeplane.loader import iter_mindmap
+    from jira_freeplane.mm import node_payload, node_tree, node_tree_with_depth
+
+    LOG.disabled = True
+    fake = FakeJira(args.latency, args.throttle_every)
+    with fake, tempfile.TemporaryDirectory() as wd:
+        # a run pays for loading the metadata, the parse cases do not
+        start = time.perf_counter()
+        conf = make_config(args, fake.url, wd)
+        issue_types = [conf.TYPE_EPIC, conf.TYPE_TASK, conf.TYPE_SUBTASK]
+        setup_calls = 0 if args.case == "run" else fake.total_calls
+        if args.case != "run":
+            start = time.perf_counter()
+        if args.case == "untangle":
+            import untangle
+
+            root = untangle.parse(args.mm_file).map.node
+            count = sum(1 for _ in node_tree_with_depth(conf, root))
+        elif args.case == "stream":
+            count = sum(1 for _ in node_tree(conf, iter_mindmap(conf.mm_file)))
+        elif args.case == "encode":
+            nodes = list(node_tree(conf, iter_mindmap(conf.mm_file)))
+            start = time.perf_counter()
+            for _type in issue_types:
+                conf.jira.to_jira_dct(conf.data_dct[_type])
+            count = 0
+            for node in nodes:
+                if node.depth_type in issue_types:
+                    node_payload(conf, node, "PROJ-1")
+                    count += 1
+        else:
+            from jira_freeplane.runtime import mindmap_to_jira
+
+            mindmap_to_jira(conf)
+            count = len(fake.issues)
+        elapsed = time.perf_counter() - start
+        conf.state.close()
+        conf.jira.close()
+        calls = fake.total_calls - setup_calls
+        return {
+            "case": args.case,
+            "items": count,
+            "wall_s": round(elapsed, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "http_calls": calls,
+            "http_calls_per_issue": round(calls / len(fake.issues), 3)
+            if fake.issues
+            else None,
+            "throttled": fake.throttled,
+            "endpoints": dict(fake.calls) if args.case == "run" else None,
+        }
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_shape_args(parser)
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument(
+        "--throttle-every", type=int, default=0, help="answer every Nth request with 429"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--transport", default="rest")
+    parser.add_argument("--rate-limit", type=float, default=0)
+    parser.add_argument("--epic-link-mode", default="batch")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--mm-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault("JIRA_USER", "bench")
+    os.environ.setdefault("JIRA_PASS", "bench")
+    if args.case:
+        print(json.dumps(run_case(args)))
+        return
+
+    shape = shape_from_args(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        mm_file = Generator(shape).write(Path(tmp) / "bench.mm")
+        mm_bytes = mm_file.stat().st_size
+        results = []
+        for case in args.cases:
+            cmd = [sys.executable, __file__, *sys.argv[1:]]
+            cmd += ["--case", case, "--mm-file", str(mm_file)]
+            out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True)
+            results.append(json.loads(out.stdout.splitlines()[-1]))
+    print(
+        json.dumps(
+            {
+                "nodes": shape.nodes,
+                "issues": shape.issues,
+                "mm_bytes": mm_bytes,
+                "results": results,
+            },
+            indent=4,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cold start import time of the cli.
+
+Every sample imports the cli module in a fresh interpreter, without jira
+credentials, and reports which heavy dependencies were loaded on the way.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).absolute().parent.parent / "src"
+
+# dependencies that should only load once a command needs them
+HEAVY = [
+    "jira",
+    "requests",
+    "simple_term_menu",
+    "yaml",
+    "untangle",
+    "importlib.metadata",
+]
+
+PROBE = f"""
+import json, sys
+import jira_freeplane.runtime
+print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))
+"""
+
+
+def sample(env: dict, code: str = PROBE) -> float:
+    """Time one fresh interpreter running ``code``, returns seconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", "-n", type=int, default=20, help="number of samples")
+    args = parser.parse_args()
+
+    env = {k: v for k, v in os.environ.items() if not k.startswith("JIRA_")}
+    env["PYTHONPATH"] = os.pathsep.join([str(SRC), env.get("PYTHONPATH", "")])
+    baseline = [sample(env, "pass") for _ in range(3)]
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True
+    )
+    loaded = json.loads(out.stdout)
+    times = [sample(env) for _ in range(args.runs)]
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "median_ms": round(statistics.median(times) * 1000, 1),
+                "min_ms": round(min(times) * 1000, 1),
+                "interpreter_ms": round(min(baseline) * 1000, 1),
+                "heavy_loaded": loaded,
+            },
+            indent=4,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
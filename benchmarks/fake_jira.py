@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""In-process fake jira server.
+
+Serves the endpoints jira-freeplane uses: server info, createmeta (legacy
+and paginated), create, bulk create, update, issue links and search.  Every
+request can be delayed by ``latency`` seconds, and every ``throttle_every``
+th request is rejected with a 429 and a ``Retry-After`` header.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+def field(
+    fid: str,
+    name: str,
+    required: bool = False,
+    typ: str = "string",
+    operations: Tuple[str, ...] = ("set",),
+    allowed: Optional[List[Dict[str, str]]] = None,
+    items: str = "",
+) -> Dict[str, Any]:
+    """createmeta field."""
+    dat = {
+        "required": required,
+        "schema": {"type": typ, "system": fid},
+        "name": name,
+        "fieldId": fid,
+        "operations": list(operations),
+    }  # type: Dict[str, Any]
+    if items:
+        dat["schema"]["items"] = items
+    if allowed is not None:
+        dat["allowedValues"] = allowed
+    return dat
+
+
+COMMON = [
+    field("summary", "Summary", True),
+    field("description", "Description"),
+    field(
+        "project",
+        "Project",
+        True,
+        "project",
+        allowed=[{"key": "PROJ", "name": "Project", "id": "100"}],
+    ),
+    field("issuetype", "Issue Type", True, "issuetype"),
+    field("reporter", "Reporter", True, "user"),
+    field(
+        "components",
+        "Component/s",
+        False,
+        "array",
+        ("add", "set", "remove"),
+        [{"name": "api", "id": "1"}, {"name": "ui", "id": "2"}],
+        "component",
+    ),
+    field("labels", "Labels", False, "array", ("add", "set", "remove"), None, "string"),
+    field("issuelinks", "Linked Issues", False, "array", ("add",), None, "issuelinks"),
+]
+
+ISSUE_TYPES = {
+    "Epic": ("10000", COMMON + [field("customfield_10002", "Epic Name", True)]),
+    "Task": ("10001", COMMON + [field("customfield_10001", "Epic Link", False, "any")]),
+    "Sub-task": ("10002", COMMON + [field("parent", "Parent", True, "issuelink")]),
+}
+
+LINK_TYPES = [
+    {
+        "id": "1",
+        "name": "Parent",
+        "inward": "is child task of",
+        "outward": "is parent task of",
+        "self": "/rest/api/2/issueLinkType/1",
+    }
+]
+
+
+class FakeJira:
+    """Fake jira server, listening on localhost."""
+
+    def __init__(
+        self, latency: float = 0.0, throttle_every: int = 0, retry_after: float = 0.05
+    ) -> None:
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.issues = {}  # type: Dict[str, Dict[str, Any]]
+        self.links = []  # type: List[Dict[str, Any]]
+        # old key -> new key of moved issues
+        self.moved = {}  # type: Dict[str, str]
+        self.calls = Counter()  # type: Counter
+        self.throttled = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._requests = 0
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def url(self) -> str:
+        """Base url of the server."""
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def total_calls(self) -> int:
+        """Number of answered requests, throttled ones excluded."""
+        return sum(self.calls.values())
+
+    def start(self) -> "FakeJira":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeJira":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def create(self, fields: Dict[str, Any]) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Create an issue, returns the response or the field errors."""
+        if not fields.get("summary"):
+            return None, {"summary": "You must specify a summary of the issue."}
+        with self._lock:
+            num = next(self._keys)
+            key = f"PROJ-{num}"
+            self.issues[key] = fields
+        return {"id": str(num), "key": key, "self": f"{self.url}/rest/api/2/issue/{num}"}, None
+
+    def update(self, key: str, body: Dict[str, Any]) -> None:
+        """Apply the fields and the add, remove and set operations of an edit."""
+        with self._lock:
+            fields = self.issues[key]
+            fields.update(body.get("fields", {}))
+            for name, operations in body.get("update", {}).items():
+                values = list(fields.get(name) or [])
+                for operation in operations:
+                    for verb, value in operation.items():
+                        if verb == "add":
+                            values.append(value)
+                        elif verb == "remove" and value in values:
+                            values.remove(value)
+                        elif verb == "set":
+                            values = list(value)
+                fields[name] = values
+
+    def add_links(self, key: str, update: Dict[str, Any]) -> None:
+        """Record the links of an update section."""
+        for link in update.get("issuelinks", []):
+            add = dict(link["add"])
+            add.setdefault("inwardIssue", {"key": key})
+            add.setdefault("outwardIssue", {"key": key})
+            with self._lock:
+                self.links.append(add)
+
+    def move(self, key: str, project: str) -> str:
+        """Move an issue to another project, returns its new key."""
+        with self._lock:
+            new_key = f"{project}-{next(self._keys)}"
+            self.issues[new_key] = self.issues.pop(key)
+            self.moved[key] = new_key
+            # links follow the issue
+            for link in self.links:
+                for side in ["inwardIssue", "outwardIssue"]:
+                    if link[side]["key"] == key:
+                        link[side] = {"key": new_key}
+        return new_key
+
+    def search(self, jql: str) -> List[str]:
+        """Keys matching a ``key in (...)`` or ``labels in (...)`` query."""
+        if jql.lstrip().startswith("labels"):
+            labels = set(re.findall(r'"([^"]+)"', jql))
+            return [
+                k for k, f in self.issues.items() if labels & set(f.get("labels") or [])
+            ]
+        keys = [self.moved.get(k, k) for k in re.findall(r"[A-Z]+-\d+", jql)]
+        return [k for k in keys if k in self.issues]
+
+    def issue_links(self, key: str) -> List[Dict[str, Any]]:
+        """Links of an issue."""
+        with self._lock:
+            return [
+                link
+                for link in self.links
+                if key in (link["inwardIssue"]["key"], link["outwardIssue"]["key"])
+            ]
+
+    def _throttle(self) -> bool:
+        with self._lock:
+            self._requests += 1
+            if self.throttle_every and self._requests % self.throttle_every == 0:
+                self.throttled += 1
+                return True
+        return False
+
+    def _handler(self) -> type:
+        jira = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler."""
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+                pass
+
+            def _send(self, code: int, body: Any = None, headers: Dict = None) -> None:
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                with jira._lock:
+                    jira.bytes_out += len(data)
+
+            def _body(self) -> Dict[str, Any]:
+                size = int(self.headers.get("Content-Length") or 0)
+                data = self.rfile.read(size)
+                with jira._lock:
+                    jira.bytes_in += size
+                return json.loads(data or b"{}")
+
+            def _route(self, method: str) -> None:
+                if jira.latency:
+                    time.sleep(jira.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                path = url.path
+                if jira._throttle():
+                    self._body()
+                    return self._send(
+                        429,
+                        {"errorMessages": ["Rate limit exceeded"]},
+                        {"Retry-After": str(jira.retry_after)},
+                    )
+                endpoint = re.sub(r"[A-Z]+-\d+|(?<=/)\d+$", "{id}", path)
+                with jira._lock:
+                    jira.calls[f"{method} {endpoint}"] += 1
+                if path.endswith("/auth/1/session"):
+                    return self._send(
+                        200,
+                        {"name": "bench", "self": f"{jira.url}/rest/api/2/user?username=bench"},
+                    )
+                if path.endswith("/serverInfo"):
+                    return self._send(
+                        200,
+                        {
+                            "version": "8.20.0",
+                            "versionNumbers": [8, 20, 0],
+                            "deploymentType": "Server",
+                            "baseUrl": jira.url,
+                        },
+                    )
+                if path.endswith("/field"):
+                    return self._send(200, [])
+                if path.endswith("/issueLinkType"):
+                    return self._send(200, {"issueLinkTypes": LINK_TYPES})
+                if path.endswith("/issue/createmeta"):
+                    names = ",".join(query.get("issuetypeNames", [""])).split(",")
+                    types = [
+                        {
+                            "id": ISSUE_TYPES[name][0],
+                            "name": name,
+                            "fields": {f["fieldId"]: f for f in ISSUE_TYPES[name][1]},
+                        }
+                        for name in names
+                        if name in ISSUE_TYPES
+                    ]
+                    return self._send(
+                        200, {"projects": [{"key": "PROJ", "issuetypes": types}]}
+                    )
+                match = re.search(r"/issue/createmeta/[^/]+/issuetypes(?:/(\w+))?$", path)
+                if match:
+                    start = int(query.get("startAt", ["0"])[0])
+                    limit = int(query.get("maxResults", ["50"])[0])
+                    if match.group(1):
+                        values = [
+                            f
+                            for type_id, fields in ISSUE_TYPES.values()
+                            if type_id == match.group(1)
+                            for f in fields
+                        ]
+                    else:
+                        values = [
+                            {"id": type_id, "name": name}
+                            for name, (type_id, _) in ISSUE_TYPES.items()
+                        ]
+                    return self._send(
+                        200,
+                        {
+                            "startAt": start,
+                            "maxResults": limit,
+                            "total": len(values),
+                            "isLast": start + limit >= len(values),
+                            "values": values[start : start + limit],
+                        },
+                    )
+                if path.endswith("/issue/bulk"):
+                    issues, errors = [], []
+                    for index, update in enumerate(self._body()["issueUpdates"]):
+                        created, error = jira.create(update["fields"])
+                        if created is None:
+                            errors.append(
+                                {
+                                    "status": 400,
+                                    "elementErrors": {"errorMessages": [], "errors": error},
+                                    "failedElementNumber": index,
+                                }
+                            )
+                            continue
+                        jira.add_links(created["key"], update.get("update", {}))
+                        issues.append(created)
+                    return self._send(
+                        201 if issues else 400, {"issues": issues, "errors": errors}
+                    )
+                if path.endswith("/issue") and method == "POST":
+                    body = self._body()
+                    created, error = jira.create(body["fields"])
+                    if created is None:
+                        return self._send(400, {"errorMessages": [], "errors": error})
+                    jira.add_links(created["key"], body.get("update", {}))
+                    return self._send(201, created)
+                if path.endswith("/issueLink"):
+                    link = self._body()
+                    with jira._lock:
+                        jira.links.append(link)
+                    return self._send(201)
+                match = re.search(r"/issue/([A-Z]+-\d+)$", path)
+                if match:
+                    key = jira.moved.get(match.group(1), match.group(1))
+                    if key not in jira.issues:
+                        self._body()
+                        return self._send(404, {"errorMessages": ["Issue Does Not Exist"]})
+                    if method == "PUT":
+                        jira.update(key, self._body())
+                        return self._send(204)
+                    fields = dict(
+                        jira.issues[key],
+                        status={"name": "Open"},
+                        issuelinks=jira.issue_links(key),
+                    )
+                    return self._send(
+                        200, {"id": key.split("-")[1], "key": key, "fields": fields}
+                    )
+                if path.endswith("/search"):
+                    body = self._body() if method == "POST" else {}
+                    jql = body.get("jql") or query.get("jql", [""])[0]
+                    start = int(body.get("startAt", 0))
+                    limit = int(body.get("maxResults", 50))
+                    keys = jira.search(jql)
+                    found = [
+                        {
+                            "key": k,
+                            "fields": {
+                                # other requested fields as they were set
+                                **{
+                                    name: jira.issues[k].get(name)
+                                    for name in body.get("fields") or []
+                                },
+                                "status": {"name": "Open"},
+                                "parent": jira.issues[k].get("parent"),
+                                "labels": jira.issues[k].get("labels") or [],
+                                "issuelinks": jira.issue_links(k),
+                            },
+                        }
+                        for k in keys[start : start + limit]
+                    ]
+                    return self._send(
+                        200,
+                        {
+                            "startAt": start,
+                            "maxResults": limit,
+                            "total": len(keys),
+                            "issues": found,
+                        },
+                    )
+                self._body()
+                return self._send(404, {"errorMessages": [f"No fake for {method} {path}"]})
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                self._route("GET")
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                self._route("POST")
+
+            def do_PUT(self) -> None:  # pylint: disable=invalid-name
+                self._route("PUT")
+
+        return Handler
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Generate synthetic freeplane mindmaps.
+
+The shape is epics x tasks x sub-tasks, every sub-task holding a checklist
+``checklist_width`` wide and ``checklist_depth`` deep.  Epics, tasks and
+sub-tasks get a rich content note of about ``note_bytes`` characters.
+"""
+import argparse
+import itertools
+from pathlib import Path
+from typing import Iterator, List
+from xml.sax.saxutils import quoteattr
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+
+class Shape:
+    """Mindmap shape."""
+
+    def __init__(
+        self,
+        epics: int = 10,
+        tasks: int = 10,
+        subtasks: int = 5,
+        checklist_depth: int = 2,
+        checklist_width: int = 3,
+        note_bytes: int = 200,
+    ) -> None:
+        self.epics = epics
+        self.tasks = tasks
+        self.subtasks = subtasks
+        self.checklist_depth = checklist_depth
+        self.checklist_width = checklist_width
+        self.note_bytes = note_bytes
+
+    @property
+    def issues(self) -> int:
+        """Number of issues the map turns into."""
+        return self.epics * (1 + self.tasks * (1 + self.subtasks))
+
+    @property
+    def nodes(self) -> int:
+        """Number of nodes in the map, root included."""
+        checklist = sum(
+            self.checklist_width ** level
+            for level in range(1, self.checklist_depth + 1)
+        )
+        return 1 + self.issues + self.epics * self.tasks * self.subtasks * checklist
+
+
+def note(size: int, seed: int) -> List[str]:
+    """Note paragraphs of about ``size`` characters."""
+    lines = []
+    words = itertools.cycle(WORDS[seed % len(WORDS) :] + WORDS[: seed % len(WORDS)])
+    total = 0
+    while total < size:
+        line = " ".join(next(words) for _ in range(8))
+        lines.append(line)
+        total += len(line)
+    return lines
+
+
+class Generator:
+    """Write the XML of a mindmap, node by node."""
+
+    def __init__(self, shape: Shape) -> None:
+        self.shape = shape
+        self.ids = itertools.count(1)
+
+    def _open(self, text: str, link: str = "") -> str:
+        attrs = f"TEXT={quoteattr(text)} ID=\"ID_{next(self.ids)}\""
+        if link:
+            attrs += f" LINK={quoteattr(link)}"
+        return f"<node {attrs}>"
+
+    def _note(self, seed: int) -> Iterator[str]:
+        if not self.shape.note_bytes:
+            return
+        yield '<richcontent TYPE="NOTE">\n<html>\n  <head>\n  </head>\n  <body>'
+        for line in note(self.shape.note_bytes, seed):
+            yield f"    <p>\n      {line}\n    </p>"
+        yield "  </body>\n</html>\n</richcontent>"
+
+    def _checklist(self, prefix: str, depth: int) -> Iterator[str]:
+        if depth > self.shape.checklist_depth:
+            return
+        for i in range(self.shape.checklist_width):
+            text = f"{prefix}.{i + 1}"
+            link = f"https://example.com/{text}" if i == 0 else ""
+            yield self._open(f"Check {text}", link)
+            yield from self._checklist(text, depth + 1)
+            yield "</node>"
+
+    def lines(self) -> Iterator[str]:
+        """Lines of the mindmap file."""
+        shape = self.shape
+        yield '<map version="freeplane 1.9.0">'
+        yield self._open("Benchmark Project")
+        for e in range(shape.epics):
+            yield self._open(f"Epic {e + 1}")
+            yield from self._note(e)
+            for t in range(shape.tasks):
+                yield self._open(f"Task {e + 1}.{t + 1}")
+                yield from self._note(t)
+                for s in range(shape.subtasks):
+                    name = f"{e + 1}.{t + 1}.{s + 1}"
+                    yield self._open(f"Sub-task {name}")
+                    yield from self._note(s)
+                    yield from self._checklist(name, 1)
+                    yield "</node>"
+                yield "</node>"
+            yield "</node>"
+        yield "</node>"
+        yield "</map>"
+
+    def write(self, path: Path) -> Path:
+        """Write the mindmap to ``path``."""
+        with path.open("w") as f:
+            for line in self.lines():
+                f.write(line + "\n")
+        return path
+
+
+def add_shape_args(parser: argparse.ArgumentParser) -> None:
+    """Add the shape options to a parser."""
+    parser.add_argument("--epics", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per epic")
+    parser.add_argument("--subtasks", type=int, default=5, help="sub-tasks per task")
+    parser.add_argument("--checklist-depth", type=int, default=2)
+    parser.add_argument("--checklist-width", type=int, default=3)
+    parser.add_argument(
+        "--note-bytes", type=int, default=200, help="note size, 0 for no notes"
+    )
+
+
+def shape_from_args(args: argparse.Namespace) -> Shape:
+    """Shape from parsed options."""
+    return Shape(
+        args.epics,
+        args.tasks,
+        args.subtasks,
+        args.checklist_depth,
+        args.checklist_width,
+        args.note_bytes,
+    )
+
+
+def main():
+    """Run main function."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_shape_args(parser)
+    parser.add_argument("output", type=str, help="path of the .mm file")
+    args = parser.parse_args()
+    shape = shape_from_args(args)
+    Generator(shape).write(Path(args.output))
+    print(f"{args.output}: {shape.nodes} nodes, {shape.issues} issues")
+
+
+if __name__ == "__main__":
+    main()
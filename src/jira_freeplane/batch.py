@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Mindmaps of a batch run.
+
+A batch is either a directory or a manifest file.  In a directory every
+``<name>.mm`` is paired with ``<name>.ini`` next to it, or the default
+project.ini.  A manifest has a ``<mm_file> [project.ini]`` line per map,
+paths relative to the manifest, blank lines and ``#`` comments are skipped.
+
+Mindmaps whose project.ini point to the same working directory and parent
+issue share their state, they are synced one after another.
+"""
+import json
+import shlex
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from jira_freeplane.common import atomic_write
+
+
+def read_batch(source: Path, default_ini: Optional[Path]) -> List[Tuple[Path, Path]]:
+    """(mindmap, project.ini) pairs of a directory or manifest."""
+    pairs = []  # type: List[Tuple[Path, Optional[Path]]]
+    if source.is_dir():
+        for mm_file in sorted(source.glob("*.mm")):
+            ini = mm_file.with_suffix(".ini")
+            pairs.append((mm_file, ini if ini.exists() else default_ini))
+    else:
+        for num, line in enumerate(source.read_text().splitlines(), 1):
+            parts = shlex.split(line, comments=True)
+            if not parts:
+                continue
+            if len(parts) > 2:
+                raise SystemExit(f"{source}:{num}: expected <mm_file> [project.ini]")
+            mm_file = source.parent / parts[0]
+            ini = source.parent / parts[1] if len(parts) > 1 else default_ini
+            pairs.append((mm_file, ini))
+    errors = []
+    for mm_file, ini in pairs:
+        if not mm_file.exists():
+            errors.append(f"{mm_file} does not exist")
+        if ini is None:
+            errors.append(f"{mm_file} has no project.ini, pass one with --config")
+        elif not ini.exists():
+            errors.append(f"{ini} of {mm_file} does not exist")
+    if errors:
+        raise SystemExit("\n".join(errors))
+    if not pairs:
+        raise SystemExit(f"{source} has no mindmaps")
+    return pairs  # type: ignore
+
+
+def state_groups(pairs: List[Tuple[Path, Path]]) -> List[List[Tuple[Path, Path]]]:
+    """Split pairs into groups that can be synced concurrently, in order.
+
+    A mindmap listed twice for the same state is rejected, it would be
+    synced twice and reported once.
+    """
+    groups = {}  # type: Dict[Tuple[str, str], List[Tuple[Path, Path]]]
+    seen = {}  # type: Dict[Tuple[Path, Tuple[str, str]], Path]
+    errors = []
+    for mm_file, ini in pairs:
+        config = ConfigParser()
+        config.read(ini)
+        key = (
+            str(Path(config.get("jira", "working_dir", fallback=".")).absolute()),
+            config.get("jira", "project_parent_issue_key", fallback=""),
+        )
+        state = (mm_file.absolute(), key)
+        if state in seen:
+            errors.append(
+                f"{mm_file} is listed twice for {key[0]} {key[1]}, "
+                f"with {seen[state]} and {ini}"
+            )
+        seen[state] = ini
+        groups.setdefault(key, []).append((mm_file, ini))
+    if errors:
+        raise SystemExit("\n".join(errors))
+    return list(groups.values())
+
+
+def write_report(path: Path, report: Dict[str, Any]) -> None:
+    """Write the batch report, atomically."""
+    atomic_write(path, json.dumps(report, indent=4) + "\n")
@@ -1,12 +1,49 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Common variables."""
+import hashlib
 import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
 
 logging.basicConfig()
 LOG = logging.getLogger("JIRA Mindmap CLI")
 LOG.setLevel(logging.INFO)
 
+def file_digest(path: Path) -> str:
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_open(path: Path) -> Iterator[IO[str]]:
+    """Write a file that replaces ``path`` in one step once the block is done.
+
+    The file is unique to the writer, concurrent writers never mix.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def atomic_write(path: Path, text: str) -> None:
+    """Replace a file in one step, safe with concurrent writers."""
+    with atomic_open(path) as f:
+        f.write(text)
+
+
 def prompt_line(prompt):
     """Prompt user for input."""
     return input(f'Input {prompt}: ').strip()
@@ -41,3 +78,14 @@ AUTOFIELDS = [
     "Epic Name",
     "Parent",
 ]
+
+# createmeta field types / items we never set
+IGNORE = [
+    "attachment",
+    "issuelinks",
+]
+
+# createmeta field names we never set
+NAME_IGNORE = [
+    "Sprint",
+]
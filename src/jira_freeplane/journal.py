@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Write-ahead journal of issue creation.
+
+Before a create request is sent, the node is stored as pending with a unique
+marker, which is also sent as a label of the issue.  If the run dies before
+the returned key is stored, the next run finds the issue by its marker
+instead of creating it a second time.  The label stays on issues created
+normally, it is only removed from reconciled issues, or from every new issue
+with ``journal_cleanup``, at the cost of an edit request per issue.
+"""
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from jira_freeplane.common import LOG
+from jira_freeplane.libjira import SEARCH_PAGE_SIZE
+from jira_freeplane.mm import save_created
+from jira_freeplane.mm_settings import MMConfig
+from jira_freeplane.transport import TransportError
+
+# prefix of the marker labels
+MARKER_PREFIX = "jfp-"
+
+
+def new_marker() -> str:
+    """Unique marker label."""
+    return f"{MARKER_PREFIX}{uuid.uuid4().hex[:20]}"
+
+
+def mark_pending(
+    config: MMConfig,
+    node_id: str,
+    _type: str,
+    fields: Dict[str, Any],
+    working: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Record a node as pending, returns the fields with its marker label.
+
+    The state is only written, the caller commits it before sending the
+    request.  Issue types without a labels field are created unmarked.
+    """
+    field_id = config.marker_field(_type)
+    if field_id is None:
+        return fields
+    marker = config.state.get(node_id).get("marker") or new_marker()
+    fields = dict(fields)
+    fields[field_id] = list(fields.get(field_id) or []) + [marker]
+    config.state.put(node_id, {"marker": marker, "json_body": json.dumps(working)})
+    return fields
+
+
+def pending_nodes(config: MMConfig) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """Pending nodes by marker."""
+    return {
+        state["marker"]: (node_id, state)
+        for node_id, state in config.state.items()
+        if state.get("marker") and not state.get("key")
+    }
+
+
+def linked_keys(issue: Dict[str, Any]) -> List[str]:
+    """Keys of the issues linked to an issue."""
+    keys = []  # type: List[str]
+    for link in issue["fields"].get("issuelinks") or []:
+        for side in ["inwardIssue", "outwardIssue"]:
+            key = (link.get(side) or {}).get("key")
+            if key:
+                keys.append(key)
+    return keys
+
+
+def reconcile(config: MMConfig) -> int:
+    """Store the keys of pending issues that were created, returns the count.
+
+    Markers are looked up with a JQL search per ``SEARCH_PAGE_SIZE`` labels.
+    Pending nodes without an issue were never created, their marker is
+    cleared so they are created again.
+    """
+    pending = pending_nodes(config)
+    if not pending:
+        return 0
+    LOG.info("Reconciling %s issues pending from an earlier run...", len(pending))
+    markers = sorted(pending)
+    known = set(markers)
+    jqls = []  # type: List[str]
+    for start in range(0, len(markers), SEARCH_PAGE_SIZE):
+        chunk = markers[start : start + SEARCH_PAGE_SIZE]
+        jqls.append("labels in ({})".format(", ".join(f'"{m}"' for m in chunk)))
+    try:
+        results = config.jira.search_many(
+            jqls, ["labels", "issuelinks"], config.workers
+        )
+    except TransportError as e:
+        raise SystemExit(f"Could not reconcile pending issues: {e}") from e
+    found = 0
+    for issues in results:
+        for issue in issues:
+            for label in issue["fields"].get("labels") or []:
+                match = pending.pop(label, None)  # type: Optional[Tuple[str, Dict]]
+                if match is None:
+                    if label in known:
+                        LOG.warning(f"{issue['key']} duplicates the issue of {label}")
+                    continue
+                node_id, state = match
+                linked = config.project_parent_issue_key in linked_keys(issue)
+                working = json.loads(state.get("json_body") or "{}")
+                save_created(config, node_id, working, issue["key"], linked=linked)
+                found += 1
+    for node_id, _ in pending.values():
+        config.state.put(node_id, {"marker": ""})
+    config.state.commit()
+    LOG.info("Recovered %s issues, %s were never created", found, len(pending))
+    return found
+
+
+def clear_markers(config: MMConfig) -> int:
+    """Remove the marker labels of issues whose key and marker are stored.
+
+    Those are the issues reconciled after an interrupted run, or every new
+    issue with ``journal_cleanup``.  Returns the count.  A marker stays in
+    the state until its label is removed, a label that could not be removed
+    is retried by the next run.
+    """
+    fields = [config.marker_field(_type) for _type in config.data_dct]
+    field_id = next((field for field in fields if field), None)
+    done = [
+        (node_id, state["key"], state["marker"])
+        for node_id, state in config.state.items()
+        if state.get("marker") and state.get("key")
+    ]
+    if field_id is None or not done:
+        return 0
+    LOG.info("Removing the journal labels of %s issues...", len(done))
+    errors = config.jira.update_issues(
+        [(key, {}, {field_id: [{"remove": marker}]}) for _, key, marker in done],
+        config.workers,
+    )
+    cleared = 0
+    for (node_id, key, marker), error in zip(done, errors):
+        if error:
+            LOG.warning(f"Could not remove {marker} from {key}: {error}")
+            continue
+        config.state.put(node_id, {"marker": ""})
+        cleared += 1
+    config.state.commit()
+    return cleared
@@ -3,28 +3,62 @@
 """Interact with Jira."""
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, List, Union
-
-import jira
-import yaml
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Set, Tuple,
+                    Union)
 
 from jira_freeplane.common import AUTOFIELDS, LOG
+from jira_freeplane.metadata import (MetadataCache, createmeta_document,
+                                     keep_field)
+from jira_freeplane.metrics import Metrics
+from jira_freeplane.schema import (FieldSchema, PayloadTemplate,
+                                   allowed_value_map, cache_schema,
+                                   cached_schema, field_is_array,
+                                   field_is_ignored)
+from jira_freeplane.throttle import Throttle
+from jira_freeplane.transport import (TRANSPORTS, Transport, TransportError,
+                                      open_transport)
+
+# maximum number of issues jira accepts in a single bulk create request
+BULK_LIMIT = 50
+
+# page size used for paginated createmeta
+METADATA_PAGE_SIZE = 50
+
+# auto tries paginated createmeta first and falls back to legacy createmeta
+METADATA_APIS = ["auto", "paged", "legacy"]
+
+# batch links epics after creating them, embed links them in the create request
+EPIC_LINK_MODES = ["batch", "embed"]
+
+# link between an epic and the project parent issue
+PARENT_LINK = "is parent task of"
+
+# issues per JQL search page, also the number of keys or labels per query
+SEARCH_PAGE_SIZE = 100
+
+# methods that can safely be sent twice
+IDEMPOTENT = ["GET", "PUT", "DELETE"]
+
 
-USER = os.environ.get("JIRA_USER", "")
-PASS = os.environ.get("JIRA_PASS", "")
-JIRA_TOKEN = os.environ.get("JIRA_TOKEN")
-if not any([USER, PASS, JIRA_TOKEN]):
-    raise SystemExit("JIRA_USER, JIRA_PASS or JIRA_TOKEN not set")
+def credentials() -> Tuple[str, str]:
+    """Jira credentials from the environment, checked on first network use."""
+    user = os.environ.get("JIRA_USER", "")
+    password = os.environ.get("JIRA_PASS", "")
+    if not any([user, password, os.environ.get("JIRA_TOKEN")]):
+        raise SystemExit("JIRA_USER, JIRA_PASS or JIRA_TOKEN not set")
+    return user, password
 
-IGNORE = [
-    "attachment",
-    "issuelinks",
-]
 
-NAME_IGNORE = [
-    "Sprint",
-]
+def error_text(body: Dict[str, Any]) -> str:
+    """The ``errorMessages`` and field ``errors`` of a jira error body."""
+    parts = list(body.get("errorMessages") or [])
+    if body.get("errors"):
+        parts.append(json.dumps(body["errors"]))
+    return "; ".join(parts)
 
 
 class Field:
@@ -51,23 +85,9 @@ class Field:
         self.required = data["required"]
         self._allowed_values = data.get("allowedValues", [])
 
-    @property
+    @cached_property
     def allowed_values(self) -> Dict[str, Any]:
-        value_dict = {}
-
-        for value in self._allowed_values:
-            if "name" in value:
-                vname = value["name"]
-            elif "value" in value:
-                vname = value["value"]
-            else:
-                raise ValueError("name or value not found")
-            try:
-                value_dict[vname] = value["id"]
-            except KeyError as e:
-                LOG.error("!!!!ERROR!!!!", e, value)
-                return {}
-        return value_dict
+        return allowed_value_map(self._allowed_values)
 
     @property
     def is_user(self) -> bool:
@@ -125,24 +145,12 @@ class Field:
     @property
     def is_array(self) -> bool:
         """Is array."""
-        if self.schema["type"] == "array":
-            return True
-        if self.operations == ["set"]:
-            return False
-        if "add" in self.operations:
-            return True
-        return False
+        return field_is_array(self.schema, self.operations)
 
     @property
     def ignore(self) -> bool:
         """Ignore."""
-        _type = self.schema.get("type", "")
-        _items = self.schema.get("items", "")
-        if self.name in NAME_IGNORE:
-            return True
-        if _type in IGNORE or _items in IGNORE:
-            return True
-        return False
+        return field_is_ignored(self.name, self.schema)
 
     @property
     def out_dict(self) -> Dict[str, Any]:
@@ -159,6 +167,8 @@ class Field:
     @property
     def yaml_section(self) -> str:
         """Yaml output."""
+        import yaml  # only needed when writing templates
+
         if self.name in AUTOFIELDS:
             return ""
         dct = dict(self.out_dict)
@@ -201,6 +211,16 @@ class JiraInterface:
         jira_url: str,
         debug: bool = False,
         merge_values: Dict[str, Any] = None,  # type: ignore # template merge values
+        compile_cache: bool = True,
+        metadata_ttl: int = 86400,
+        metadata_api: str = "auto",
+        transport: str = "jira",
+        workers: int = 4,
+        rate_limit: float = 0,
+        max_retries: int = 5,
+        offline: bool = False,
+        metrics: Optional[Metrics] = None,
+        shared_cache_dir: Optional[Path] = None,
     ) -> None:
         if merge_values is None:
             self.merge_values = {}
@@ -209,61 +229,85 @@ class JiraInterface:
         self.debug = debug
         self.cache_dir = cache_dir
         self.jira_url = jira_url
-        self._inst = None
+        self.compile_cache = compile_cache
+        self.metadata = MetadataCache(
+            cache_dir, metadata_ttl, shared_cache_dir, jira_url
+        )
+        if metadata_api not in METADATA_APIS:
+            raise SystemExit(
+                f"Unknown metadata api: {metadata_api}, use one of {METADATA_APIS}"
+            )
+        self.metadata_api = metadata_api
+        self.wanted = {}  # type: Dict[Tuple[str, str], Set[str]]
+        # createmeta documents in use, by project and issue type
+        self._documents = {}  # type: Dict[Tuple[str, str], Dict[str, Any]]
+        self._metadata_lock = threading.Lock()
+        self._type_ids = {}  # type: Dict[str, Dict[str, str]]
+        if transport not in TRANSPORTS:
+            raise SystemExit(f"Unknown transport: {transport}, use one of {TRANSPORTS}")
+        self.transport_name = transport
+        self.workers = workers
+        self.offline = offline
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.throttle = Throttle(rate_limit, workers, max_retries, metrics=self.metrics)
+        self._link_types = None  # type: Optional[List[Dict[str, Any]]]
+        self._link_lock = threading.Lock()
+        self._transport = None  # type: Optional[Transport]
+        self._transport_lock = threading.Lock()
 
     @property
-    def inst(self) -> jira.JIRA:
-        if self._inst is None:
-            self._inst = jira.JIRA(
-                auth=(USER, PASS),
-                options={"server": self.jira_url},
+    def transport(self) -> Transport:
+        """Transport to the server, opened on first use."""
+        if self.offline:
+            raise SystemExit(
+                "Jira is needed but running offline, "
+                "run online once to fill the metadata cache"
             )
-        return self._inst
+        with self._transport_lock:
+            if self._transport is None:
+                self._transport = open_transport(
+                    self.transport_name,
+                    self.jira_url,
+                    credentials(),
+                    self.workers,
+                    self.metrics,
+                )
+        return self._transport
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Any = None,
+        idempotent: Optional[bool] = None,
+    ) -> Any:
+        """Send a request to a ``/rest/api/2`` endpoint, through the throttle.
+
+        ``idempotent`` defaults to what the method implies.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT
+        return self.throttle.call(
+            lambda: self.transport.request(method, path, params, data),
+            idempotent,
+            f"{method} {path}",
+        )
+
+    def close(self) -> None:
+        """Close the connections to the server."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
 
     def to_jira_dct(self, arg: Dict) -> Dict[str, Any]:
         """Convert to jira dict."""
-        project = arg.pop("Project")
-        issue_type = arg.pop("Issue Type")
-        dmap = self.get_field_objects(project, issue_type)
-        sub_map = {
-            "project": {"key": project},
-            "issuetype": {"name": issue_type},
-        }
-        field_dct = {field.name: field for field in dmap}
-        errors = []
-        for key, aval in arg.items():
-            if not aval:
-                errors.append(f"{project} {issue_type} {key} is empty")
-        if errors:
-            msg = "\n".join(errors)
-            raise SystemExit(msg)
-
-        for key, aval in arg.items():
-            field = field_dct[key]
-            if isinstance(aval, list) and not field.is_array:
-                LOG.info("Operations: %s", field.operations)
-                LOG.info("Schema: %s", field.schema)
-                raise SystemExit(
-                    f"{project} {issue_type} {key} is not an array, but {aval}"
-                )
-            if field.is_array:
-                if field.allowed_values:
-                    if field.is_user:
-                        val = [{"name": v} for v in aval]
-                    else:
-                        val = [{"id": field.allowed_values[v]} for v in aval]
-                else:
-                    val = [v for v in aval]
-            else:
-                if field.allowed_values:
-                    val = {"id": field.allowed_values[aval]}  # type: ignore
-                else:
-                    if field.is_user:
-                        val = {"name": aval}
-                    else:
-                        val = aval
-            sub_map[field.id] = val  # type: ignore
-        return sub_map
+        return self.payload_template(arg).encode({})
+
+    def payload_template(self, template: Dict[str, Any]) -> PayloadTemplate:
+        """Validate and encode an issue type template."""
+        schema = self.schema(template["Project"], template["Issue Type"])
+        return PayloadTemplate(schema, template)
 
     def submit(self, sub_map: Dict) -> str:
         """Submit."""
@@ -271,16 +315,236 @@ class JiraInterface:
             LOG.info(
                 "JSON Dump:\n%s", json.dumps(sub_map, indent=4, separators=(",", " : "))
             )
-        return self.inst.create_issue(fields=sub_map, prefetch=True).key  # type: ignore
+        return self.request("POST", "issue", data={"fields": sub_map})["key"]
+
+    def submit_bulk(
+        self, sub_maps: List[Dict], updates: Optional[List[Optional[Dict]]] = None
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Submit issues via the bulk create endpoint.
+
+        ``updates`` holds an optional ``update`` section for every payload,
+        e.g. issue links.  Returns a (key, error) tuple for every payload, in
+        input order.
+        """
+        if updates is None:
+            updates = [None] * len(sub_maps)
+        results = []  # type: List[Tuple[Optional[str], Optional[str]]]
+        for start in range(0, len(sub_maps), BULK_LIMIT):
+            chunk = sub_maps[start : start + BULK_LIMIT]
+            issue_updates = []
+            for fields, update in zip(chunk, updates[start : start + BULK_LIMIT]):
+                issue = {"fields": fields}  # type: Dict[str, Any]
+                if update:
+                    issue["update"] = update
+                issue_updates.append(issue)
+            if self.debug:
+                LOG.info(
+                    "JSON Dump:\n%s",
+                    json.dumps(chunk, indent=4, separators=(",", " : ")),
+                )
+            LOG.info("Bulk creating %s issues", len(chunk))
+            data = {"issueUpdates": issue_updates}
+            try:
+                resp = self.request("POST", "issue/bulk", data=data)
+            except TransportError as e:
+                # nothing was created, the errors are in the body
+                if e.status_code != 400:
+                    raise
+                try:
+                    resp = json.loads(e.text)
+                except ValueError:
+                    resp = {"errorMessages": [e.text]}
+            errors = {}  # type: Dict[int, str]
+            if isinstance(resp.get("errors"), list):
+                for error in resp["errors"]:
+                    errors[error["failedElementNumber"]] = error_text(
+                        error["elementErrors"]
+                    )
+                resp = dict(resp, errors=None)
+            # elements the response does not account for failed with the request
+            failed = error_text(resp) or "not in the bulk create response"
+            issues = iter(resp.get("issues") or [])
+            for index in range(len(chunk)):
+                issue = None if index in errors else next(issues, None)
+                if issue is None:
+                    results.append((None, errors.get(index) or failed))
+                else:
+                    results.append((issue["key"], None))
+        return results
+
+    def update_issue(
+        self, key: str, fields: Dict[str, Any], update: Optional[Dict] = None
+    ) -> None:
+        """Update fields of an existing issue, without fetching it.
+
+        ``update`` holds field operations, e.g. removing a label.
+        """
+        data = {"fields": fields}  # type: Dict[str, Any]
+        if update:
+            data["update"] = update
+        if self.debug:
+            LOG.info("Updating %s: %s", key, json.dumps(data))
+        self.request("PUT", f"issue/{key}", data=data)
+
+    @staticmethod
+    def _concurrently(
+        func: Callable[..., Any], items: List[Tuple], workers: int
+    ) -> List[Optional[str]]:
+        """Call ``func`` for every item on a pool, returns an error or None each."""
+
+        def _call(item: Tuple) -> Optional[str]:
+            try:
+                func(*item)
+            except Exception as e:  # pylint: disable=broad-except
+                return str(e)
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(pool.map(_call, items))
+
+    def update_issues(
+        self, updates: List[Tuple], workers: int = 1
+    ) -> List[Optional[str]]:
+        """Update many issues concurrently, from ``update_issue`` arguments.
+
+        Returns an error or None for each.
+        """
+        return self._concurrently(self.update_issue, updates, workers)
+
+    def link_type(self, name: str) -> Tuple[str, bool]:
+        """Resolve a link type name or description.
+
+        Returns the link type name, and if the issues have to be swapped
+        because ``name`` is the inward description.
+        """
+        with self._link_lock:
+            if self._link_types is None:
+                resp = self.request("GET", "issueLinkType")
+                self._link_types = resp["issueLinkTypes"]
+        for ltype in self._link_types:
+            if ltype["name"] == name:
+                return name, False
+        for ltype in self._link_types:
+            if ltype["outward"] == name:
+                return ltype["name"], False
+            if ltype["inward"] == name:
+                return ltype["name"], True
+        raise SystemExit(f"Unknown issue link type: {name}")
+
+    def link_issues(self, name: str, inward: str, outward: str) -> None:
+        """Link two issues."""
+        ltype, swap = self.link_type(name)
+        if swap:
+            inward, outward = outward, inward
+        data = {
+            "type": {"name": ltype},
+            "inwardIssue": {"key": inward},
+            "outwardIssue": {"key": outward},
+        }
+        self.request("POST", "issueLink", data=data)
 
     def link_parent_issue(self, key: str, parent: str):
         """Link parent issue."""
-        self.inst.create_issue_link(
-            type="is parent task of",
-            inwardIssue=parent,
-            outwardIssue=key,
+        self.link_issues(PARENT_LINK, parent, key)
+
+    def link_parent_issues(
+        self, links: List[Tuple[str, str]], workers: int = 1
+    ) -> List[Optional[str]]:
+        """Link (key, parent) pairs concurrently, returns an error or None each."""
+        return self._concurrently(self.link_parent_issue, links, workers)
+
+    def parent_link_update(self, parent: str) -> Dict[str, Any]:
+        """``update`` section that links a new issue to ``parent`` on creation."""
+        ltype, swap = self.link_type(PARENT_LINK)
+        side = "outwardIssue" if swap else "inwardIssue"
+        link = {"type": {"name": ltype}, side: {"key": parent}}
+        return {"issuelinks": [{"add": link}]}
+
+    def accepts_links(self, project_name: str, issue_name: str) -> bool:
+        """Check if issue links can be set when creating an issue type."""
+        fields = self.field_metadata(project_name, issue_name)
+        return any(
+            field["schema"].get("system") == "issuelinks"
+            or field["fieldId"] == "issuelinks"
+            for field in fields.values()
         )
 
+    def search_issues(
+        self,
+        jql: str,
+        fields: List[str],
+        start: int = 0,
+        limit: int = SEARCH_PAGE_SIZE,
+        validate: bool = True,
+    ) -> Dict[str, Any]:
+        """Get one page of a JQL search.
+
+        Without ``validate`` jira ignores unknown values instead of failing,
+        e.g. keys of deleted issues.
+        """
+        data = {
+            "jql": jql,
+            "startAt": start,
+            "maxResults": limit,
+            "fields": fields,
+        }  # type: Dict[str, Any]
+        if not validate:
+            data["validateQuery"] = False
+        return self.request("POST", "search", data=data, idempotent=True)
+
+    def search_all(
+        self,
+        jql: str,
+        fields: List[str],
+        limit: int = SEARCH_PAGE_SIZE,
+        validate: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Every issue of a JQL search, page by page."""
+        issues = []  # type: List[Dict[str, Any]]
+        while True:
+            page = self.search_issues(jql, fields, len(issues), limit, validate)
+            batch = page.get("issues", [])
+            issues.extend(batch)
+            if not batch or len(issues) >= page.get("total", 0):
+                return issues
+
+    def search_many(
+        self,
+        jqls: List[str],
+        fields: List[str],
+        workers: int = 1,
+        limit: int = SEARCH_PAGE_SIZE,
+        validate: bool = True,
+    ) -> List[List[Dict[str, Any]]]:
+        """Run JQL searches concurrently, returns the issues of each."""
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(
+                pool.map(
+                    lambda jql: self.search_all(jql, fields, limit, validate), jqls
+                )
+            )
+
+    def get_issues(
+        self, keys: List[str], fields: List[str], workers: int = 1
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Fetch issues concurrently, None for those that do not exist.
+
+        Jira answers with the current key of an issue that was moved.
+        """
+
+        def _get(key: str) -> Optional[Dict[str, Any]]:
+            try:
+                return self.request(
+                    "GET", f"issue/{key}", params={"fields": ",".join(fields)}
+                )
+            except TransportError as e:
+                if e.status_code == 404:
+                    return None
+                raise
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(pool.map(_get, keys))
+
     def put_spaces(self, text: str) -> str:
         """Put spaces in text."""
         lst = []
@@ -323,6 +587,235 @@ class JiraInterface:
                 output.append(f"# {self.put_spaces(line.rstrip())}")
         return "\n".join(output)
 
+    def reference_fields(
+        self, project_name: str, issue_name: str, names: Iterable[str]
+    ) -> None:
+        """Only fetch and store the named (and required) fields of a type.
+
+        Names referenced by several configs sharing the client add up.
+        """
+        self.wanted.setdefault((project_name, issue_name), set()).update(names)
+
+    def cached_metadata(
+        self, project_name: str, issue_name: str
+    ) -> Optional[Dict[str, Any]]:
+        """Cached createmeta document of an issue type, None if it is unusable."""
+        wanted = self.wanted.get((project_name, issue_name))
+        dat = self._documents.get((project_name, issue_name))
+        if dat is not None and self.metadata.covers(dat, wanted):
+            return dat
+        dat = self.metadata.load(project_name, issue_name)
+        if dat is not None and not self.metadata.covers(dat, wanted):
+            LOG.info("Cached fields for %s miss referenced fields", issue_name)
+            if wanted is not None and dat.get("wanted") is not None:
+                # keep the fields other configs sharing the cache reference
+                merged = set(wanted) | set(dat["wanted"])
+                self.wanted[(project_name, issue_name)] = merged
+            dat = None
+        if (
+            dat is not None
+            and not self.offline
+            and self.metadata.is_stale(project_name, issue_name)
+        ):
+            if self.metadata_valid(project_name, dat):
+                self.metadata.touch(project_name, issue_name)
+            else:
+                LOG.info("Cached fields for %s are outdated", issue_name)
+                dat = None
+        if dat is not None:
+            self._documents[(project_name, issue_name)] = dat
+        return dat
+
+    def store_metadata(
+        self, project_name: str, issue_name: str, dat: Dict[str, Any]
+    ) -> None:
+        """Cache a fetched createmeta document, on disk and in memory."""
+        self.metadata.store(project_name, issue_name, dat)
+        self._documents[(project_name, issue_name)] = dat
+
+    def field_metadata(
+        self,
+        project_name: str,
+        issue_name: str,
+    ) -> Dict[str, Any]:
+        """Get the createmeta fields of an issue type, cached on disk."""
+        dat = self.cached_metadata(project_name, issue_name)
+        if dat is None:
+            with self.metadata.lock(project_name, issue_name):
+                # another run may have stored it while we waited
+                dat = self.cached_metadata(project_name, issue_name)
+                if dat is None:
+                    wanted = self.wanted.get((project_name, issue_name))
+                    dat = self.fetch_metadata(project_name, issue_name, wanted)
+                    self.store_metadata(project_name, issue_name, dat)
+        project = dat["projects"][0]  # type: ignore
+        issuetype = project["issuetypes"][0]  # type: ignore
+        return issuetype["fields"]  # type: ignore
+
+    def warm_metadata(self, project_name: str, issue_names: List[str]) -> None:
+        """Make sure the createmeta of several issue types is cached.
+
+        Cached entries are validated concurrently, the missing ones are
+        fetched together, in a single legacy createmeta request or
+        concurrently when the server only has the paged endpoints.  Configs
+        sharing the client wait for each other, only the first one fetches.
+        """
+        def _missing(names: List[str]) -> List[str]:
+            with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+                cached = pool.map(
+                    lambda name: self.cached_metadata(project_name, name), names
+                )
+                return [name for name, dat in zip(names, cached) if dat is None]
+
+        with self._metadata_lock:
+            missing = _missing(issue_names)
+            if not missing:
+                return
+            with self.metadata.lock_many(project_name, missing):
+                # another run may have stored them while we waited
+                missing = _missing(missing)
+                if not missing:
+                    return
+                docs = self.fetch_metadata_many(project_name, missing)
+                for name, dat in docs.items():
+                    self.store_metadata(project_name, name, dat)
+
+    def fetch_metadata_many(
+        self, project_name: str, issue_names: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch createmeta of several issue types, keyed by issue type."""
+        if self.metadata_api != "legacy":
+            try:
+                self._issue_type_ids(project_name)
+                with ThreadPoolExecutor(max_workers=len(issue_names)) as pool:
+                    docs = pool.map(
+                        lambda name: self._fetch_paged_metadata(
+                            project_name, name, self.wanted.get((project_name, name))
+                        ),
+                        issue_names,
+                    )
+                    return dict(zip(issue_names, docs))
+            except TransportError as e:
+                if self.metadata_api == "paged" or e.status_code != 404:
+                    raise
+                LOG.info("Paged createmeta is not supported, using legacy")
+                self.metadata_api = "legacy"
+        return self._fetch_legacy_metadata(project_name, issue_names)
+
+    def fetch_metadata(
+        self,
+        project_name: str,
+        issue_name: str,
+        wanted: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        """Fetch createmeta of an issue type from the server."""
+        if self.metadata_api != "legacy":
+            try:
+                return self._fetch_paged_metadata(project_name, issue_name, wanted)
+            except TransportError as e:
+                if self.metadata_api == "paged" or e.status_code != 404:
+                    raise
+                LOG.info("Paged createmeta is not supported, using legacy")
+                self.metadata_api = "legacy"
+        return self._fetch_legacy_metadata(project_name, [issue_name])[issue_name]
+
+    def _fetch_legacy_metadata(
+        self, project_name: str, issue_names: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch createmeta of issue types in one legacy createmeta request."""
+        LOG.info("Fetching fields for %s", ", ".join(issue_names))
+        params = {
+            "projectKeys": project_name,
+            "issuetypeNames": ",".join(issue_names),
+            "expand": "projects.issuetypes.fields",
+        }
+        dat = self.request("GET", "issue/createmeta", params=params)
+        docs = {}
+        for issuetype in dat["projects"][0]["issuetypes"]:  # type: ignore
+            fields = issuetype["fields"]
+            docs[issuetype["name"]] = createmeta_document(
+                project_name, issuetype["name"], issuetype["id"], fields, len(fields)
+            )
+        for name in issue_names:
+            if name not in docs:
+                raise SystemExit(f"{name} is not an issue type of {project_name}")
+        return docs
+
+    def _get_paged(
+        self, path: str, start: int = 0, limit: int = METADATA_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """Get one page of a paginated endpoint."""
+        return self.request("GET", path, params={"startAt": start, "maxResults": limit})
+
+    def _issue_type_ids(self, project_name: str) -> Dict[str, str]:
+        """Issue type ids of a project through paged createmeta, looked up once."""
+        if project_name in self._type_ids:
+            return self._type_ids[project_name]
+        ids = {}
+        start = 0
+        while True:
+            page = self._get_paged(f"issue/createmeta/{project_name}/issuetypes", start)
+            for issuetype in page["values"]:
+                ids[issuetype["name"]] = issuetype["id"]
+            start += len(page["values"])
+            if page.get("isLast", True) or not page["values"]:
+                break
+        self._type_ids[project_name] = ids
+        return ids
+
+    def _issue_type_id(self, project_name: str, issue_name: str) -> str:
+        """Id of an issue type."""
+        try:
+            return self._issue_type_ids(project_name)[issue_name]
+        except KeyError:
+            raise SystemExit(f"{issue_name} is not an issue type of {project_name}")
+
+    def _fetch_paged_metadata(
+        self,
+        project_name: str,
+        issue_name: str,
+        wanted: Optional[Iterable[str]],
+    ) -> Dict[str, Any]:
+        """Fetch createmeta of an issue type page by page.
+
+        Only the required and ``wanted`` fields are kept.
+        """
+        LOG.info("Fetching fields for %s", issue_name)
+        type_id = self._issue_type_id(project_name, issue_name)
+        path = f"issue/createmeta/{project_name}/issuetypes/{type_id}"
+        fields = {}
+        start = 0
+        while True:
+            page = self._get_paged(path, start)
+            for field in page["values"]:
+                if keep_field(field, wanted):
+                    fields[field["fieldId"]] = field
+            start += len(page["values"])
+            if page.get("isLast", start >= page["total"]) or not page["values"]:
+                break
+        return createmeta_document(
+            project_name, issue_name, type_id, fields, page["total"], wanted
+        )
+
+    def metadata_valid(self, project_name: str, dat: Dict[str, Any]) -> bool:
+        """Cheap check of a cached createmeta document against the server.
+
+        A single one field page of paged createmeta returns the current
+        field count of the issue type, which has to match the cached one.
+        """
+        if self.metadata_api == "legacy" or dat.get("total") is None:
+            return False
+        type_id = dat["projects"][0]["issuetypes"][0].get("id")
+        if type_id is None:
+            return False
+        try:
+            page = self._get_paged(
+                f"issue/createmeta/{project_name}/issuetypes/{type_id}", 0, 1
+            )
+        except TransportError:
+            return False
+        return page.get("total") == dat["total"]
+
     def get_field_objects(
         self,
         project_name: str,
@@ -330,29 +823,85 @@ class JiraInterface:
     ) -> List[Field]:
         """Get raw fields."""
         lst = []
-        fpath = self.cache_dir / f"{project_name}_{issue_name}.json"
-        if fpath.exists():
-            LOG.info("Loading fields from cache from %s", fpath)
-            with fpath.open() as f:
-                dat = json.load(f)
-        else:
-            LOG.info("Fetching fields for %s", issue_name)
-            dat = self.inst.createmeta(
-                projectKeys=project_name,
-                issuetypeNames=issue_name,
-                expand="projects.issuetypes.fields",
-            )
-            with fpath.open("w") as f:
-                json.dump(dat, f, indent=4)
-        project = dat["projects"][0]  # type: ignore
-        issuetype = project["issuetypes"][0]  # type: ignore
-        fields = issuetype["fields"]  # type: ignore
+        fields = self.field_metadata(project_name, issue_name)
         for val in fields.values():  # type: ignore
             field = Field(val, project_name, issue_name, self.merge_values)
             if field.ignore:
                 continue
-            lst.append(Field(val, project_name, issue_name, self.merge_values))
+            lst.append(field)
         return sorted(lst, key=lambda x: x.score)
 
+    def schema(self, project_name: str, issue_name: str) -> FieldSchema:
+        """Get the compiled field schema of an issue type.
+
+        Compiled once per createmeta document in the process, and persisted
+        next to the createmeta cache when ``compile_cache`` is set.  A client
+        shared by configs referencing more fields refetches the document,
+        the schema is then compiled again.
+        """
+        fields = self.field_metadata(project_name, issue_name)
+        key = (self.jira_url, project_name, issue_name, *sorted(fields))
+        schema = cached_schema(key)
+        if schema is not None:
+            return schema
+        source = self.metadata.path(project_name, issue_name)
+        compiled = self.metadata.schema_path(project_name, issue_name)
+        if self.compile_cache:
+            schema = FieldSchema.load(compiled, source)
+        if schema is None:
+            schema = FieldSchema.compile(project_name, issue_name, fields.values())
+            if self.compile_cache:
+                schema.save(compiled, source)
+        return cache_schema(key, schema)
+
     def __str__(self) -> str:
         return self.__dict__.__str__()
+
+
+class ClientPool:
+    """Jira clients shared by several configs, one per server and options.
+
+    Configs of the same server and client options share its session,
+    metadata and throttle, so ``concurrency`` caps the requests in flight to
+    a server across configs.  Metadata is cached in the cache directory of
+    the first config, or the shared cache.
+    """
+
+    def __init__(self, concurrency: int = 8) -> None:
+        self.concurrency = max(1, concurrency)
+        self.clients = {}  # type: Dict[Tuple[str, Tuple], JiraInterface]
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        jira_url: str,
+        factory: Callable[[int], JiraInterface],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> JiraInterface:
+        """Client of a server, made by ``factory(concurrency)`` on first use.
+
+        ``options`` are the settings ``factory`` makes the client with,
+        configs whose options differ get a client of their own.
+        """
+        key = (jira_url, tuple(sorted((options or {}).items())))
+        with self._lock:
+            if key not in self.clients:
+                for url, other in self.clients:
+                    if url != jira_url:
+                        continue
+                    differ = sorted(name for name, value in set(key[1]) - set(other))
+                    LOG.warning(
+                        "Configs of %s differ in %s, they use separate clients, "
+                        "each with a limit of %s requests",
+                        jira_url,
+                        ", ".join(differ),
+                        self.concurrency,
+                    )
+                    break
+                self.clients[key] = factory(self.concurrency)
+            return self.clients[key]
+
+    def close(self) -> None:
+        """Close every client."""
+        for client in self.clients.values():
+            client.close()
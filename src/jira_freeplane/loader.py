@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Streaming mindmap loader."""
+import textwrap
+import xml.etree.ElementTree as ET
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Optional, Union
+
+
+class LazyNote:
+    """Note of a node, flattened on first access.
+
+    Only the root and the issue nodes use their note, so flattening it is
+    deferred until ``text`` is read, and nodes below sub-tasks get none.  An
+    unread note is freed together with its record.  The note of a parent may
+    follow its children in the file, it is set once the loader reaches it.
+    """
+
+    __slots__ = ("_flatten", "_text")
+
+    def __init__(self, flatten: Optional[Callable[[], str]] = None) -> None:
+        self._flatten = flatten
+        self._text = ""
+
+    def defer(self, flatten: Callable[[], str]) -> None:
+        """Set the note, flattened on first access."""
+        self._flatten = flatten
+        self._text = ""
+
+    def __bool__(self) -> bool:
+        return self._flatten is not None or bool(self._text)
+
+    @property
+    def text(self) -> str:
+        """Flattened note."""
+        if self._flatten is not None:
+            self._text = self._flatten()
+            self._flatten = None
+        return self._text
+
+
+# node without a note
+NO_NOTE = LazyNote()
+
+
+class MindmapRecord(NamedTuple):
+    """Flat mindmap node."""
+
+    id: str
+    depth: int
+    parent_id: Optional[str]
+    text: str
+    link: str
+    note: LazyNote
+
+
+def _local(tag: str) -> str:
+    """Strip the namespace from a tag."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _children(elem: ET.Element, name: str) -> List[ET.Element]:
+    """Direct children by local name."""
+    return [child for child in elem if _local(child.tag) == name]
+
+
+def note_source(rich: ET.Element) -> str:
+    """Paragraphs of a richcontent note, joined but not yet dedented."""
+    lines = []
+    for html in _children(rich, "html"):
+        for body in _children(html, "body"):
+            for p in _children(body, "p"):
+                cdata = "".join([p.text or ""] + [c.tail or "" for c in p])
+                lines.append(cdata.rstrip())
+    return "\n".join(line if line else "\n" for line in lines)
+
+
+def flatten_note(source: str) -> str:
+    """Dedent a joined note."""
+    if not source:
+        return ""
+    return textwrap.dedent(source).replace("\n\n", "\n").rstrip()
+
+
+class _Frame:
+    """Open node element."""
+
+    __slots__ = (
+        "elem",
+        "level",
+        "id",
+        "depth",
+        "parent_id",
+        "text",
+        "link",
+        "note",
+        "done",
+    )
+
+    def __init__(
+        self, elem: ET.Element, level: int, depth: int, parent_id: Optional[str]
+    ) -> None:
+        self.elem = elem
+        self.level = level
+        self.id = elem.get("ID", "")
+        self.depth = depth
+        self.parent_id = parent_id
+        self.text = elem.get("TEXT") or ""
+        self.link = elem.get("LINK") or ""
+        self.note = NO_NOTE
+        self.done = False
+
+    def record(self) -> MindmapRecord:
+        """Emit the record, only once.
+
+        A note that is not read yet may still follow the children.
+        """
+        self.done = True
+        if self.note is NO_NOTE and self.depth <= 3:
+            self.note = LazyNote()
+        return MindmapRecord(
+            self.id, self.depth, self.parent_id, self.text, self.link, self.note
+        )
+
+
+def iter_mindmap(source: Union[str, Path]) -> Iterator[MindmapRecord]:
+    """Stream the nodes of a freeplane mindmap, parents before children.
+
+    Elements are cleared as soon as they have been read, so memory is bound
+    by the depth of the map instead of its size.  A parent is yielded when
+    its first child starts, a note after the children is set on its record
+    later, so notes are complete once the whole map has been consumed.
+    """
+    frames = []  # type: List[_Frame]
+    level = 0
+    for event, elem in ET.iterparse(str(source), events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            level += 1
+            if tag != "node":
+                continue
+            parent = frames[-1] if frames else None
+            if parent is not None and not parent.done:
+                yield parent.record()
+            parent_id = parent.id if parent is not None else None
+            frames.append(_Frame(elem, level, len(frames), parent_id))
+            continue
+        level -= 1
+        if not frames:
+            continue
+        frame = frames[-1]
+        if tag == "node" and frame.elem is elem:
+            frames.pop()
+            if not frame.done:
+                yield frame.record()
+        elif frame.level != level:
+            # still inside a child of the node, e.g. a note paragraph
+            continue
+        elif tag == "richcontent" and elem.get("TYPE", "NOTE") == "NOTE":
+            # checklist nodes below sub-tasks never use their note
+            if frame.depth <= 3 and not frame.note:
+                # dedenting is the costly part, it waits until the note is read
+                source = note_source(elem)
+                if source:
+                    if frame.note is NO_NOTE:
+                        frame.note = LazyNote()
+                    frame.note.defer(partial(flatten_note, source))
+        elem.clear()
+        if frames:
+            frames[-1].elem.clear()
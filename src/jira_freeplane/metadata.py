@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""createmeta cache."""
+import hashlib
+import json
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from jira_freeplane.common import AUTOFIELDS, LOG, atomic_write
+
+# fields we always keep, even when only referenced fields are stored
+ALWAYS_FIELDS = AUTOFIELDS + ["Project", "Issue Type"]
+
+
+def createmeta_document(
+    project: str,
+    issue_type: str,
+    issue_type_id: str,
+    fields: Dict[str, Any],
+    total: int,
+    wanted: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Wrap issue type fields in the legacy createmeta layout.
+
+    ``total`` is the field count the server reported, used to validate the
+    cache.  ``wanted`` lists the field names a filtered document was built
+    for, None when every field is present.
+    """
+    return {
+        "projects": [
+            {
+                "key": project,
+                "issuetypes": [
+                    {"id": issue_type_id, "name": issue_type, "fields": fields}
+                ],
+            }
+        ],
+        "total": total,
+        "wanted": sorted(wanted) if wanted is not None else None,
+    }
+
+
+def keep_field(field: Dict[str, Any], wanted: Optional[Iterable[str]]) -> bool:
+    """Check if a field is stored for a set of referenced names."""
+    if wanted is None:
+        return True
+    if field["required"] or field["name"] in ALWAYS_FIELDS:
+        return True
+    return field["name"] in wanted
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock of ``path``, across processes.
+
+    Without fcntl, e.g. on windows, nothing is locked: parallel runs may
+    fetch the same metadata twice, the atomic writes keep the cache whole.
+    """
+    try:
+        import fcntl  # posix only
+    except ImportError:
+        yield
+        return
+    with path.open("a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def shared_key(jira_url: str, project: str, issue_type: str) -> str:
+    """Name of a shared cache entry."""
+    text = "\n".join([jira_url.rstrip("/"), project, issue_type])
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+class MetadataCache:
+    """createmeta responses on disk, one file per project and issue type.
+
+    Entries older than ``ttl`` seconds are stale, they are re-validated
+    against the server before they are used again.  A ``ttl`` of 0 never
+    expires entries.
+
+    With a ``shared_dir`` the entries are kept there instead, named by a
+    hash of the jira url, project and issue type, so every working
+    directory of the machine uses the same copy.  Writers hold a lock per
+    entry, concurrent runs with a cold cache fetch an entry once.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        ttl: int = 86400,
+        shared_dir: Optional[Path] = None,
+        jira_url: str = "",
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.shared_dir = shared_dir
+        self.jira_url = jira_url
+        if shared_dir is not None:
+            shared_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, project: str, issue_type: str) -> Path:
+        """Cache file of an issue type."""
+        if self.shared_dir is not None:
+            key = shared_key(self.jira_url, project, issue_type)
+            return self.shared_dir / f"{key}.json"
+        return self.cache_dir / f"{project}_{issue_type}.json"
+
+    def schema_path(self, project: str, issue_type: str) -> Path:
+        """Compiled field schema file of an issue type."""
+        return self.path(project, issue_type).with_suffix(".schema.json")
+
+    @contextmanager
+    def lock(self, project: str, issue_type: str) -> Iterator[None]:
+        """Hold the write lock of an entry, across processes."""
+        with file_lock(self.path(project, issue_type).with_suffix(".lock")):
+            yield
+
+    @contextmanager
+    def lock_many(self, project: str, issue_types: List[str]) -> Iterator[None]:
+        """Hold the write locks of several entries, always taken in order."""
+        with ExitStack() as stack:
+            for issue_type in sorted(issue_types):
+                stack.enter_context(self.lock(project, issue_type))
+            yield
+
+    def reference(self, cache_dir: Path, project: str, issue_type: str) -> None:
+        """Point a working directory cache at the shared entry it uses."""
+        if self.shared_dir is None:
+            return
+        ref = {
+            "jira_url": self.jira_url,
+            "project": project,
+            "issue_type": issue_type,
+            "path": str(self.path(project, issue_type)),
+        }
+        fpath = cache_dir / f"{project}_{issue_type}.ref.json"
+        text = json.dumps(ref, indent=4)
+        if not fpath.exists() or fpath.read_text() != text:
+            atomic_write(fpath, text)
+
+    def load(self, project: str, issue_type: str) -> Optional[Dict[str, Any]]:
+        """Cached document, None if missing."""
+        fpath = self.path(project, issue_type)
+        if not fpath.exists():
+            return None
+        LOG.info("Loading fields from cache from %s", fpath)
+        with fpath.open() as f:
+            return json.load(f)
+
+    def is_stale(self, project: str, issue_type: str) -> bool:
+        """Check if an entry is older than the ttl."""
+        if self.ttl <= 0:
+            return False
+        age = time.time() - self.path(project, issue_type).stat().st_mtime
+        return age > self.ttl
+
+    @staticmethod
+    def covers(dat: Dict[str, Any], wanted: Optional[Iterable[str]]) -> bool:
+        """Check if a document holds every wanted field."""
+        stored = dat.get("wanted")
+        if stored is None:
+            return True
+        if wanted is None:
+            return False
+        return set(wanted) <= set(stored)
+
+    def store(self, project: str, issue_type: str, dat: Dict[str, Any]) -> None:
+        """Write an entry, atomically."""
+        atomic_write(self.path(project, issue_type), json.dumps(dat, indent=4))
+
+    def touch(self, project: str, issue_type: str) -> None:
+        """Mark an entry as validated now."""
+        self.path(project, issue_type).touch()
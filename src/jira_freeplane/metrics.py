@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Run metrics: phase timers, per endpoint request stats and reports."""
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from jira_freeplane.common import atomic_write
+
+# upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# prefix of the prometheus metric names
+PROM_PREFIX = "jira_freeplane"
+
+
+def endpoint(label: str) -> str:
+    """Endpoint of a ``METHOD path`` label, issue keys and ids replaced."""
+    label = re.sub(r"(?<=/)[A-Z][A-Z0-9_]+-\d+(?=/|$)", "{key}", label)
+    return re.sub(r"(?<=/)\d+(?=/|$)", "{id}", label)
+
+
+class Histogram:
+    """Request latency histogram."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add a sample."""
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> List[int]:
+        """Counts of samples at or below each bucket bound, +Inf last."""
+        total, out = 0, []
+        for count in self.buckets:
+            total += count
+            out.append(total)
+        return out
+
+
+class EndpointStats:
+    """Requests sent to one endpoint."""
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.status = {}  # type: Dict[str, int]
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Metrics:
+    """Metrics of a run, shared by every thread.
+
+    Phases are named timers, a phase can run more than once and phases can
+    nest, e.g. state writes during issue creation.  Every HTTP attempt is
+    recorded per endpoint, retries included.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self._start = time.monotonic()
+        self.phases = {}  # type: Dict[str, Dict[str, float]]
+        self.endpoints = {}  # type: Dict[str, EndpointStats]
+        self.counters = {}  # type: Dict[str, int]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """Time a block as ``phase``."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                dct = self.phases.setdefault(phase, {"seconds": 0.0, "count": 0})
+                dct["seconds"] += elapsed
+                dct["count"] += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increment a counter, e.g. issues created."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _stats(self, label: str) -> EndpointStats:
+        name = endpoint(label)
+        if name not in self.endpoints:
+            self.endpoints[name] = EndpointStats()
+        return self.endpoints[name]
+
+    def observe_request(
+        self,
+        label: str,
+        seconds: float,
+        status: Optional[int],
+        sent: int,
+        received: int,
+    ) -> None:
+        """Record an HTTP attempt, ``status`` is None when the connection failed."""
+        code = str(status) if status is not None else "error"
+        with self._lock:
+            stats = self._stats(label)
+            stats.latency.observe(seconds)
+            stats.status[code] = stats.status.get(code, 0) + 1
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+
+    def retry(self, label: str) -> None:
+        """Record a retried request."""
+        with self._lock:
+            self._stats(label).retries += 1
+
+    def issues_per_second(self) -> Optional[float]:
+        """Issues created per second of the create phase."""
+        seconds = self.phases.get("create", {}).get("seconds")
+        if not seconds:
+            return None
+        return self.counters.get("issues_created", 0) / seconds
+
+    def report(self, with_requests: bool = True, **extra: Any) -> Dict[str, Any]:
+        """JSON report of the run, ``extra`` is added as is.
+
+        Without ``with_requests`` the requests are left out, they were sent
+        by a client that counts them in metrics of its own.
+        """
+        with self._lock:
+            endpoints = {
+                name: {
+                    "requests": stats.latency.count,
+                    "status": dict(stats.status),
+                    "retries": stats.retries,
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "seconds": round(stats.latency.sum, 6),
+                    "latency_buckets": dict(
+                        zip(
+                            [str(b) for b in LATENCY_BUCKETS] + ["+Inf"],
+                            stats.latency.cumulative(),
+                        )
+                    ),
+                }
+                for name, stats in sorted(self.endpoints.items())
+                if with_requests
+            }
+            phases = {
+                name: {"seconds": round(dct["seconds"], 6), "count": dct["count"]}
+                for name, dct in self.phases.items()
+            }
+            counters = dict(self.counters)
+        rate = self.issues_per_second()
+        return dict(
+            extra,
+            started=datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            wall_seconds=round(time.monotonic() - self._start, 6),
+            counters=counters,
+            issues_per_second=round(rate, 3) if rate is not None else None,
+            phases=phases,
+            requests={
+                "total": sum(e["requests"] for e in endpoints.values()),
+                "retries": sum(e["retries"] for e in endpoints.values()),
+                "bytes_sent": sum(e["bytes_sent"] for e in endpoints.values()),
+                "bytes_received": sum(e["bytes_received"] for e in endpoints.values()),
+            }
+            if with_requests
+            else None,
+            endpoints=endpoints,
+        )
+
+    def prometheus(self, report: Dict[str, Any]) -> str:
+        """Prometheus text exposition of a report."""
+        lines = []  # type: List[str]
+
+        def _metric(name: str, kind: str, doc: str) -> str:
+            full = f"{PROM_PREFIX}_{name}"
+            lines.append(f"# HELP {full} {doc}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        def _labels(**labels: str) -> str:
+            text = ",".join(
+                f'{k}="{json.dumps(str(v))[1:-1]}"' for k, v in labels.items()
+            )
+            return "{" + text + "}" if text else ""
+
+        name = _metric("run_timestamp_seconds", "gauge", "Start time of the run.")
+        lines.append(f"{name} {self.started:.3f}")
+        name = _metric("run_duration_seconds", "gauge", "Wall time of the run.")
+        lines.append(f"{name} {report['wall_seconds']}")
+        if report["issues_per_second"] is not None:
+            name = _metric(
+                "issues_per_second", "gauge", "Issues created per second of creation."
+            )
+            lines.append(f"{name} {report['issues_per_second']}")
+        name = _metric("phase_seconds", "gauge", "Time spent in each phase.")
+        for phase, dct in report["phases"].items():
+            lines.append(f"{name}{_labels(phase=phase)} {dct['seconds']}")
+        name = _metric("events_total", "counter", "Issues created, updated and linked.")
+        for counter, value in sorted(report["counters"].items()):
+            lines.append(f"{name}{_labels(event=counter)} {value}")
+        name = _metric(
+            "request_duration_seconds", "histogram", "Latency of jira requests."
+        )
+        for path, dct in report["endpoints"].items():
+            for bound, count in dct["latency_buckets"].items():
+                lines.append(f"{name}_bucket{_labels(endpoint=path, le=bound)} {count}")
+            lines.append(f"{name}_sum{_labels(endpoint=path)} {dct['seconds']}")
+            lines.append(f"{name}_count{_labels(endpoint=path)} {dct['requests']}")
+        name = _metric("requests_total", "counter", "Jira requests by response status.")
+        for path, dct in report["endpoints"].items():
+            for status, count in sorted(dct["status"].items()):
+                lines.append(f"{name}{_labels(endpoint=path, status=status)} {count}")
+        name = _metric("retries_total", "counter", "Retried jira requests.")
+        for path, dct in report["endpoints"].items():
+            lines.append(f"{name}{_labels(endpoint=path)} {dct['retries']}")
+        name = _metric("bytes_total", "counter", "Request and response body bytes.")
+        for path, dct in report["endpoints"].items():
+            for direction in ["sent", "received"]:
+                labels = _labels(endpoint=path, direction=direction)
+                lines.append(f"{name}{labels} {dct[f'bytes_{direction}']}")
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self,
+        report_file: Path,
+        textfile: Optional[Path] = None,
+        with_requests: bool = True,
+        **extra: Any,
+    ) -> Dict[str, Any]:
+        """Write the JSON report, and the prometheus textfile if given.
+
+        Files are replaced atomically, a textfile collector never reads
+        half a file.
+        """
+        report = self.report(with_requests, **extra)
+        outputs = [(report_file, json.dumps(report, indent=4) + "\n")]
+        if textfile is not None:
+            outputs.append((textfile, self.prometheus(report)))
+        for path, text in outputs:
+            atomic_write(path, text)
+        return report
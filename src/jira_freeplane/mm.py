@@ -1,107 +1,95 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """XML to dict parse."""
+import hashlib
 import json
+import sys
 import textwrap
-from configparser import ConfigParser
-from pathlib import Path
-from typing import Iterable
-
-import untangle
+from array import array
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
 
 from jira_freeplane.common import LOG
+from jira_freeplane.loader import NO_NOTE, LazyNote, MindmapRecord
 from jira_freeplane.mm_settings import MMConfig
 
+if TYPE_CHECKING:
+    import untangle
 
-class Node:
-    """Node class."""
 
-    COLLECTION = {}
+def wiki_line(depth: int, text: str, link: str) -> str:
+    """Render a checklist line in jira wiki markup."""
+    if link:
+        txt = f"[{text}|{link}]"
+    else:
+        txt = text
+
+    newlinecnt = txt.count("\n")
+    if newlinecnt > 1:
+        txt = "{code}" + txt + "{code}"
+    return depth * "*" + " " + txt
+
+
+class Node:
+    """Issue node, the root or an epic, task or sub-task."""
+
+    __slots__ = (
+        "glb",
+        "tree",
+        "index",
+        "depth",
+        "id",
+        "parent_id",
+        "text",
+        "link",
+        "_note",
+    )
 
     def __init__(
-        self,
-        config: MMConfig,
-        node: untangle.Element,
-        depth: int,
-        parent: untangle.Element = None, # type: ignore
+        self, config: MMConfig, record: MindmapRecord, tree: "NodeTree", index: int
     ) -> None:
         self.glb = config
-        self.depth = depth
-        self.id = node["ID"]
-        self.node = node
-        Node.COLLECTION[self.id] = self
-        self.parent_id = parent["ID"] if parent else None
-        self.text = node["TEXT"] or ""
-        self.link = node["LINK"] or ""
-        try:
-            rich = node.richcontent.html.body  # type: ignore
-            lines = []
-            for p in rich.get_elements("p"):
-                lines.append(p.cdata.rstrip())
-            flat = textwrap.dedent("\n".join(line if line else "\n" for line in lines))
-            dat = flat.replace("\n\n", "\n").rstrip()
-            self.note = dat
-        except AttributeError:
-            self.note = ""
-
-        self.cfile = self.glb.data_dir.joinpath(f"{self.id}.ini")
-        self.parent_cfile = self.glb.data_dir.joinpath(f"{self.parent_id}.ini")
-
-        self._config = ConfigParser()
-        self._parent_config = ConfigParser()
-
-    def children(self) -> Iterable["Node"]:
-        """Get subtask children."""
-        yield from node_tree_with_depth(self.glb, self.node)
+        self.tree = tree
+        self.index = index
+        self.depth = record.depth
+        self.id = record.id
+        self.parent_id = record.parent_id
+        self.text = record.text
+        self.link = record.link
+        self._note = record.note
+
+    @property
+    def note(self) -> str:
+        """Note of the node, flattened on first access."""
+        return self._note.text
 
     @property
     def child_text(self) -> str:
         """Get subtask children."""
-        if self.link:
-            txt = f"[{self.text}|{self.link}]"
-        else:
-            txt = self.text
-
-        newlinecnt = txt.count("\n")
-        if newlinecnt > 1:
-            txt = "{code}" + txt + "{code}"
-        return self.depth * "*" + " " + txt
-
-    def _load_config(self, config_val: ConfigParser, config_path: Path) -> ConfigParser:
-        """Load config."""
-        if config_path.exists():
-            config_val.read(str(config_path))
-            return config_val
-        if config_val.sections():
-            return config_val
-        else:
-            config_val.add_section("jira")
-            with config_path.open("w") as f:
-                config_val.write(f)
-            return config_val
-
-    def _save(self, config_val: ConfigParser, config_path: Path) -> None:
-        """Load config."""
-        with config_path.open("w") as f:
-            config_val.write(f)
+        return wiki_line(self.depth, self.text, self.link)
 
     @property
-    def config(self) -> ConfigParser:
-        """Config property."""
-        return self._load_config(self._config, self.cfile)
+    def lines(self) -> List[str]:
+        """Rendered checklist lines of the descendants, for sub-tasks."""
+        return self.tree.checklist(self.index)
 
     @property
-    def parent_config(self) -> ConfigParser:
-        """Parent config property."""
-        return self._load_config(self._parent_config, self.parent_cfile)
+    def state(self) -> Dict[str, Any]:
+        """Stored jira state."""
+        return self.glb.state.get(self.id)
 
-    def parent_save(self) -> None:
-        """Save parent config."""
-        self._save(self._parent_config, self.parent_cfile)
+    @property
+    def key(self) -> Optional[str]:
+        """Key of the issue created for this node."""
+        return self.state.get("key")
 
-    def save(self) -> None:
-        """Save config."""
-        self._save(self._config, self.cfile)
+    @property
+    def parent_key(self) -> Optional[str]:
+        """Key of the issue created for the parent node."""
+        parent = self.tree.nodes.get(self.parent_id)  # type: ignore
+        if parent is None:
+            return None
+        return parent.key
 
     def is_task(self) -> bool:
         """Check if node is task."""
@@ -122,10 +110,23 @@ class Node:
             return str(self.depth - 3)
 
 
-def node_tree_with_depth(config: MMConfig, root: untangle.Element) -> Iterable[Node]:
-    """Return a list of nodes with depth."""
+def untangle_note(node: "untangle.Element") -> str:
+    """Flatten the richcontent note of an untangle node."""
+    try:
+        rich = node.richcontent.html.body  # type: ignore
+    except AttributeError:
+        return ""
+    lines = []
+    for p in rich.get_elements("p"):
+        lines.append(p.cdata.rstrip())
+    flat = textwrap.dedent("\n".join(line if line else "\n" for line in lines))
+    return flat.replace("\n\n", "\n").rstrip()
+
 
-    def _vals(node: untangle.Element, depth=0, parent: untangle.Element = None): # type: ignore
+def untangle_records(root: "untangle.Element") -> Iterable[MindmapRecord]:
+    """Flatten an untangle mindmap into records."""
+
+    def _vals(node: "untangle.Element", depth=0, parent: "untangle.Element" = None): # type: ignore
         yield node, depth, parent
         children = node.get_elements("node")
         if not children:
@@ -134,124 +135,156 @@ def node_tree_with_depth(config: MMConfig, root: untangle.Element) -> Iterable[N
             yield from _vals(child, depth + 1, node)
 
     for node, depth, parent in _vals(root): # type: ignore
-        yield Node(config, node, depth, parent)
+        note = NO_NOTE
+        if node.get_elements("richcontent"):
+            note = LazyNote(partial(untangle_note, node))
+        yield MindmapRecord(
+            node["ID"],
+            depth,
+            parent["ID"] if parent else None,
+            node["TEXT"] or "",
+            node["LINK"] or "",
+            note,
+        )
 
 
-def create_subtasks(config: MMConfig, nodes: Iterable[Node]) -> None:
-    """Create epic."""
-    for node in nodes:
-        if node.depth_type != config.TYPE_SUBTASK:
-            continue
-        if node.config.has_option("jira", "key"):
-            key = node.config.get("jira", "key")
-            LOG.info(f"{node.cfile} / {key} exists, skipping")
-            continue
-        parent_key = node.parent_config.get("jira", "key")
-        LOG.info(f'running "{node.text}" / linking to "{parent_key}"')
-        body = ""
-        if node.link:
-            body += f"\n\n{node.link}"
-        for i in node.children():
-            if i.depth == 0:
-                continue
-            body += f"\n{i.child_text}"
-        LOG.info(
-            f"Creating parent {node.id}, {node.depth_type}, {node.depth}, {node.text}"
-        )
-        if node.note:
-            body += f"-----------------------------\n\n\n{node.note}"
-
-        try:
-            parent_key = node.parent_config.get("jira", "key")
-        except Exception:
-            LOG.info("Err %s", node.parent_cfile.read_text())
-            LOG.info(node.parent_config.get("jira", "key"))
-            raise
-        working = dict(config.data_dct[config.TYPE_SUBTASK])
-        working["Summary"] = node.text
-        working["Parent"] = { # type: ignore
+class NodeTree:
+    """Compact tree of the nodes of one mindmap, scoped to a run.
+
+    Every node is a row of parallel arrays, in document order: parent
+    index, depth and interned text and link.  ``Node`` objects are only
+    materialized for the root and the issue nodes (depth 3 and less), the
+    checklist descendants of a sub-task are rendered from the arrays.
+    """
+
+    def __init__(self, config: MMConfig) -> None:
+        self.config = config
+        self.parents = array("i")
+        self.depths = array("H")
+        self.texts = []  # type: List[str]
+        self.links = []  # type: List[str]
+        self.nodes = {}  # type: Dict[str, Node]
+        # index of the open ancestor at each depth
+        self._path = []  # type: List[int]
+
+    def __len__(self) -> int:
+        return len(self.depths)
+
+    def add(self, record: MindmapRecord) -> Optional[Node]:
+        """Add a record, returns its Node if it is an issue node."""
+        index = len(self.depths)
+        del self._path[record.depth :]
+        self.parents.append(self._path[-1] if self._path else -1)
+        self.depths.append(record.depth)
+        self.texts.append(sys.intern(record.text))
+        self.links.append(sys.intern(record.link))
+        self._path.append(index)
+        if record.depth > 3:
+            return None
+        node = Node(self.config, record, self, index)
+        self.nodes[node.id] = node
+        return node
+
+    def checklist(self, index: int) -> List[str]:
+        """Wiki lines of the descendants of a node, in document order."""
+        depth = self.depths[index]
+        lines = []
+        for child in range(index + 1, len(self.depths)):
+            if self.depths[child] <= depth:
+                break
+            level = self.depths[child] - depth
+            lines.append(wiki_line(level, self.texts[child], self.links[child]))
+        return lines
+
+
+def node_tree(config: MMConfig, records: Iterable[MindmapRecord]) -> Iterable[Node]:
+    """Return the issue nodes for a stream of records, parents first.
+
+    The checklist of a sub-task is complete once its subtree has been
+    consumed.  Nodes deeper than sub-tasks only live in the compact tree.
+    """
+    tree = NodeTree(config)
+    for record in records:
+        node = tree.add(record)
+        if node is not None:
+            yield node
+
+
+def node_tree_with_depth(config: MMConfig, root: "untangle.Element") -> Iterable[Node]:
+    """Return a list of nodes with depth."""
+    yield from node_tree(config, untangle_records(root))
+
+
+def subtask_body(node: Node) -> str:
+    """Render the description of a sub-task."""
+    parts = []
+    if node.link:
+        parts.append(f"\n\n{node.link}")
+    parts.extend(f"\n{line}" for line in node.lines)
+    if node.note:
+        parts.append(f"-----------------------------\n\n\n{node.note}")
+    return "".join(parts)
+
+
+def auto_fields(config: MMConfig, node: Node, parent_key: Optional[str]) -> Dict:
+    """Return the fields set from the node itself."""
+    auto = {"Summary": node.text}  # type: Dict[str, Any]
+    if node.depth_type == config.TYPE_EPIC:
+        auto["Epic Name"] = node.text
+        auto["Description"] = node.note or "---"
+    elif node.depth_type == config.TYPE_TASK:
+        auto["Epic Link"] = parent_key
+        auto["Description"] = node.note or "---"
+    else:
+        auto["Parent"] = {
             "key": parent_key,
         }
-        working["Description"] = body or "---"
-        conv = config.jira.to_jira_dct(working)
-        key = config.jira.submit(conv)
-        LOG.info(f"Created Issue -> {config.jira_url}/browse/{key}")
-        node.config.set("jira", "json_body", json.dumps(working))
-        node.config.set("jira", "key", key)
-        node.config.set("jira", "is_linked", "false")
-        LOG.info(f"Writing config file {key}")
-        with node.cfile.open("w") as f:
-            LOG.info(f"writing {node.text} -> {node.cfile}")
-            node.config.write(f)
-
-
-def create_tasks(config: MMConfig, nodes: Iterable[Node]) -> None:
-    """Create epic."""
-    for node in nodes:
-        if node.depth_type != config.TYPE_TASK:
-            continue
-        if node.cfile.exists():
-            LOG.info(f"{node.cfile} exists, skipping")
-            continue
-
-        parent_key = node.parent_config["jira"]["key"]
-
-        working = dict(config.data_dct[config.TYPE_TASK])
-        working["Summary"] = node.text
-        working["Epic Link"] = parent_key
-        working["Description"] = node.note or "---"
-        conv = config.jira.to_jira_dct(working)
-        key = config.jira.submit(conv)
-        LOG.info(f"Created Issue -> {config.jira_url}/browse/{key}")
-        node.config.set("jira", "json_body", json.dumps(working))
-        node.config.set("jira", "key", key)
-        node.config.set("jira", "is_linked", "false")
-        LOG.info(f"Writing config file {key}")
-        with node.cfile.open("w") as f:
-            LOG.info(f"writing {node.text} -> {node.cfile}")
-            node.config.write(f)
-
-
-def create_epics(config: MMConfig, nodes: Iterable[Node]) -> None:
-    """Create epic."""
-    runlist = []
-    for node in nodes:
-        if node.depth_type != config.TYPE_EPIC:
-            continue
-        runlist.append(node)
-        if node.cfile.exists():
-            LOG.info(f"{node.cfile} exists, skipping")
-            continue
-        working = dict(config.data_dct[config.TYPE_EPIC])
-        working["Summary"] = node.text
-        working["Epic Name"] = node.text
-        working["Description"] = node.note or "---"
-        conv = config.jira.to_jira_dct(working)
-        key = config.jira.submit(conv)
-        LOG.info(f"Created Issue -> {config.jira_url}/browse/{key}")
-        node.config.set("jira", "json_body", json.dumps(working))
-        node.config.set("jira", "key", key)
-        node.config.set("jira", "is_linked", "false")
-        LOG.info(f"Writing config file {key}")
-        with node.cfile.open("w") as f:
-            LOG.info(f"writing {node.text} -> {node.cfile}")
-            node.config.write(f)
-
-    for node in runlist:
-        with node.cfile.open() as f:
-            node.config.read_file(f)
-        if node.config.get("jira", "key") == "None":
-            raise ValueError(f"{node.cfile} has no key")
-        if node.config.get("jira", "is_linked") == "true":
-            LOG.info(f"{node.cfile} is linked, skipping")
-            continue
-        config.jira.link_parent_issue(
-            node.config.get("jira", "key"), config.project_parent_issue_key
-        )
-        node.config.set("jira", "is_linked", "true")
-        with node.cfile.open("w") as f:
-            LOG.info(f"updating with linked {node.text} -> {node.cfile}")
-            node.config.write(f)
+        auto["Description"] = subtask_body(node) or "---"
+    return auto
+
+
+def content_hash(auto: Dict[str, Any]) -> str:
+    """Hash of the rendered Summary and Description."""
+    text = f"{auto.get('Summary', '')}\0{auto.get('Description', '')}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def node_signature(node: Node) -> int:
+    """Hash of everything the issue of a node is rendered from."""
+    lines = tuple(node.lines) if node.depth == 3 else ()
+    return hash((node.depth, node.parent_id, node.text, node.link, node.note, lines))
+
+
+def node_payload(
+    config: MMConfig, node: Node, parent_key: Optional[str]
+) -> Tuple[Dict, Dict]:
+    """Return the stored fields and the encoded jira payload of a node."""
+    auto = auto_fields(config, node, parent_key)
+    payload = config.encoder(node.depth_type).encode(auto)
+    working = dict(config.data_dct[node.depth_type])
+    working.pop("Project", None)
+    working.pop("Issue Type", None)
+    working.update(auto)
+    return working, payload
+
+
+def save_created(
+    config: MMConfig, node_id: str, working: Dict, key: str, linked: bool = False
+) -> None:
+    """Write the state of a newly created issue.
+
+    ``linked`` is set when the issue was created with its parent link.
+    """
+    LOG.info(f"Created Issue -> {config.jira_url}/browse/{key}")
+    config.state.put(
+        node_id,
+        {
+            "json_body": json.dumps(working),
+            "key": key,
+            "is_linked": linked,
+            "content_hash": content_hash(working),
+        },
+    )
 
 
 def show_summary(config: MMConfig, nodes: Iterable[Node]) -> None:
@@ -263,5 +296,4 @@ def show_summary(config: MMConfig, nodes: Iterable[Node]) -> None:
             config.TYPE_SUBTASK,
         ]:
             continue
-        key = node.config.get("jira", "key")
-        LOG.info(f"{config.jira_url}/browse/{key} -> {node.text}")
+        LOG.info(f"{config.jira_url}/browse/{node.key} -> {node.text}")
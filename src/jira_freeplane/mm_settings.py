@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Common params."""
+import hashlib
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple
-
-import yaml
-from simple_term_menu import TerminalMenu
+from typing import Dict, List, Optional, Tuple
 
 from jira_freeplane.common import AUTOFIELDS, LOG, yesno
-from jira_freeplane.libjira import Field, JiraInterface
+from jira_freeplane.libjira import (EPIC_LINK_MODES, SEARCH_PAGE_SIZE,
+                                    ClientPool, Field, JiraInterface)
+from jira_freeplane.metrics import Metrics
+from jira_freeplane.schema import PayloadTemplate
+from jira_freeplane.state import open_state_store
 
 class MMConfig:
     """Config class."""
@@ -31,8 +33,36 @@ class MMConfig:
         skip_optional: bool,
         dry_run: bool,
         debug=False,
+        workers: int = 4,
+        state_backend: str = "ini",
+        metadata_ttl: int = 86400,
+        metadata_api: str = "auto",
+        transport: str = "jira",
+        rate_limit: float = 0,
+        max_retries: int = 5,
+        offline: bool = False,
+        epic_link_mode: str = "batch",
+        metrics_file: str = "",
+        metrics_textfile: str = "",
+        journal: bool = True,
+        journal_cleanup: bool = False,
+        search_page_size: int = SEARCH_PAGE_SIZE,
+        clients: Optional[ClientPool] = None,
+        shared_cache_dir: str = "",
     ) -> None:
+        import yaml  # only needed once a config is loaded
+
+        self.metrics = Metrics()
         self.mm_file = mm_file
+        self.workers = workers
+        if epic_link_mode not in EPIC_LINK_MODES:
+            raise SystemExit(
+                f"Unknown epic link mode: {epic_link_mode}, use one of {EPIC_LINK_MODES}"
+            )
+        self.epic_link_mode = epic_link_mode
+        self.journal = journal
+        self.journal_cleanup = journal_cleanup
+        self.search_page_size = max(1, search_page_size)
         self.dry_run = dry_run
         self.debug = debug
         self.no_prompt = noprompt
@@ -44,6 +74,18 @@ class MMConfig:
         self.working_dir = Path(working_dir).absolute().joinpath(project_parent_issue_key)
         self.cache_dir = self.working_dir.joinpath("cache")
         self.file_settings = self.working_dir.joinpath("settings.yaml")
+        self.metrics_file = self.working_dir.joinpath("metrics.json")
+        if metrics_file:
+            self.metrics_file = Path(metrics_file)
+        self.metrics_textfile = Path(metrics_textfile) if metrics_textfile else None
+        # mindmaps can share a working directory, each has its own queue and
+        # digest of the last synced file
+        mm_path = Path(mm_file).absolute()
+        mm_id = hashlib.sha256(str(mm_path).encode()).hexdigest()[:8]
+        self.retry_file = self.working_dir.joinpath(
+            f"{mm_path.stem}.{mm_id}.retry.plan.jsonl"
+        )
+        self.mm_hash_meta = f"mm_hash.{mm_id}"
         self.skip_optional = skip_optional
         self.interactive_seen = []
         make_config = False
@@ -62,8 +104,40 @@ class MMConfig:
             else:
                 raise SystemExit("Cache directory does not exist. Exiting...")
 
-        LOG.info(f'Initializing JIRA client for "{self.jira_url}"')
-        self.jira = JiraInterface(self.cache_dir, self.jira_url)
+        def _client(
+            concurrency: int, metrics: Optional[Metrics] = None
+        ) -> JiraInterface:
+            LOG.info(f'Initializing JIRA client for "{self.jira_url}"')
+            return JiraInterface(
+                self.cache_dir,
+                self.jira_url,
+                metadata_ttl=metadata_ttl,
+                metadata_api=metadata_api,
+                transport=transport,
+                workers=concurrency,
+                rate_limit=rate_limit,
+                max_retries=max_retries,
+                offline=offline,
+                metrics=metrics,
+                shared_cache_dir=Path(shared_cache_dir).expanduser()
+                if shared_cache_dir
+                else None,
+            )
+
+        if clients is None:
+            self.jira = _client(workers, self.metrics)
+        else:
+            # requests of a shared client are counted in its own metrics
+            options = dict(
+                metadata_ttl=metadata_ttl,
+                metadata_api=metadata_api,
+                transport=transport,
+                rate_limit=rate_limit,
+                max_retries=max_retries,
+                offline=offline,
+                shared_cache_dir=shared_cache_dir,
+            )
+            self.jira = clients.get(self.jira_url, _client, options)
         do_create = False
         if self.file_settings.exists():
             self.settings = yaml.load(
@@ -81,6 +155,7 @@ class MMConfig:
         if not self.data_dir.exists():
             LOG.info(f"Creating missing {self.data_dir}")
             self.data_dir.mkdir(parents=True)
+        self.state = open_state_store(state_backend, self.data_dir, self.metrics)
 
         if not self.cache_dir.exists():
             LOG.info(f"Creating missing {self.cache_dir}")
@@ -89,14 +164,34 @@ class MMConfig:
         self.field_dct = {}  # type: Dict[str, List[Field]]
         self.files = {}  # type: Dict[str, Path]
         self.data_dct = {}  # type: Dict[str, Dict[str, str]]
-        for i in [self.TYPE_EPIC, self.TYPE_TASK, self.TYPE_SUBTASK]:
-            self.field_dct[i] = self.jira.get_field_objects(project_key, i.capitalize())
-
+        self.encoders = {}  # type: Dict[str, PayloadTemplate]
         self.files[self.TYPE_EPIC] = self.working_dir.joinpath(self.TYPE_EPIC + ".yaml")
         self.files[self.TYPE_TASK] = self.working_dir.joinpath(self.TYPE_TASK + ".yaml")
         self.files[self.TYPE_SUBTASK] = self.working_dir.joinpath(
             self.TYPE_SUBTASK + ".yaml"
         )
+        templates = {}  # type: Dict[str, Dict[str, str]]
+        for _type, file in self.files.items():
+            if do_create or not file.exists():
+                continue
+            templates[_type] = yaml.load(file.read_text(), Loader=yaml.FullLoader)
+            # existing templates only need the fields they reference
+            names = list(templates[_type]) + list(self.settings)  # type: ignore
+            if _type == self.TYPE_EPIC and epic_link_mode == "embed":
+                names.append("Linked Issues")
+            if journal:
+                names.append("Labels")
+            self.jira.reference_fields(project_key, _type.capitalize(), names)
+
+        types = [self.TYPE_EPIC, self.TYPE_TASK, self.TYPE_SUBTASK]
+        with self.metrics.timer("metadata"):
+            self.jira.warm_metadata(project_key, [i.capitalize() for i in types])
+            for i in types:
+                name = i.capitalize()
+                self.jira.metadata.reference(self.cache_dir, project_key, name)
+                self.field_dct[i] = self.jira.get_field_objects(
+                    project_key, i.capitalize()
+                )
 
         LOG.info(f"JIRA URL: {self.jira_url}")
         LOG.info(f"Epic Parent: {self.project_parent_issue_key}")
@@ -106,7 +201,9 @@ class MMConfig:
             with self.file_settings.open("w") as f:
                 f.write(yaml.dump(self.settings, default_flow_style=False))  # type: ignore
         for _type, file in self.files.items():
-            if file.exists():
+            if _type in templates:
+                self.data_dct[_type] = templates[_type]
+            elif file.exists():
                 self.data_dct[_type] = yaml.load(  # type: ignore
                     file.read_text(), Loader=yaml.FullLoader
                 )
@@ -125,7 +222,28 @@ class MMConfig:
             print(json.dumps(self.data_dct[_type], indent=4))
         print(json.dumps(self.settings, indent=4, separators=(",", " : ")))
 
+    def encoder(self, _type: str) -> PayloadTemplate:
+        """Encoded issue template of a type."""
+        if _type not in self.encoders:
+            self.encoders[_type] = self.jira.payload_template(self.data_dct[_type])
+        return self.encoders[_type]
+
+    def marker_field(self, _type: str) -> Optional[str]:
+        """Id of the labels field carrying the journal marker of a type."""
+        if not self.journal:
+            return None
+        field = self.encoder(_type).schema.by_name.get("Labels")
+        return field.id if field is not None else None
+
+    def compile_templates(self) -> None:
+        """Validate and encode every issue template before any issue is made."""
+        with self.metrics.timer("templates"):
+            for _type in self.data_dct:
+                self.encoder(_type)
+
     def get_values(self, field: Field):
+        from simple_term_menu import TerminalMenu  # only needed when prompting
+
         prefix = "Select "
         esc = "(ESC to skip)"
         if field.required:
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Execution plans.
+
+A plan is a JSON Lines file, a header followed by one operation per line:
+
+- ``create``: the encoded jira fields of a new issue
+- ``update``: the changed fields of an existing issue
+- ``link``: link an epic to the project parent issue
+
+Keys of issues that do not exist yet are written as ``{"$ref": <node id>}``
+and replaced by the key once the issue has been created.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from jira_freeplane.common import LOG, atomic_open
+from jira_freeplane.journal import clear_markers, mark_pending, reconcile
+from jira_freeplane.mm import Node, auto_fields, content_hash, node_payload, save_created
+from jira_freeplane.mm_settings import MMConfig
+from jira_freeplane.scheduler import Job, Scheduler
+
+# version of the plan format
+PLAN_VERSION = 1
+
+OPS = ["create", "update", "link"]
+
+
+def issue_ref(node_id: str) -> Dict[str, str]:
+    """Symbolic key of an issue created by an earlier operation."""
+    return {"$ref": node_id}
+
+
+def resolve_refs(value: Any, keys: Dict[str, str]) -> Any:
+    """Replace symbolic keys with the keys of the created issues."""
+    if isinstance(value, dict):
+        if list(value) == ["$ref"]:
+            return keys[value["$ref"]]
+        return {k: resolve_refs(v, keys) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_refs(v, keys) for v in value]
+    return value
+
+
+def plan_update(
+    config: MMConfig, node: Node, state: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Update operation of an existing issue, None if it is unchanged.
+
+    Only the fields that differ from the stored ``json_body`` are sent,
+    an operation without fields only records the content hash.
+    """
+    auto = auto_fields(config, node, node.parent_key)
+    current = content_hash(auto)
+    if state.get("content_hash") == current:
+        return None
+    stored = json.loads(state.get("json_body") or "{}")
+    fields = {}
+    # state written before hashes were stored only needs the hash
+    if "content_hash" in state or content_hash(stored) != current:
+        schema = config.encoder(node.depth_type).schema
+        for name in ["Summary", "Description"]:
+            if stored.get(name) != auto[name]:
+                fields[schema.by_name[name].id] = auto[name]
+    stored.update(auto)
+    return {
+        "op": "update",
+        "ref": node.id,
+        "key": state["key"],
+        "fields": fields,
+        "working": stored,
+        "hash": current,
+    }
+
+
+def embed_epic_links(config: MMConfig) -> bool:
+    """Check if epics are linked to the project parent issue on creation."""
+    if config.epic_link_mode != "embed":
+        return False
+    schema = config.encoder(config.TYPE_EPIC).schema
+    if config.jira.accepts_links(schema.project, schema.issue_type):
+        return True
+    LOG.info("Epics can not be created with issue links, linking them afterwards")
+    return False
+
+
+def plan_ops(config: MMConfig, nodes: Iterable[Node]) -> Iterator[Dict[str, Any]]:
+    """Operations that bring jira in line with the mindmap, parents first."""
+    types = [config.TYPE_EPIC, config.TYPE_TASK, config.TYPE_SUBTASK]
+    embed = embed_epic_links(config)
+    keys = {}  # type: Dict[str, str]
+    for node in nodes:
+        if node.depth_type not in types:
+            continue
+        state = node.state
+        key = state.get("key")
+        linked = state.get("is_linked", False)
+        if key:
+            keys[node.id] = key
+            update = plan_update(config, node, state)
+            if update is not None:
+                yield update
+        else:
+            parent = None
+            parent_key = None  # type: Any
+            if node.depth > 1:
+                # the parent is not among the nodes when only changes are planned
+                parent_key = keys.get(node.parent_id) or node.parent_key  # type: ignore
+                if parent_key is None:
+                    parent = node.parent_id
+                    parent_key = issue_ref(parent)  # type: ignore
+            working, payload = node_payload(config, node, parent_key)
+            op = {
+                "op": "create",
+                "ref": node.id,
+                "parent": parent,
+                "type": node.depth_type,
+                "fields": payload,
+                "working": working,
+                "hash": content_hash(working),
+            }
+            if embed and node.depth_type == config.TYPE_EPIC:
+                # linked by the create request itself
+                op["link"] = config.project_parent_issue_key
+                linked = True
+            yield op
+        if node.depth_type == config.TYPE_EPIC and not linked:
+            yield {
+                "op": "link",
+                "ref": node.id,
+                "key": key or issue_ref(node.id),
+                "parent": config.project_parent_issue_key,
+            }
+
+
+def plan_header(config: MMConfig, mm_hash: str) -> Dict[str, Any]:
+    """Header line of a plan."""
+    return {
+        "op": "plan",
+        "version": PLAN_VERSION,
+        "mm_file": str(config.mm_file),
+        "mm_hash": mm_hash,
+        "jira_url": config.jira_url,
+        "project_parent_issue_key": config.project_parent_issue_key,
+    }
+
+
+def write_plan(
+    path: Path, header: Dict[str, Any], ops: Iterable[Dict[str, Any]]
+) -> Dict[str, int]:
+    """Write a plan, returns the number of operations per type."""
+    counts = {op: 0 for op in OPS}
+    with atomic_open(path) as f:
+        f.write(json.dumps(header) + "\n")
+        for op in ops:
+            f.write(json.dumps(op, separators=(",", ":")) + "\n")
+            counts[op["op"]] += 1
+    return counts
+
+
+def _header(path: Path, line: str) -> Dict[str, Any]:
+    header = json.loads(line or "{}")
+    if header.get("op") != "plan" or header.get("version") != PLAN_VERSION:
+        raise SystemExit(f"{path} is not a version {PLAN_VERSION} plan")
+    return header
+
+
+def read_plan_header(path: Path) -> Dict[str, Any]:
+    """Read only the header of a plan."""
+    with path.open() as f:
+        return _header(path, f.readline())
+
+
+def read_plan(path: Path) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """Read the header of a plan, the operations are streamed."""
+    f = path.open()
+    try:
+        header = _header(path, f.readline())
+    except SystemExit:
+        f.close()
+        raise
+
+    def _ops() -> Iterator[Dict[str, Any]]:
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, _ops()
+
+
+class RetryQueue:
+    """Operations that failed, written as a plan to apply again.
+
+    Applying the queue retries just those operations, without walking the
+    mindmap.  An empty queue removes the file.
+    """
+
+    def __init__(self, path: Path, header: Dict[str, Any]) -> None:
+        self.path = path
+        self.header = header
+        self.ops = []  # type: List[Dict[str, Any]]
+
+    def add(self, ops: Iterable[Dict[str, Any]]) -> None:
+        """Queue operations."""
+        self.ops.extend(ops)
+
+    def save(self) -> None:
+        """Write the queue, or remove it when nothing failed."""
+        if self.ops:
+            write_plan(self.path, self.header, self.ops)
+            LOG.error(
+                "%s failed operations were queued, retry them with: "
+                "jira-freeplane apply -c <project.ini> %s",
+                len(self.ops),
+                self.path,
+            )
+        elif self.path.exists():
+            self.path.unlink()
+
+
+class PlanJob(Job):
+    """Scheduler job for a create operation."""
+
+    def __init__(self, config: MMConfig, op: Dict[str, Any]) -> None:
+        super().__init__(op["ref"], op["parent"], op["type"])
+        self.config = config
+        self.op = op
+        self.working = {}  # type: Dict[str, Any]
+
+    def build(self, parent_key: Optional[str]) -> Dict[str, Any]:
+        """Build the jira payload."""
+        keys = {self.parent_ref: parent_key} if self.parent_ref else {}
+        self.working = resolve_refs(self.op["working"], keys)  # type: ignore
+        if self.op.get("link"):
+            self.update = self.config.jira.parent_link_update(self.op["link"])
+        fields = resolve_refs(self.op["fields"], keys)  # type: ignore
+        return mark_pending(self.config, self.ref, self.group, fields, self.working)
+
+    def created(self, key: str) -> None:
+        """Save state."""
+        save_created(
+            self.config, self.ref, self.working, key, linked=bool(self.op.get("link"))
+        )
+        if not self.config.journal_cleanup:
+            # the label stays on the issue, no edit request to remove it
+            self.config.state.put(self.ref, {"marker": ""})
+        self.config.metrics.count("issues_created")
+
+
+def apply_links(config: MMConfig, links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Link epics to the project parent issue, concurrently.
+
+    Returns the operations that failed, epics that were not created included.
+    """
+    pending = []
+    failed = []  # type: List[Dict[str, Any]]
+    for op in links:
+        state = config.state.get(op["ref"])
+        if state.get("is_linked"):
+            LOG.info(f"{op['ref']} / {state.get('key')} is linked, skipping")
+            continue
+        key = state.get("key") or op["key"]
+        if not isinstance(key, str):
+            LOG.error(f"{op['ref']}: epic was not created, not linking it")
+            failed.append(op)
+            continue
+        pending.append((op, key))
+    if not pending:
+        return failed
+    errors = config.jira.link_parent_issues(
+        [(key, op["parent"]) for op, key in pending], config.workers
+    )
+    for (op, key), error in zip(pending, errors):
+        if error:
+            LOG.error(f"{op['ref']} / {key}: {error}")
+            failed.append(op)
+            continue
+        LOG.info(f"updating with linked {key} -> {op['ref']}")
+        config.state.put(op["ref"], {"is_linked": True})
+        config.metrics.count("issues_linked")
+    config.state.commit()
+    return failed
+
+
+def apply_updates(
+    config: MMConfig, updates: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Push changed fields of existing issues, returns the operations that failed."""
+    pending = []
+    for op in updates:
+        if config.state.get(op["ref"]).get("content_hash") == op["hash"]:
+            continue
+        if not op["fields"]:
+            config.state.put(op["ref"], {"content_hash": op["hash"]})
+            continue
+        pending.append(op)
+    if not pending:
+        config.state.commit()
+        return []
+    LOG.info(f"Updating {len(pending)} changed issues")
+    errors = config.jira.update_issues(
+        [(op["key"], op["fields"]) for op in pending], config.workers
+    )
+    failed = []
+    for op, error in zip(pending, errors):
+        if error:
+            LOG.error(f"{op['ref']} / {op['key']}: {error}")
+            failed.append(op)
+            continue
+        LOG.info(f"Updated Issue -> {config.jira_url}/browse/{op['key']}")
+        config.state.put(
+            op["ref"], {"json_body": json.dumps(op["working"]), "content_hash": op["hash"]}
+        )
+        config.metrics.count("issues_updated")
+    config.state.commit()
+    return failed
+
+
+def apply_ops(
+    config: MMConfig, ops: Iterable[Dict[str, Any]], queue: RetryQueue
+) -> None:
+    """Apply plan operations.
+
+    Issues left pending by an interrupted run are reconciled first.  Create
+    operations are streamed into the scheduler, the journal labels of
+    reconciled issues are removed, links and updates follow once every issue
+    exists.  Operations already applied, according to the
+    state, are skipped so an interrupted plan can be applied again.  Failed
+    operations are written to ``queue``.
+    """
+    # the journal entries of a batch are durable before it is sent
+    scheduler = Scheduler(
+        config.jira, config.workers, before_submit=lambda _: config.state.commit()
+    )
+    links = []  # type: List[Dict[str, Any]]
+    updates = []  # type: List[Dict[str, Any]]
+
+    def _jobs() -> Iterator[Job]:
+        for op in ops:
+            if op["op"] == "create":
+                key = config.state.get(op["ref"]).get("key")
+                if key:
+                    LOG.info(f"{op['ref']} / {key} exists, skipping")
+                    scheduler.resolve(op["ref"], key)
+                    continue
+                parent = op["parent"]
+                if parent and parent not in scheduler.keys:
+                    # created by an earlier run, e.g. a queued operation
+                    parent_key = config.state.get(parent).get("key")
+                    if parent_key:
+                        scheduler.resolve(parent, parent_key)
+                yield PlanJob(config, op)
+            elif op["op"] == "link":
+                links.append(op)
+            elif op["op"] == "update":
+                updates.append(op)
+            else:
+                raise SystemExit(f"Unknown plan operation: {op['op']}")
+
+    with config.metrics.timer("reconcile"):
+        reconcile(config)
+    LOG.info("Creating issues with %s workers...", config.workers)
+    try:
+        with config.metrics.timer("create"):
+            scheduler.run(_jobs())
+    except SystemExit:
+        if not scheduler.failed:
+            raise
+        queue.add(job.op for job in scheduler.failed)  # type: ignore
+    finally:
+        config.state.commit()
+    with config.metrics.timer("journal"):
+        clear_markers(config)
+    try:
+        LOG.info("Linking Epics...")
+        with config.metrics.timer("link"):
+            queue.add(apply_links(config, links))
+        LOG.info("Syncing changed issues...")
+        with config.metrics.timer("update"):
+            queue.add(apply_updates(config, updates))
+    finally:
+        queue.save()
+    if queue.ops:
+        raise SystemExit(f"Failed to apply {len(queue.ops)} operations")
@@ -2,26 +2,42 @@
 # -*- coding: utf-8 -*-
 """CLI / Runtime interface."""
 import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-import untangle
-
-from jira_freeplane.common import LOG, prompt_line, yesno
-from jira_freeplane.mm import (create_epics, create_subtasks, create_tasks,
-                               node_tree_with_depth, show_summary)
+from jira_freeplane.batch import read_batch, state_groups, write_report
+from jira_freeplane.common import LOG, file_digest, prompt_line, yesno
+from jira_freeplane.libjira import ClientPool
+from jira_freeplane.loader import iter_mindmap
+from jira_freeplane.mm import Node, node_signature, node_tree, show_summary
 from jira_freeplane.mm_settings import MMConfig
+from jira_freeplane.plan import (RetryQueue, apply_ops, plan_header, plan_ops,
+                                 read_plan, read_plan_header, write_plan)
+from jira_freeplane.verify import verify_issues
+from jira_freeplane.watch import WATCH_DEBOUNCE, WATCH_INTERVAL, watch_changes
 
+# run is used when no command is given
+COMMANDS = ["run", "plan", "apply", "verify", "watch", "batch"]
 
-def mindmap_to_jira(conf: MMConfig):
-    """Run main function."""
-    LOG.info("Starting...")
-    LOG.info("Arguments: %s", conf)
+
+def parse_nodes(conf: MMConfig) -> List[Node]:
+    """Parse the issue nodes of the mindmap."""
     LOG.info("Parsing XML...")
-    dct = untangle.parse(str(conf.mm_file))
-    rmap = dct.map  # type untangle.Element
-    root = rmap.node  # type: ignore
-    LOG.info("Root node: %s", root["TEXT"])
+    with conf.metrics.timer("parse"):
+        nodes = list(node_tree(conf, iter_mindmap(conf.mm_file)))
+    if not nodes:
+        raise SystemExit(f"{conf.mm_file} has no nodes")
+    tree = nodes[0].tree
+    LOG.info("Root node: %s, %s nodes, %s issue nodes", nodes[0].text, len(tree), len(nodes))
+    return nodes
+
+
+def check_templates(conf: MMConfig) -> None:
+    """Check the issue templates against the jira metadata and encode them."""
     LOG.info("Loading JIRA metadata...")
     errors = []
     LOG.info("Santity checking config files...")
@@ -42,50 +58,389 @@ def mindmap_to_jira(conf: MMConfig):
         for msg in errors:
             LOG.error(msg)
         raise SystemExit("Missing required fields")
-    nodes = list(node_tree_with_depth(conf, root))
+    LOG.info("Encoding issue templates...")
+    conf.compile_templates()
+
+
+def load_nodes(conf: MMConfig) -> List[Node]:
+    """Parse the mindmap and check the issue templates against it."""
+    nodes = parse_nodes(conf)
+    check_templates(conf)
+    tree = nodes[0].tree
     if conf.debug:
-        for node in nodes:
-            LOG.info(f"Node: {node.depth_type}, {node.depth}, {node.text}")
+        for index in range(len(tree)):
+            LOG.info(
+                f"Node: {tree.depths[index]}, parent {tree.parents[index]}, "
+                f"{tree.texts[index]}"
+            )
     LOG.info(
         f"Conf type: epic:{conf.TYPE_EPIC}, task:{conf.TYPE_TASK}, sub-task:{conf.TYPE_SUBTASK}"
     )
+    return nodes
+
+
+def plan_mindmap(conf: MMConfig, output: Path) -> None:
+    """Write the plan of a mindmap, without talking to jira."""
+    LOG.info("Starting...")
+    mm_hash = file_digest(conf.mm_file)
+    nodes = load_nodes(conf)
+    with conf.metrics.timer("plan"):
+        counts = write_plan(output, plan_header(conf, mm_hash), plan_ops(conf, nodes))
+    LOG.info(
+        "Wrote %s: %s creates, %s updates, %s links",
+        output,
+        counts["create"],
+        counts["update"],
+        counts["link"],
+    )
+
+
+def apply_plan(conf: MMConfig, path: Path) -> None:
+    """Apply a plan written by plan_mindmap."""
+    LOG.info("Starting...")
+    header, ops = read_plan(path)
+    for name in ["jira_url", "project_parent_issue_key"]:
+        if header[name] != getattr(conf, name):
+            raise SystemExit(
+                f"{path} was planned for {name} {header[name]}, "
+                f"not {getattr(conf, name)}"
+            )
+    conf.compile_templates()
+    apply_ops(conf, ops, RetryQueue(conf.retry_file, header))
+    conf.state.set_meta(conf.mm_hash_meta, header["mm_hash"])
+    LOG.info("Done!")
+
+
+def mindmap_to_jira(conf: MMConfig):
+    """Run main function."""
+    LOG.info("Starting...")
+    LOG.info("Arguments: %s", conf)
+    mm_hash = file_digest(conf.mm_file)
+    if not conf.dry_run and mm_hash == conf.state.get_meta(conf.mm_hash_meta):
+        LOG.info("%s is unchanged since the last run, nothing to do", conf.mm_file)
+        return
+    nodes = load_nodes(conf)
     if conf.dry_run:
-        LOG.info("Dry run enabled, not creating issues")
+        output = conf.working_dir.joinpath("plan.jsonl")
+        LOG.info("Dry run enabled, not creating issues, writing the plan to %s", output)
+        with conf.metrics.timer("plan"):
+            write_plan(output, plan_header(conf, mm_hash), plan_ops(conf, nodes))
     else:
         # Start the stuffs
-        LOG.info("Creating Epics...")
-        create_epics(conf, nodes)
-        LOG.info("Creating Tasks...")
-        create_tasks(conf, nodes)
-        LOG.info("Creating Subtasks...")
-        create_subtasks(conf, nodes)
+        with conf.metrics.timer("plan"):
+            ops = list(plan_ops(conf, nodes))
+        queue = RetryQueue(conf.retry_file, plan_header(conf, mm_hash))
+        apply_ops(conf, ops, queue)
+        conf.state.set_meta(conf.mm_hash_meta, mm_hash)
         LOG.info("Done!")
         show_summary(conf, nodes)
 
 
-def get_args():
-    parser = argparse.ArgumentParser(
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        description=__doc__,
+def sync_changes(conf: MMConfig, seen: Dict[str, int]) -> None:
+    """Sync the nodes that changed since the last sync of a watch.
+
+    ``seen`` holds the signature of every node at the last successful sync,
+    only nodes with another signature are planned, all of them when it is
+    empty.  It is updated once the changes were applied, so the nodes of a
+    failed sync are planned again by the next one.
+    """
+    mm_hash = file_digest(conf.mm_file)
+    nodes = parse_nodes(conf)
+    # the root is not an issue
+    current = {node.id: node_signature(node) for node in nodes[1:]}
+    changed = [node for node in nodes[1:] if seen.get(node.id) != current[node.id]]
+    if mm_hash == conf.state.get_meta(conf.mm_hash_meta):
+        LOG.info("%s is unchanged since the last run, nothing to do", conf.mm_file)
+    else:
+        LOG.info("%s of %s issue nodes changed", len(changed), len(current))
+        if changed:
+            with conf.metrics.timer("plan"):
+                ops = list(plan_ops(conf, changed))
+            queue = RetryQueue(conf.retry_file, plan_header(conf, mm_hash))
+            apply_ops(conf, ops, queue)
+            show_summary(conf, changed)
+        conf.state.set_meta(conf.mm_hash_meta, mm_hash)
+    seen.clear()
+    seen.update(current)
+
+
+def watch_mindmap(conf: MMConfig, interval: float, debounce: float) -> None:
+    """Sync a mindmap on every save, until interrupted.
+
+    The jira session, metadata and encoded templates are set up and checked
+    once.  Each save is parsed again and compared with the last synced
+    parse, only the new and changed nodes are planned and sent.  A failed
+    sync is logged and retried on the next save.
+    """
+    check_templates(conf)
+    seen = {}  # type: Dict[str, int]
+    LOG.info("Watching %s, stop with ctrl-c", conf.mm_file)
+    for _ in watch_changes(conf.mm_file, interval, debounce):
+        try:
+            sync_changes(conf, seen)
+        except SystemExit as e:
+            LOG.error("Sync failed: %s", e)
+        except Exception as e:  # pylint: disable=broad-except
+            LOG.exception("Sync failed: %s", e)
+        write_metrics(conf, "watch")
+
+
+def batch_sync(
+    clients: ClientPool, mm_file: Path, ini: Path
+) -> Dict[str, Any]:
+    """Sync one mindmap of a batch, returns its result."""
+    LOG.info("Syncing %s with %s...", mm_file, ini)
+    start = time.monotonic()
+    result = {
+        "mm_file": str(mm_file),
+        "config": str(ini),
+        "status": "ok",
+        "error": None,
+    }  # type: Dict[str, Any]
+    conf = None
+    try:
+        args = argparse.Namespace(config=str(ini), interactive=False)
+        conf = load_config(args, mm_file, clients=clients, noprompt=True)
+        mindmap_to_jira(conf)
+    except SystemExit as e:
+        result.update(status="failed", error=str(e))
+    except Exception as e:  # pylint: disable=broad-except
+        LOG.exception("%s failed", mm_file)
+        result.update(status="failed", error=str(e))
+    finally:
+        if conf is not None:
+            conf.state.close()
+            write_metrics(conf, "batch")
+            result["counters"] = dict(conf.metrics.counters)
+    result["seconds"] = round(time.monotonic() - start, 3)
+    return result
+
+
+def run_batch(
+    pairs: List[Tuple[Path, Path]], jobs: int, concurrency: int, report_file: Path
+) -> None:
+    """Sync many mindmaps in one process.
+
+    ``jobs`` mindmaps are synced at once, those sharing a state one after
+    another.  They share one client per jira server, with its session,
+    metadata and a limit of ``concurrency`` requests in flight.  Every
+    mindmap is synced even if others fail, the result of each is written to
+    ``report_file``.
+    """
+    LOG.info("Syncing %s mindmaps, %s at a time...", len(pairs), jobs)
+    start = time.monotonic()
+    clients = ClientPool(concurrency)
+
+    def _sync_group(group: List[Tuple[Path, Path]]) -> List[Dict[str, Any]]:
+        return [batch_sync(clients, mm_file, ini) for mm_file, ini in group]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            grouped = list(pool.map(_sync_group, state_groups(pairs)))
+    finally:
+        clients.close()
+    done = {(r["mm_file"], r["config"]): r for group in grouped for r in group}
+    results = [done[(str(mm_file), str(ini))] for mm_file, ini in pairs]
+    failed = [r for r in results if r["status"] != "ok"]
+    write_report(
+        report_file,
+        {
+            "seconds": round(time.monotonic() - start, 3),
+            "mindmaps": len(results),
+            "failed": len(failed),
+            "results": results,
+            "servers": [
+                client.metrics.report(url=url)
+                for (url, _), client in clients.clients.items()
+            ],
+        },
     )
-    parser.add_argument(
+    for result in results:
+        LOG.info(
+            "%s: %s in %ss %s",
+            result["mm_file"],
+            result["status"],
+            result["seconds"],
+            result["error"] or "",
+        )
+    LOG.info("Wrote %s", report_file)
+    if failed:
+        raise SystemExit(f"{len(failed)} of {len(results)} mindmaps failed")
+
+
+def verify_mindmap(conf: MMConfig) -> None:
+    """Check that the issues of a mindmap still exist where they were made."""
+    LOG.info("Starting...")
+    with conf.metrics.timer("parse"):
+        nodes = list(node_tree(conf, iter_mindmap(conf.mm_file)))
+    with conf.metrics.timer("verify"):
+        problems = verify_issues(conf, nodes)
+    for name, messages in problems.items():
+        for msg in messages:
+            LOG.error(f"{name}: {msg}")
+    if any(problems.values()):
+        raise SystemExit(
+            ", ".join(f"{len(problems[name])} {name}" for name in problems)
+        )
+    LOG.info("Done, every issue was found")
+
+
+def write_metrics(conf: MMConfig, command: str) -> None:
+    """Write the metrics report of the run, and the prometheus textfile.
+
+    Requests of a client shared by a batch are counted in its own metrics,
+    they are written once, to the batch report.
+    """
+    shared = conf.jira.metrics is not conf.metrics
+    try:
+        report = conf.metrics.write(
+            conf.metrics_file,
+            conf.metrics_textfile,
+            with_requests=not shared,
+            command=command,
+            mm_file=str(conf.mm_file),
+        )
+    except OSError as e:
+        LOG.error("Could not write metrics: %s", e)
+        return
+    if shared:
+        LOG.info(
+            "Metrics written to %s, the jira requests are in the batch report",
+            conf.metrics_file,
+        )
+        return
+    LOG.info(
+        "%s jira requests, %s retries in %.1fs, metrics written to %s",
+        report["requests"]["total"],
+        report["requests"]["retries"],
+        report["wall_seconds"],
+        conf.metrics_file,
+    )
+
+
+def get_args(argv: Optional[List[str]] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] not in COMMANDS and argv[0] not in ["-h", "--help"]:
+        # jira-freeplane [-c project.ini] map.mm, from before the commands
+        argv = ["run"] + argv
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
         "--config",
         "-c",
         help="Path to the project.ini file",
         type=str,
     )
-    parser.add_argument(
+    common.add_argument(
         "--interactive",
         "-i",
         help="Run in interactive mode",
         action="store_true",
     )
-    parser.add_argument(
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=__doc__,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser(
+        "run", parents=[common], help="Create and update the issues of a mindmap"
+    )
+    run.add_argument(
+        "mm_file",
+        help="Path to the mindmap file",
+        type=str,
+    )
+    plan = commands.add_parser(
+        "plan",
+        parents=[common],
+        help="Write the jira operations of a mindmap to a plan file, offline",
+    )
+    plan.add_argument(
+        "mm_file",
+        help="Path to the mindmap file",
+        type=str,
+    )
+    plan.add_argument(
+        "--output",
+        "-o",
+        help="Path to the plan file, <mindmap>.plan.jsonl by default",
+        type=str,
+    )
+    apply = commands.add_parser(
+        "apply", parents=[common], help="Apply a plan file to jira"
+    )
+    apply.add_argument(
+        "plan_file",
+        help="Path to the plan file",
+        type=str,
+    )
+    verify = commands.add_parser(
+        "verify",
+        parents=[common],
+        help="Check that the stored issues of a mindmap exist and are in place",
+    )
+    verify.add_argument(
+        "mm_file",
+        help="Path to the mindmap file",
+        type=str,
+    )
+    watch = commands.add_parser(
+        "watch",
+        parents=[common],
+        help="Sync a mindmap to jira every time it is saved",
+    )
+    watch.add_argument(
         "mm_file",
         help="Path to the mindmap file",
         type=str,
     )
-    return parser.parse_args()
+    watch.add_argument(
+        "--interval",
+        help=f"Seconds between checks of the mindmap, default {WATCH_INTERVAL}",
+        type=float,
+        default=WATCH_INTERVAL,
+    )
+    watch.add_argument(
+        "--debounce",
+        help=f"Seconds a save has to settle before syncing, default {WATCH_DEBOUNCE}",
+        type=float,
+        default=WATCH_DEBOUNCE,
+    )
+    batch = commands.add_parser(
+        "batch",
+        help="Sync every mindmap of a directory or manifest in one process",
+    )
+    batch.add_argument(
+        "source",
+        help="Directory of mindmaps, or a manifest of '<mm_file> [project.ini]' lines",
+        type=str,
+    )
+    batch.add_argument(
+        "--config",
+        "-c",
+        help="project.ini of the mindmaps that do not have their own",
+        type=str,
+    )
+    batch.add_argument(
+        "--jobs",
+        "-j",
+        help="Mindmaps synced at once, default 4",
+        type=int,
+        default=4,
+    )
+    batch.add_argument(
+        "--concurrency",
+        help="Requests in flight to a jira server across mindmaps, default 8",
+        type=int,
+        default=8,
+    )
+    batch.add_argument(
+        "--report",
+        help="Path of the JSON report, batch-report.json by default",
+        type=str,
+        default="batch-report.json",
+    )
+    return parser.parse_args(argv)
 
 
 def set_ini_file(ini, wd, dest_ini):
@@ -107,6 +462,9 @@ def set_ini_file(ini, wd, dest_ini):
     ini.set(
         "jira", "debug", "true" if yesno("Enable Debug? (verbose output)") else "false"
     )
+    ini.set("jira", "workers", "4")
+    ini.set("jira", "state_backend", "sqlite")
+    ini.set("jira", "transport", "rest")
     ini.set(
         "jira",
         "no_prompt",
@@ -120,13 +478,13 @@ def set_ini_file(ini, wd, dest_ini):
         LOG.info("Not creating project.ini file")
 
 
-def run_mindmap_to_jira():
-    """Run main function."""
-    args = get_args()
-    mmfile = Path(args.mm_file)
-    if not mmfile.exists():
-        raise SystemExit(f"{mmfile} does not exist")
+def load_config(
+    args, mm_file: Path, offline: bool = False, **overrides: Any
+) -> MMConfig:
+    """Load project.ini, or create it interactively.
 
+    ``overrides`` replace MMConfig arguments read from the ini file.
+    """
     ini = ConfigParser()
     if args.interactive:
         ini.add_section("jira")
@@ -140,7 +498,7 @@ def run_mindmap_to_jira():
         args.config = dest_ini
 
     elif args.config:
-        ini.read(Path(args.ini_file))
+        ini.read(Path(args.config))
     else:
         raise SystemExit("No config file specified, or interactive mode not selected")
 
@@ -170,7 +528,7 @@ def run_mindmap_to_jira():
             LOG.error(msg)
         raise SystemExit(f"Missing {ini} required fields")
 
-    conf = MMConfig(
+    settings = dict(
         working_dir=str(wd),
         project_parent_issue_key=project_parent_issue_key,
         debug=ini.getboolean("jira", "debug") or False,
@@ -180,13 +538,68 @@ def run_mindmap_to_jira():
         noprompt=ini.getboolean("jira", "no_prompt") or False,
         skip_optional=ini.getboolean("jira", "skip_optional") or False,
         dry_run=ini.getboolean("jira", "dry_run") or False,
-        mm_file=Path(args.mm_file),
-    )
+        mm_file=mm_file,
+        workers=ini.getint("jira", "workers", fallback=4),
+        state_backend=ini.get("jira", "state_backend", fallback="ini"),
+        metadata_ttl=ini.getint("jira", "metadata_ttl", fallback=86400),
+        metadata_api=ini.get("jira", "metadata_api", fallback="auto"),
+        transport=ini.get("jira", "transport", fallback="jira"),
+        rate_limit=ini.getfloat("jira", "rate_limit", fallback=0),
+        max_retries=ini.getint("jira", "max_retries", fallback=5),
+        offline=offline,
+        epic_link_mode=ini.get("jira", "epic_link_mode", fallback="batch"),
+        metrics_file=ini.get("jira", "metrics_file", fallback=""),
+        metrics_textfile=ini.get("jira", "metrics_textfile", fallback=""),
+        journal=ini.getboolean("jira", "journal", fallback=True),
+        journal_cleanup=ini.getboolean("jira", "journal_cleanup", fallback=False),
+        search_page_size=ini.getint("jira", "search_page_size", fallback=100),
+        shared_cache_dir=ini.get("jira", "shared_cache_dir", fallback=""),
+    )  # type: Dict[str, Any]
+    settings.update(overrides)
+    return MMConfig(**settings)
+
+
+def run_mindmap_to_jira():
+    """Run main function."""
+    args = get_args()
+    if args.command == "batch":
+        default_ini = Path(args.config) if args.config else None
+        pairs = read_batch(Path(args.source), default_ini)
+        try:
+            run_batch(pairs, args.jobs, args.concurrency, Path(args.report))
+        except KeyboardInterrupt:
+            LOG.info("Interrupted by user")
+            raise SystemExit("Bye!")
+        return
+    if args.command == "apply":
+        plan_file = Path(args.plan_file)
+        if not plan_file.exists():
+            raise SystemExit(f"{plan_file} does not exist")
+        mm_file = Path(read_plan_header(plan_file)["mm_file"])
+    else:
+        mm_file = Path(args.mm_file)
+        if not mm_file.exists():
+            raise SystemExit(f"{mm_file} does not exist")
+    conf = load_config(args, mm_file, offline=args.command == "plan")
     try:
-        mindmap_to_jira(conf)
+        if args.command == "plan":
+            output = args.output or mm_file.with_suffix(".plan.jsonl")
+            plan_mindmap(conf, Path(output))
+        elif args.command == "apply":
+            apply_plan(conf, plan_file)
+        elif args.command == "verify":
+            verify_mindmap(conf)
+        elif args.command == "watch":
+            watch_mindmap(conf, args.interval, args.debounce)
+        else:
+            mindmap_to_jira(conf)
     except KeyboardInterrupt:
         LOG.info("Interrupted by user")
         raise SystemExit("Bye!")
+    finally:
+        conf.state.close()
+        conf.jira.close()
+        write_metrics(conf, args.command)
 
 
 def main():
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Dependency aware issue creation."""
+import math
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from jira_freeplane.common import LOG
+from jira_freeplane.libjira import BULK_LIMIT, JiraInterface
+
+
+class Job:
+    """Issue waiting to be created."""
+
+    def __init__(self, ref: str, parent_ref: Optional[str], group: str) -> None:
+        self.ref = ref
+        self.parent_ref = parent_ref
+        self.group = group
+        # optional update section sent with the payload, set by build
+        self.update = None  # type: Optional[Dict[str, Any]]
+
+    def build(self, parent_key: Optional[str]) -> Dict[str, Any]:
+        """Return the jira fields payload, once the parent key is known."""
+        raise NotImplementedError
+
+    def created(self, key: str) -> None:
+        """Handle the issue being created."""
+        raise NotImplementedError
+
+
+class Scheduler:
+    """Create issues as soon as the key of their parent is known.
+
+    The node tree is treated as a DAG, a job is dispatched to the worker pool
+    once its parent has a key.  Jobs that become ready together are grouped by
+    ``group`` into bulk create requests.  ``Job.build`` and ``Job.created``
+    only run on the calling thread, so they are free to write state.
+
+    Jobs can also be streamed into ``run``, they are pulled from the iterable
+    while issues are being created, as long as fewer than a full bulk request
+    are ready.  ``before_submit`` is called with every built batch before it
+    is sent, e.g. to make its journal entries durable.
+    """
+
+    def __init__(
+        self,
+        jira: JiraInterface,
+        workers: int = 1,
+        before_submit: Optional[Callable[[List[Job]], None]] = None,
+    ) -> None:
+        self.jira = jira
+        self.workers = max(1, workers)
+        self.before_submit = before_submit
+        self.keys = {}  # type: Dict[str, str]
+        self.errors = []  # type: List[str]
+        # jobs that failed or whose parent failed
+        self.failed = []  # type: List[Job]
+        self._waiting = {}  # type: Dict[str, List[Job]]
+        self._ready = {}  # type: Dict[str, List[Job]]
+
+    def resolve(self, ref: str, key: str) -> None:
+        """Record the key of an existing issue, releasing its children."""
+        self.keys[ref] = key
+        for job in self._waiting.pop(ref, []):
+            self._ready.setdefault(job.group, []).append(job)
+
+    def add(self, job: Job) -> None:
+        """Add a job."""
+        if job.parent_ref is None or job.parent_ref in self.keys:
+            self._ready.setdefault(job.group, []).append(job)
+        else:
+            self._waiting.setdefault(job.parent_ref, []).append(job)
+
+    def _next_batch(self, free: int) -> List[Job]:
+        """Take the next batch of ready jobs, sized to keep workers busy."""
+        group = max(self._ready, key=lambda g: len(self._ready[g]))
+        jobs = self._ready[group]
+        size = min(BULK_LIMIT, max(1, math.ceil(len(jobs) / free)))
+        batch, self._ready[group] = jobs[:size], jobs[size:]
+        if not self._ready[group]:
+            del self._ready[group]
+        return batch
+
+    def _submit(
+        self, items: List[Tuple[Job, Dict[str, Any]]]
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """Submit a batch of built payloads."""
+        return self.jira.submit_bulk(
+            [payload for _, payload in items], [job.update for job, _ in items]
+        )
+
+    def _ready_count(self) -> int:
+        return sum(len(jobs) for jobs in self._ready.values())
+
+    def run(self, jobs: Iterable[Job] = ()) -> None:
+        """Run until every reachable job, added or streamed, is done."""
+        source = iter(jobs)
+        streaming = True
+        running = {}  # type: Dict[Future, List[Tuple[Job, Dict[str, Any]]]]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                while streaming and self._ready_count() < BULK_LIMIT:
+                    job = next(source, None)
+                    if job is None:
+                        streaming = False
+                    else:
+                        self.add(job)
+                if not (self._ready or running):
+                    break
+                while self._ready and len(running) < self.workers:
+                    batch = self._next_batch(self.workers - len(running))
+                    items = [
+                        (job, job.build(self.keys.get(job.parent_ref)))  # type: ignore
+                        for job in batch
+                    ]
+                    if self.before_submit is not None:
+                        self.before_submit(batch)
+                    running[pool.submit(self._submit, items)] = items
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    items = running.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        results = [(None, str(e))] * len(items)
+                    for (job, _), (key, error) in zip(items, results):
+                        if key is None:
+                            self.errors.append(f"{job.ref}: {error}")
+                            self.failed.append(job)
+                            continue
+                        job.created(key)
+                        self.resolve(job.ref, key)
+        for ref, waiting in self._waiting.items():
+            for job in waiting:
+                self.errors.append(f"{job.ref}: parent {ref} was not created")
+                self.failed.append(job)
+        self._waiting = {}
+        if self.errors:
+            for msg in self.errors:
+                LOG.error(msg)
+            raise SystemExit(f"Failed to create {len(self.errors)} issues")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compiled field schemas."""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from jira_freeplane.common import IGNORE, LOG, NAME_IGNORE, atomic_write, file_digest
+
+# version of the persisted compiled format
+SCHEMA_VERSION = 2
+
+
+def allowed_value_map(values: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Map allowed value names to their ids."""
+    value_dict = {}
+    for value in values:
+        if "name" in value:
+            vname = value["name"]
+        elif "value" in value:
+            vname = value["value"]
+        else:
+            raise ValueError("name or value not found")
+        try:
+            value_dict[vname] = value["id"]
+        except KeyError as e:
+            LOG.error("!!!!ERROR!!!! %s %s", e, value)
+            return {}
+    return value_dict
+
+
+def field_is_array(schema: Dict[str, Any], operations: List[str]) -> bool:
+    """Check if a field takes a list of values."""
+    if schema["type"] == "array":
+        return True
+    if operations == ["set"]:
+        return False
+    if "add" in operations:
+        return True
+    return False
+
+
+def field_is_ignored(name: str, schema: Dict[str, Any]) -> bool:
+    """Check if a field is never set by us."""
+    _type = schema.get("type", "")
+    _items = schema.get("items", "")
+    if name in NAME_IGNORE:
+        return True
+    if _type in IGNORE or _items in IGNORE:
+        return True
+    return False
+
+
+class FieldSpec(NamedTuple):
+    """Immutable, precomputed field descriptor."""
+
+    name: str
+    id: str
+    required: bool
+    is_array: bool
+    is_user: bool
+    allowed_values: Dict[str, Any]
+    operations: List[str]
+    schema: Dict[str, Any]
+
+    @classmethod
+    def from_meta(cls, data: Dict[str, Any]) -> "FieldSpec":
+        """Build from a createmeta field."""
+        schema = data["schema"]
+        return cls(
+            data["name"],
+            data["fieldId"],
+            data["required"],
+            field_is_array(schema, data["operations"]),
+            schema.get("type") == "user",
+            allowed_value_map(data.get("allowedValues", [])),
+            data["operations"],
+            schema,
+        )
+
+    def encode(self, value: Any, label: str) -> Any:
+        """Encode a template value into its jira representation."""
+        if isinstance(value, list) and not self.is_array:
+            LOG.info("Operations: %s", self.operations)
+            LOG.info("Schema: %s", self.schema)
+            raise SystemExit(f"{label} {self.name} is not an array, but {value}")
+        try:
+            if self.is_array:
+                if self.allowed_values:
+                    if self.is_user:
+                        return [{"name": v} for v in value]
+                    return [{"id": self.allowed_values[v]} for v in value]
+                return [v for v in value]
+            if self.allowed_values:
+                return {"id": self.allowed_values[value]}
+            if self.is_user:
+                return {"name": value}
+            return value
+        except KeyError as e:
+            raise SystemExit(
+                f"{label} {self.name} value: {e} is not in allowed values: "
+                f"{list(self.allowed_values)}"
+            )
+
+
+class FieldSchema:
+    """Compiled fields of a project issue type."""
+
+    __slots__ = ("project", "issue_type", "fields", "by_name", "by_id")
+
+    def __init__(self, project: str, issue_type: str, fields: List[FieldSpec]):
+        self.project = project
+        self.issue_type = issue_type
+        self.fields = tuple(fields)
+        self.by_name = {f.name: f for f in fields}
+        self.by_id = {f.id: f for f in fields}
+
+    @classmethod
+    def compile(
+        cls, project: str, issue_type: str, meta: Iterable[Dict[str, Any]]
+    ) -> "FieldSchema":
+        """Compile createmeta field dicts."""
+        fields = []
+        for data in meta:
+            if field_is_ignored(data["name"], data["schema"]):
+                continue
+            fields.append(FieldSpec.from_meta(data))
+        return cls(project, issue_type, fields)
+
+    def save(self, path: Path, source: Path) -> None:
+        """Persist in compact form, tied to the createmeta cache it came from.
+
+        The cache is identified by its content, revalidating it only changes
+        its modification time.
+        """
+        dat = {
+            "version": SCHEMA_VERSION,
+            "source": file_digest(source),
+            "project": self.project,
+            "issue_type": self.issue_type,
+            "fields": [list(f) for f in self.fields],
+        }
+        atomic_write(path, json.dumps(dat, separators=(",", ":")))
+
+    @classmethod
+    def load(cls, path: Path, source: Path) -> Optional["FieldSchema"]:
+        """Load a persisted schema, None if missing or stale."""
+        if not path.exists() or not source.exists():
+            return None
+        try:
+            dat = json.loads(path.read_text())
+        except ValueError:
+            return None
+        if dat.get("version") != SCHEMA_VERSION:
+            return None
+        if dat.get("source") != file_digest(source):
+            return None
+        fields = [FieldSpec(*f) for f in dat["fields"]]
+        return cls(dat["project"], dat["issue_type"], fields)
+
+
+# keyed by jira url, project, issue type and the field ids of the document
+_SCHEMAS = {}  # type: Dict[Tuple[str, ...], FieldSchema]
+_SCHEMA_LOCK = threading.Lock()
+
+
+def cached_schema(key: Tuple[str, ...]) -> Optional[FieldSchema]:
+    """Schema compiled earlier in this process."""
+    with _SCHEMA_LOCK:
+        return _SCHEMAS.get(key)
+
+
+def cache_schema(key: Tuple[str, ...], schema: FieldSchema) -> FieldSchema:
+    """Keep a compiled schema for the rest of the process."""
+    with _SCHEMA_LOCK:
+        return _SCHEMAS.setdefault(key, schema)
+
+
+def clear_schemas() -> None:
+    """Forget every compiled schema, e.g. after the server side changed."""
+    with _SCHEMA_LOCK:
+        _SCHEMAS.clear()
+
+
+class PayloadTemplate:
+    """Issue type template, validated and encoded once.
+
+    Only the auto fields differ between the issues of a template, so per
+    issue encoding is an overlay of those onto the encoded template.
+    """
+
+    __slots__ = ("schema", "label", "base")
+
+    def __init__(self, schema: FieldSchema, template: Dict[str, Any]) -> None:
+        self.schema = schema
+        self.label = f"{schema.project} {schema.issue_type}"
+        data = dict(template)
+        data.pop("Project", None)
+        data.pop("Issue Type", None)
+        self.base = {
+            "project": {"key": schema.project},
+            "issuetype": {"name": schema.issue_type},
+        }  # type: Dict[str, Any]
+        self.base.update(self._encode(data))
+
+    def _encode(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        errors = []
+        for key, aval in data.items():
+            if not aval:
+                errors.append(f"{self.label} {key} is empty")
+            elif key not in self.schema.by_name:
+                errors.append(f"{self.label} {key} is not a valid field")
+        if errors:
+            raise SystemExit("\n".join(errors))
+        encoded = {}
+        for key, aval in data.items():
+            field = self.schema.by_name[key]
+            encoded[field.id] = field.encode(aval, self.label)
+        return encoded
+
+    def encode(self, auto: Dict[str, Any]) -> Dict[str, Any]:
+        """Jira fields payload with the auto field values overlaid."""
+        payload = dict(self.base)
+        payload.update(self._encode(auto))
+        return payload
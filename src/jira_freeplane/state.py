@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Node state storage."""
+import sqlite3
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from jira_freeplane.common import LOG
+from jira_freeplane.metrics import Metrics
+
+STATE_FIELDS = ["key", "json_body", "is_linked", "content_hash", "marker"]
+
+
+class StateStore:
+    """State backend base class.
+
+    State is a dict per node ID with the ``key``, ``json_body``,
+    ``is_linked`` and ``content_hash`` of the issue created for it.  An issue
+    being created has a ``marker`` but no ``key`` yet.  Run wide values, like
+    the hash of the last synced mindmap, are kept as meta.
+    """
+
+    def get(self, node_id: str) -> Dict[str, Any]:
+        """Get the state of a node, empty if it has none."""
+        raise NotImplementedError
+
+    def put(self, node_id: str, values: Dict[str, Any]) -> None:
+        """Update the state of a node."""
+        dct = self.get(node_id)
+        dct.update(values)
+        self._write(node_id, dct)
+
+    def put_many(self, states: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the complete state of many nodes."""
+        for node_id, dct in states.items():
+            self._write(node_id, dct)
+
+    def _write(self, node_id: str, dct: Dict[str, Any]) -> None:
+        """Replace the complete state of a node."""
+        raise NotImplementedError
+
+    def items(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """All stored node states."""
+        raise NotImplementedError
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Get a run wide value."""
+        raise NotImplementedError
+
+    def set_meta(self, name: str, value: str) -> None:
+        """Set a run wide value."""
+        raise NotImplementedError
+
+    def commit(self) -> None:
+        """Make pending writes durable."""
+
+    def close(self) -> None:
+        """Close the store."""
+        self.commit()
+
+
+class IniStateStore(StateStore):
+    """One ``<ID>.ini`` file per node, the original layout."""
+
+    def __init__(self, data_dir: Path) -> None:
+        self.data_dir = data_dir
+
+    def path(self, node_id: str) -> Path:
+        """State file of a node."""
+        return self.data_dir.joinpath(f"{node_id}.ini")
+
+    @staticmethod
+    def _read(path: Path) -> Dict[str, Any]:
+        config = ConfigParser()
+        config.read(str(path))
+        if not config.has_section("jira"):
+            return {}
+        dct = dict(config["jira"])  # type: Dict[str, Any]
+        if "is_linked" in dct:
+            dct["is_linked"] = dct["is_linked"] == "true"
+        return dct
+
+    def get(self, node_id: str) -> Dict[str, Any]:
+        """Get the state of a node."""
+        path = self.path(node_id)
+        if not path.exists():
+            return {}
+        return self._read(path)
+
+    def _write(self, node_id: str, dct: Dict[str, Any]) -> None:
+        config = ConfigParser()
+        config.add_section("jira")
+        for key, val in dct.items():
+            if isinstance(val, bool):
+                val = "true" if val else "false"
+            config.set("jira", key, str(val))
+        path = self.path(node_id)
+        LOG.info(f"writing {node_id} -> {path}")
+        with path.open("w") as f:
+            config.write(f)
+
+    def items(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """All stored node states."""
+        for path in sorted(self.data_dir.glob("*.ini")):
+            if path.stem.startswith("_"):
+                continue
+            dct = self._read(path)
+            if dct:
+                yield path.stem, dct
+
+    def _meta(self) -> ConfigParser:
+        config = ConfigParser()
+        config.read(str(self.data_dir.joinpath("_meta.ini")))
+        if not config.has_section("meta"):
+            config.add_section("meta")
+        return config
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Get a run wide value."""
+        return self._meta().get("meta", name, fallback=None)
+
+    def set_meta(self, name: str, value: str) -> None:
+        """Set a run wide value."""
+        config = self._meta()
+        config.set("meta", name, value)
+        with self.data_dir.joinpath("_meta.ini").open("w") as f:
+            config.write(f)
+
+
+class SqliteStateStore(StateStore):
+    """All node state in a single sqlite database.
+
+    Writes are committed in batches of ``batch_size`` inside a transaction,
+    a crash loses at most the uncommitted batch and never leaves a partially
+    written row.
+    """
+
+    def __init__(self, path: Path, batch_size: int = 100) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = 0
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "id TEXT PRIMARY KEY, key TEXT, json_body TEXT, "
+            "is_linked INTEGER NOT NULL DEFAULT 0, content_hash TEXT, marker TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(state)")]
+        for column in ["content_hash", "marker"]:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE state ADD COLUMN {column} TEXT")
+        self.conn.commit()
+
+    @staticmethod
+    def _row(row: Tuple) -> Dict[str, Any]:
+        dct = {}  # type: Dict[str, Any]
+        for name, val in zip(STATE_FIELDS, row):
+            if val is not None:
+                dct[name] = val
+        dct["is_linked"] = bool(row[2])
+        return dct
+
+    def get(self, node_id: str) -> Dict[str, Any]:
+        """Get the state of a node."""
+        row = self.conn.execute(
+            "SELECT key, json_body, is_linked, content_hash, marker "
+            "FROM state WHERE id = ?",
+            (node_id,),
+        ).fetchone()
+        if row is None:
+            return {}
+        return self._row(row)
+
+    @staticmethod
+    def _params(node_id: str, dct: Dict[str, Any]) -> Tuple:
+        return (
+            node_id,
+            dct.get("key"),
+            dct.get("json_body"),
+            1 if dct.get("is_linked") else 0,
+            dct.get("content_hash"),
+            dct.get("marker"),
+        )
+
+    def _write(self, node_id: str, dct: Dict[str, Any]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state "
+            "(id, key, json_body, is_linked, content_hash, marker) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            self._params(node_id, dct),
+        )
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.commit()
+
+    def put_many(self, states: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the complete state of many nodes in one transaction."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO state "
+            "(id, key, json_body, is_linked, content_hash, marker) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [self._params(node_id, dct) for node_id, dct in states.items()],
+        )
+        self._pending += len(states)
+
+    def items(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """All stored node states."""
+        rows = self.conn.execute(
+            "SELECT id, key, json_body, is_linked, content_hash, marker "
+            "FROM state ORDER BY id"
+        ).fetchall()
+        for row in rows:
+            yield row[0], self._row(row[1:])
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Get a run wide value."""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str) -> None:
+        """Set a run wide value."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value)
+        )
+        self.conn.commit()
+
+    def commit(self) -> None:
+        """Commit the pending batch."""
+        if self._pending:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.commit()
+        self.conn.close()
+
+
+class CachedStateStore(StateStore):
+    """In-memory index in front of a backend.
+
+    Every state is loaded once, reads never touch the backend.  Writes are
+    collected in a dirty set that is flushed on ``commit``, at the end of
+    every phase, or once ``flush_size`` nodes are dirty.  Backend reads and
+    writes are timed as the ``state`` phase of ``metrics``.
+    """
+
+    def __init__(
+        self,
+        backend: StateStore,
+        flush_size: int = 100,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.backend = backend
+        self.flush_size = flush_size
+        self.metrics = metrics if metrics is not None else Metrics()
+        with self.metrics.timer("state"):
+            self.index = dict(backend.items())  # type: Dict[str, Dict[str, Any]]
+        self.dirty = set()  # type: Set[str]
+
+    def get(self, node_id: str) -> Dict[str, Any]:
+        """Get the state of a node."""
+        return dict(self.index.get(node_id, {}))
+
+    def put(self, node_id: str, values: Dict[str, Any]) -> None:
+        """Update the state of a node."""
+        self.index.setdefault(node_id, {}).update(values)
+        self.dirty.add(node_id)
+        if len(self.dirty) >= self.flush_size:
+            self.commit()
+
+    def items(self) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        """All stored node states."""
+        return list(self.index.items())
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Get a run wide value."""
+        return self.backend.get_meta(name)
+
+    def set_meta(self, name: str, value: str) -> None:
+        """Set a run wide value, after flushing the node states."""
+        self.commit()
+        self.backend.set_meta(name, value)
+
+    def commit(self) -> None:
+        """Flush the dirty states to the backend."""
+        if not self.dirty:
+            return
+        with self.metrics.timer("state"):
+            self.backend.put_many(
+                {node_id: self.index[node_id] for node_id in self.dirty}
+            )
+            self.backend.commit()
+        self.dirty = set()
+
+    def close(self) -> None:
+        """Flush and close the backend."""
+        self.commit()
+        self.backend.close()
+
+
+def migrate_ini_state(data_dir: Path, store: StateStore) -> int:
+    """Copy the per node ``.ini`` files into ``store``, returns the count."""
+    count = 0
+    ini = IniStateStore(data_dir)
+    for node_id, dct in ini.items():
+        store.put(node_id, dct)
+        count += 1
+    store.commit()
+    for name, value in ini._meta().items("meta"):
+        store.set_meta(name, value)
+    return count
+
+
+def open_state_store(
+    backend: str, data_dir: Path, metrics: Optional[Metrics] = None
+) -> StateStore:
+    """Open the state backend configured in project.ini.
+
+    The first time the sqlite backend is used on a data directory with
+    existing ``.ini`` state, that state is migrated into the database.
+    """
+    if backend == "ini":
+        return CachedStateStore(IniStateStore(data_dir), metrics=metrics)
+    if backend == "sqlite":
+        path = data_dir.joinpath("state.db")
+        if not path.exists():
+            # migrate next to the database, so a crash never leaves half of it
+            tmp = data_dir.joinpath("state.db.tmp")
+            if tmp.exists():
+                tmp.unlink()
+            store = SqliteStateStore(tmp)
+            count = migrate_ini_state(data_dir, store)
+            store.close()
+            tmp.replace(path)
+            if count:
+                LOG.info(f"Migrated {count} .ini state files into {path}")
+        return CachedStateStore(SqliteStateStore(path), metrics=metrics)
+    raise SystemExit(f"Unknown state backend: {backend}, use ini or sqlite")
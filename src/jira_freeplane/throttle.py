@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Rate limiting and retries of jira requests."""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+
+from jira_freeplane.common import LOG
+from jira_freeplane.metrics import Metrics, endpoint
+from jira_freeplane.transport import TransportError
+
+T = TypeVar("T")
+
+# the server rejected the request before doing anything with it
+THROTTLED = [429]
+
+# the server or a proxy failed, the request may or may not have been applied
+UNAVAILABLE = [502, 503, 504]
+
+# a request slower than this factor times the fastest one of its endpoint
+# means the server is saturated, the concurrency limit stops growing
+LATENCY_FACTOR = 3.0
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Requests per second limit shared by every thread.
+
+    A ``rate`` of 0 disables the limit.  ``pause`` holds every request back,
+    e.g. until the time a ``Retry-After`` header asked for.
+    """
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds``."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _wait_time(self) -> float:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Wait for a token."""
+        while True:
+            with self._lock:
+                delay = self._wait_time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+
+class AdaptiveLimit:
+    """Concurrency limit that follows the capacity of the server.
+
+    Additive increase, multiplicative decrease: the limit grows by one per
+    window of successful requests and is halved when the server pushes back.
+    It does not grow while latency shows the server is saturated, each
+    endpoint is compared with its own fastest request, a bulk create is
+    slower than a search by nature.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum = max(1, maximum)
+        self.limit = float(self.maximum)
+        self.inflight = 0
+        self.fastest = {}  # type: Dict[str, float]
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """Wait for a free slot."""
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, latency: float, throttled: bool, label: str = "") -> None:
+        """Free a slot and adjust the limit, ``label`` names the request."""
+        with self._cond:
+            self.inflight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+                LOG.info(
+                    "Server is throttling, concurrency lowered to %s", int(self.limit)
+                )
+            else:
+                name = endpoint(label)
+                fastest = min(latency, self.fastest.get(name, latency))
+                self.fastest[name] = fastest
+                if latency <= fastest * LATENCY_FACTOR:
+                    self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class Throttle:
+    """Rate limit, concurrency limit and retries of jira requests.
+
+    Throttled requests (429) are retried whatever their method, they were
+    never applied.  Failures that may have been applied (502, 503, 504 and
+    connection errors) are only retried for idempotent requests, even with a
+    ``Retry-After``: sending a create again could make a duplicate, failed
+    creates are left to the journal and the retry queue instead.  Waits
+    follow ``Retry-After`` when present and jittered exponential backoff
+    otherwise.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 60,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.bucket = TokenBucket(rate)
+        self.metrics = metrics
+        self.limit = AdaptiveLimit(concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+
+    def delay(
+        self, error: TransportError, attempt: int, idempotent: bool
+    ) -> Optional[float]:
+        """Seconds to wait before retrying, None if the error is final."""
+        if attempt >= self.max_retries:
+            return None
+        wait = retry_after(error.retry_after)
+        rejected = error.status_code in THROTTLED
+        transient = error.status_code is None or error.status_code in UNAVAILABLE
+        if not rejected and not (idempotent and transient):
+            return None
+        if wait is None:
+            cap = min(self.max_backoff, self.backoff * 2 ** attempt)
+            wait = random.uniform(cap / 2, cap)
+        return min(wait, self.max_backoff)
+
+    def call(self, func: Callable[[], T], idempotent: bool, label: str = "") -> T:
+        """Call ``func`` within the limits, retrying it when it is safe."""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.limit.acquire()
+            start = time.monotonic()
+            throttled = False
+            try:
+                return func()
+            except TransportError as e:
+                throttled = e.status_code in THROTTLED + UNAVAILABLE
+                wait = self.delay(e, attempt, idempotent)
+                if wait is None:
+                    raise
+                LOG.warning(
+                    "%s failed with %s, retrying in %.1fs", label, e.status_code, wait
+                )
+                if e.retry_after:
+                    self.bucket.pause(wait)
+            finally:
+                self.limit.release(time.monotonic() - start, throttled, label)
+            attempt += 1
+            self.retries += 1
+            if self.metrics is not None:
+                self.metrics.retry(label)
+            time.sleep(wait)
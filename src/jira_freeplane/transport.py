@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""HTTP transports for the jira REST api."""
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from jira_freeplane.metrics import Metrics
+
+# jira and requests are imported on first use, importing them dominates the
+# start up time of the cli
+
+# jira uses the full jira client, rest a lean pooled requests session
+TRANSPORTS = ["jira", "rest"]
+
+
+class TransportError(Exception):
+    """Jira returned an error status, ``status_code`` is None when the
+    connection failed."""
+
+    def __init__(
+        self,
+        status_code: Optional[int],
+        text: str,
+        url: str = "",
+        retry_after: Optional[str] = None,
+    ) -> None:
+        super().__init__(f"{status_code} {url}: {text}")
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+        self.retry_after = retry_after
+
+
+class Transport:
+    """Send requests to the ``/rest/api/2`` endpoints of a server.
+
+    Every attempt is recorded in ``metrics`` when it is set.
+    """
+
+    metrics = None  # type: Optional[Metrics]
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Any = None,
+    ) -> Any:
+        """Send a request, returns the decoded response, None if it is empty."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Close the connections."""
+
+    def _observe(
+        self,
+        label: str,
+        start: float,
+        status: Optional[int],
+        sent: int,
+        received: int,
+    ) -> None:
+        if self.metrics is not None:
+            self.metrics.observe_request(
+                label, time.monotonic() - start, status, sent, received
+            )
+
+
+class ClientTransport(Transport):
+    """Requests sent through the session of a ``jira.JIRA`` client."""
+
+    def __init__(self, jira_url: str, auth: Tuple[str, str]) -> None:
+        self.jira_url = jira_url
+        self.auth = auth
+        self._inst = None
+        self._lock = threading.Lock()
+
+    @property
+    def inst(self) -> Any:
+        """Jira client, created on first use."""
+        import jira
+
+        with self._lock:
+            if self._inst is None:
+                # retries are left to the throttle
+                self._inst = jira.JIRA(
+                    auth=self.auth,
+                    options={"server": self.jira_url},
+                    max_retries=0,
+                )
+        return self._inst
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Any = None,
+    ) -> Any:
+        """Send a request."""
+        import jira
+        import requests
+
+        url = f"{self.jira_url}/rest/api/2/{path}"
+        body = json.dumps(data) if data is not None else None
+        label = f"{method} {path}"
+        sent = len(body) if body else 0
+        start = time.monotonic()
+        try:
+            inst = self.inst
+            url = inst._get_url(path)  # pylint: disable=protected-access
+            start = time.monotonic()
+            resp = inst._session.request(  # pylint: disable=protected-access
+                method, url, params=params, data=body
+            )
+        except jira.JIRAError as e:
+            if e.response is None:
+                self._observe(label, start, e.status_code, sent, 0)
+                raise TransportError(e.status_code, e.text, url) from e
+            self._observe(label, start, e.status_code, sent, len(e.response.content))
+            raise TransportError(
+                e.status_code,
+                e.response.text,
+                url,
+                e.response.headers.get("Retry-After"),
+            ) from e
+        except requests.RequestException as e:
+            self._observe(label, start, None, sent, 0)
+            raise TransportError(None, str(e), url) from e
+        self._observe(label, start, resp.status_code, sent, len(resp.content))
+        return resp.json() if resp.content else None
+
+    def close(self) -> None:
+        """Close the client."""
+        if self._inst is not None:
+            self._inst.close()
+
+
+class RestTransport(Transport):
+    """Lean keep-alive session, without the jira client start up calls.
+
+    The connection pool is sized to the number of workers, so every worker
+    keeps its connection open between requests.
+    """
+
+    def __init__(
+        self, jira_url: str, auth: Tuple[str, str], pool_size: int = 4
+    ) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = f"{jira_url.rstrip('/')}/rest/api/2/"
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update(
+            {
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+                "Content-Type": "application/json",
+            }
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Any = None,
+    ) -> Any:
+        """Send a request."""
+        import requests
+
+        url = self.base_url + path
+        body = json.dumps(data) if data is not None else None
+        label = f"{method} {path}"
+        sent = len(body) if body else 0
+        start = time.monotonic()
+        try:
+            resp = self.session.request(method, url, params=params, data=body)
+        except requests.RequestException as e:
+            self._observe(label, start, None, sent, 0)
+            raise TransportError(None, str(e), url) from e
+        self._observe(label, start, resp.status_code, sent, len(resp.content))
+        if resp.status_code >= 400:
+            raise TransportError(
+                resp.status_code, resp.text, url, resp.headers.get("Retry-After")
+            )
+        return resp.json() if resp.content else None
+
+    def close(self) -> None:
+        """Close the session."""
+        self.session.close()
+
+
+def open_transport(
+    name: str,
+    jira_url: str,
+    auth: Tuple[str, str],
+    pool_size: int = 4,
+    metrics: Optional[Metrics] = None,
+) -> Transport:
+    """Create the transport configured in project.ini."""
+    transport = None  # type: Optional[Transport]
+    if name == "jira":
+        transport = ClientTransport(jira_url, auth)
+    elif name == "rest":
+        transport = RestTransport(jira_url, auth, pool_size)
+    else:
+        raise SystemExit(f"Unknown transport: {name}, use one of {TRANSPORTS}")
+    transport.metrics = metrics
+    return transport
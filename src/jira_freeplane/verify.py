@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Check the stored issue keys of a mindmap against jira.
+
+Keys are looked up with ``key in (...)`` JQL searches, one page of
+``search_page_size`` keys per query, run concurrently.  Only keys that a
+search did not return are fetched one by one, to tell deleted issues from
+moved ones.
+
+Every issue is checked against its parent: the parent of a sub-task, the
+Epic Link of a task and the link of an epic to the project parent issue.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jira_freeplane.common import LOG
+from jira_freeplane.journal import linked_keys
+from jira_freeplane.mm import Node
+from jira_freeplane.mm_settings import MMConfig
+from jira_freeplane.transport import TransportError
+
+# fields requested for each issue, the Epic Link field is added
+VERIFY_FIELDS = ["key", "status", "parent", "issuelinks"]
+
+PROBLEMS = ["missing", "moved", "mismatched"]
+
+
+def epic_link_field(config: MMConfig) -> Optional[str]:
+    """Id of the Epic Link field of tasks, None when tasks have none."""
+    field = config.encoder(config.TYPE_TASK).schema.by_name.get("Epic Link")
+    return field.id if field is not None else None
+
+
+def expected_issues(
+    config: MMConfig, nodes: Iterable[Node], epic_link: Optional[str]
+) -> Dict[str, Tuple[Node, Optional[str]]]:
+    """Stored key of every created issue, with the key of its parent."""
+    expected = {}  # type: Dict[str, Tuple[Node, Optional[str]]]
+    for node in nodes:
+        key = node.key
+        if node.depth_type == config.TYPE_EPIC:
+            parent = config.project_parent_issue_key  # type: Optional[str]
+        elif node.depth_type == config.TYPE_TASK:
+            parent = node.parent_key if epic_link else None
+        elif node.depth_type == config.TYPE_SUBTASK:
+            parent = node.parent_key
+        else:
+            continue
+        if key:
+            expected[key] = (node, parent)
+    return expected
+
+
+def parent_problem(
+    config: MMConfig,
+    node: Node,
+    issue: Dict[str, Any],
+    parents: List[Optional[str]],
+    epic_link: Optional[str],
+) -> Optional[str]:
+    """Describe how an issue lost its parent, None when one of ``parents``."""
+    fields = issue.get("fields") or {}
+    key = issue["key"]
+    if node.depth_type == config.TYPE_EPIC:
+        if set(parents) & set(linked_keys(issue)):
+            return None
+        return f"{key} is not linked to {parents[0]}"
+    if node.depth_type == config.TYPE_TASK:
+        actual = fields.get(epic_link)
+        if actual in parents:
+            return None
+        return f"{key} has epic {actual}, not {parents[0]}"
+    actual = (fields.get("parent") or {}).get("key")
+    if actual in parents:
+        return None
+    return f"{key} has parent {actual}, not {parents[0]}"
+
+
+def fetch_issues(
+    config: MMConfig, keys: List[str], fields: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Issues by stored key, moved issues under their new key."""
+    size = config.search_page_size
+    jqls = []  # type: List[str]
+    for start in range(0, len(keys), size):
+        jqls.append("key in ({})".format(", ".join(keys[start : start + size])))
+    found = {}  # type: Dict[str, Dict[str, Any]]
+    for issues in config.jira.search_many(
+        jqls, fields, config.workers, size, validate=False
+    ):
+        for issue in issues:
+            found[issue["key"]] = issue
+    unmatched = [key for key in keys if key not in found]
+    if not unmatched or not set(found) - set(keys):
+        # no issue came back under another key, the rest were deleted
+        return found
+    LOG.info("Looking up %s issues not found by key...", len(unmatched))
+    issues = config.jira.get_issues(unmatched, fields, config.workers)
+    for key, issue in zip(unmatched, issues):
+        if issue is not None:
+            found[key] = issue
+    return found
+
+
+def verify_issues(config: MMConfig, nodes: Iterable[Node]) -> Dict[str, List[str]]:
+    """Report stored keys that are missing, moved or under another parent.
+
+    Returns the messages of each problem, ``PROBLEMS`` are the keys.
+    """
+    epic_link = epic_link_field(config)
+    expected = expected_issues(config, nodes, epic_link)
+    keys = list(expected)
+    requested = VERIFY_FIELDS + ([epic_link] if epic_link else [])
+    LOG.info("Verifying %s issues...", len(keys))
+    try:
+        found = fetch_issues(config, keys, requested)
+    except TransportError as e:
+        raise SystemExit(f"Could not verify issues: {e}") from e
+    current = {key: issue["key"] for key, issue in found.items()}
+    problems = {name: [] for name in PROBLEMS}  # type: Dict[str, List[str]]
+    statuses = {}  # type: Dict[str, int]
+    for key, (node, parent) in expected.items():
+        issue = found.get(key)
+        if issue is None:
+            problems["missing"].append(f"{key} does not exist -> {node.text}")
+            continue
+        if issue["key"] != key:
+            problems["moved"].append(
+                f"{key} was moved to {issue['key']} -> {node.text}"
+            )
+        fields = issue.get("fields") or {}
+        status = (fields.get("status") or {}).get("name", "Unknown")
+        statuses[status] = statuses.get(status, 0) + 1
+        if parent is None:
+            continue
+        # the parent may have been moved as well
+        problem = parent_problem(
+            config, node, issue, [parent, current.get(parent)], epic_link
+        )
+        if problem:
+            problems["mismatched"].append(f"{problem} -> {node.text}")
+    LOG.info(
+        "Statuses: %s",
+        ", ".join(f"{name} {count}" for name, count in sorted(statuses.items())),
+    )
+    return problems
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Watch a mindmap for saves."""
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from jira_freeplane.common import LOG
+
+# seconds between two checks of the mindmap
+WATCH_INTERVAL = 1.0
+
+# seconds a save has to settle before it is synced
+WATCH_DEBOUNCE = 2.0
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a file, None while it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch_changes(
+    path: Path, interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE
+) -> Iterator[None]:
+    """Yield once at the start, then once per save of ``path``.
+
+    The file is polled every ``interval`` seconds.  A change is only yielded
+    once the file has been left alone for ``debounce`` seconds, so a burst
+    of saves, or a save written in several steps, is synced once.
+    """
+    seen = file_signature(path)
+    yield
+    while True:
+        time.sleep(interval)
+        current = file_signature(path)
+        if current is None or current == seen:
+            continue
+        settled = time.monotonic() + debounce
+        while time.monotonic() < settled:
+            time.sleep(min(interval, max(0.0, settled - time.monotonic())))
+            latest = file_signature(path)
+            if latest != current:
+                current = latest
+                settled = time.monotonic() + debounce
+        if current is None:
+            continue
+        seen = current
+        LOG.info("%s was saved", path)
+        yield
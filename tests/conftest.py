@@ -1,10 +1,127 @@
 """
-    Dummy conftest.py for jira_freeplane.
+    Fixtures of the jira_freeplane tests.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
+    The tests run against the in-process fake jira of the benchmarks, on
+    mindmaps generated by benchmarks/generate_mm.py.
 """
+import argparse
+import sys
+from pathlib import Path
 
-# import pytest
+import pytest
+
+ROOT = Path(__file__).absolute().parent.parent
+sys.path[:0] = [str(ROOT / "src"), str(ROOT / "benchmarks")]
+
+from fake_jira import FakeJira  # noqa: E402
+from generate_mm import Generator, Shape  # noqa: E402
+
+from jira_freeplane.runtime import load_config  # noqa: E402
+from jira_freeplane.schema import FieldSchema, clear_schemas  # noqa: E402
+
+OPTIONS = {
+    "reporter": "tester",
+    "project_parent_issue_key": "PROJ-0",
+    "project_key": "PROJ",
+    "workers": 4,
+    "debug": "false",
+    "dry_run": "false",
+    "skip_optional": "true",
+    "no_prompt": "true",
+    "state_backend": "sqlite",
+    "transport": "rest",
+}
+
+
+@pytest.fixture(autouse=True)
+def jira_env(monkeypatch):
+    """Credentials for the fake jira, and no compiled schema from another test."""
+    monkeypatch.setenv("JIRA_USER", "tester")
+    monkeypatch.setenv("JIRA_PASS", "tester")
+    clear_schemas()
+    yield
+    clear_schemas()
+
+
+@pytest.fixture
+def fake_jira():
+    """Fake jira server, running for the test."""
+    with FakeJira() as fake:
+        yield fake
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    """Issue types compiled from createmeta, by the test."""
+    types = []
+    compile_fields = FieldSchema.compile.__func__
+
+    def counting(cls, project, issue_type, meta):
+        types.append(issue_type)
+        return compile_fields(cls, project, issue_type, meta)
+
+    monkeypatch.setattr(FieldSchema, "compile", classmethod(counting))
+    return types
+
+
+@pytest.fixture
+def mindmap(tmp_path):
+    """Mindmap of 2 epics, 3 tasks each and 2 sub-tasks per task."""
+    shape = Shape(epics=2, tasks=3, subtasks=2, checklist_depth=1, note_bytes=50)
+    return Generator(shape).write(tmp_path / "map.mm")
+
+
+@pytest.fixture
+def write_ini(tmp_path, fake_jira):
+    """Write a project.ini for the fake jira, extra options as keywords."""
+
+    def _write(name="project.ini", **options):
+        values = dict(OPTIONS, url=fake_jira.url, working_dir=tmp_path / "wd")
+        values.update(options)
+        Path(values["working_dir"]).mkdir(exist_ok=True)
+        lines = ["[jira]"] + [f"{key} = {value}" for key, value in values.items()]
+        path = tmp_path / name
+        path.write_text("\n".join(lines) + "\n")
+        return path
+
+    return _write
+
+
+@pytest.fixture
+def write_templates():
+    """Write settings and issue templates into a working directory.
+
+    Extra yaml is given per type, e.g. ``task="Component/s:\\n- api\\n"``.
+    """
+
+    def _write(working_dir, **extra):
+        path = Path(working_dir) / "PROJ-0"
+        path.mkdir(parents=True, exist_ok=True)
+        path.joinpath("settings.yaml").write_text("Project: PROJ\nReporter: tester\n")
+        for name in ["Epic", "Task", "Sub-task"]:
+            text = f"Issue Type: {name}\nProject: PROJ\nReporter: tester\n"
+            text += extra.get(name.lower().replace("-", ""), "")
+            path.joinpath(f"{name.lower()}.yaml").write_text(text)
+
+    return _write
+
+
+@pytest.fixture
+def make_config(write_ini):
+    """Load the MMConfig of a mindmap like the cli, closed after the test.
+
+    Each config is a fresh run, with its own jira session and state.
+    """
+    configs = []
+
+    def _make(mm_file, ini=None, **options):
+        ini = ini or write_ini(**options)
+        args = argparse.Namespace(config=str(ini), interactive=False)
+        conf = load_config(args, Path(mm_file))
+        configs.append(conf)
+        return conf
+
+    yield _make
+    for conf in configs:
+        conf.state.close()
+        conf.jira.close()
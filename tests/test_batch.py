@@ -0,0 +1,94 @@
+import itertools
+import json
+
+import pytest
+
+from generate_mm import Generator, Shape
+
+from jira_freeplane.batch import read_batch
+from jira_freeplane.libjira import ClientPool
+from jira_freeplane.runtime import run_batch
+
+
+def test_pooled_maps_with_other_templates(
+    fake_jira, mindmap, write_ini, write_templates, tmp_path
+):
+    # map b references a field map a does not, after map a compiled its schema
+    ini_a = write_ini("a.ini", working_dir=tmp_path / "a")
+    ini_b = write_ini("b.ini", working_dir=tmp_path / "b")
+    write_templates(tmp_path / "a")
+    write_templates(tmp_path / "b", task="Component/s:\n- api\n")
+    other = mindmap.with_name("other.mm")
+    other.write_text(mindmap.read_text())
+    report = tmp_path / "report.json"
+    run_batch([(mindmap, ini_a), (other, ini_b)], 1, 4, report)
+    results = json.loads(report.read_text())["results"]
+    assert [result["status"] for result in results] == ["ok", "ok"]
+    tasks = [f for f in fake_jira.issues.values() if "customfield_10001" in f]
+    assert len(tasks) == 12
+    assert sum(1 for f in tasks if f.get("components") == [{"id": "1"}]) == 6
+    # one client, the first map fetched every type, the second only Task again
+    assert fake_jira.calls["GET /rest/api/2/issue/createmeta/PROJ/issuetypes/{id}"] == 4
+    # its requests are reported once, not as 0 requests of each map
+    servers = json.loads(report.read_text())["servers"]
+    assert [server["requests"]["total"] for server in servers] == [fake_jira.total_calls]
+    for name in ["a", "b"]:
+        metrics = json.loads((tmp_path / name / "PROJ-0" / "metrics.json").read_text())
+        assert metrics["requests"] is None
+        assert metrics["counters"]["issues_created"] == 20
+
+
+def test_read_manifest(tmp_path):
+    for name in ["a.mm", "b.mm", "a.ini", "project.ini"]:
+        tmp_path.joinpath(name).write_text("")
+    manifest = tmp_path / "maps.txt"
+    manifest.write_text("# maps\na.mm a.ini\n\nb.mm\n")
+    assert read_batch(manifest, tmp_path / "project.ini") == [
+        (tmp_path / "a.mm", tmp_path / "a.ini"),
+        (tmp_path / "b.mm", tmp_path / "project.ini"),
+    ]
+
+
+def test_pool_shares_clients_of_equal_options(caplog):
+    pool = ClientPool(4)
+    made = []
+
+    def factory(concurrency):
+        made.append(concurrency)
+        return object()
+
+    first = pool.get("https://jira", factory, {"rate_limit": 0, "transport": "rest"})
+    same = pool.get("https://jira", factory, {"transport": "rest", "rate_limit": 0})
+    assert same is first
+    assert "differ" not in caplog.text
+    other = pool.get("https://jira", factory, {"rate_limit": 5, "transport": "rest"})
+    assert other is not first
+    assert "differ in rate_limit" in caplog.text
+    pool.get("https://other", factory, {"rate_limit": 5, "transport": "rest"})
+    assert made == [4, 4, 4]
+
+
+def test_maps_sharing_a_working_dir_are_skipped_unchanged(
+    fake_jira, mindmap, write_ini, tmp_path, caplog
+):
+    ini = write_ini()
+    generator = Generator(Shape(epics=1, tasks=1, subtasks=1))
+    # other node ids than the mindmap fixture
+    generator.ids = itertools.count(1000)
+    other = generator.write(tmp_path / "other.mm")
+    report = tmp_path / "report.json"
+    run_batch([(mindmap, ini), (other, ini)], 1, 4, report)
+    assert len(fake_jira.issues) == 20 + 3
+    caplog.clear()
+    run_batch([(mindmap, ini), (other, ini)], 1, 4, report)
+    assert caplog.text.count("is unchanged since the last run") == 2
+
+
+def test_mindmap_listed_twice_is_rejected(fake_jira, mindmap, write_ini, tmp_path):
+    ini = write_ini()
+    other_ini = write_ini("other.ini")
+    report = tmp_path / "report.json"
+    for pairs in [[(mindmap, ini)] * 2, [(mindmap, ini), (mindmap, other_ini)]]:
+        with pytest.raises(SystemExit, match="listed twice"):
+            run_batch(pairs, 1, 4, report)
+    assert fake_jira.total_calls == 0
@@ -0,0 +1,94 @@
+from collections import Counter
+
+import pytest
+
+from jira_freeplane.journal import MARKER_PREFIX
+from jira_freeplane.libjira import JiraInterface
+from jira_freeplane.runtime import mindmap_to_jira
+
+
+def marked(fake_jira):
+    """Issues still carrying a journal label."""
+    return [
+        key
+        for key, fields in fake_jira.issues.items()
+        if any(label.startswith(MARKER_PREFIX) for label in fields.get("labels") or [])
+    ]
+
+
+class Crash(BaseException):
+    """Kills the run like a signal would, nothing catches it."""
+
+
+def test_crash_then_reconcile_creates_no_duplicates(
+    fake_jira, mindmap, make_config, monkeypatch
+):
+    submit_bulk = JiraInterface.submit_bulk
+    calls = []
+
+    def crashing(self, *args, **kwargs):
+        results = submit_bulk(self, *args, **kwargs)
+        calls.append(results)
+        if len(calls) == 3:
+            # jira created the issues, the run dies before storing their keys
+            raise Crash()
+        return results
+
+    monkeypatch.setattr(JiraInterface, "submit_bulk", crashing)
+    with pytest.raises(Crash):
+        mindmap_to_jira(make_config(mindmap))
+    monkeypatch.setattr(JiraInterface, "submit_bulk", submit_bulk)
+    created = len(fake_jira.issues)
+    assert 0 < created < 20
+
+    conf = make_config(mindmap)
+    mindmap_to_jira(conf)
+    assert fake_jira.calls["POST /rest/api/2/search"] == 1
+    assert len(fake_jira.issues) == 20
+    summaries = Counter(fields["summary"] for fields in fake_jira.issues.values())
+    assert max(summaries.values()) == 1
+    stored = [state["key"] for _, state in conf.state.items() if state.get("key")]
+    assert sorted(stored) == sorted(fake_jira.issues)
+    # only the issues reconciled from the crashed run lose their label
+    removed = fake_jira.calls["PUT /rest/api/2/issue/{id}"]
+    assert 0 < removed <= created
+    assert len(marked(fake_jira)) == 20 - removed
+    assert not any(state.get("marker") for _, state in conf.state.items())
+
+
+def test_labels_stay_without_edit_requests(fake_jira, mindmap, make_config):
+    conf = make_config(mindmap)
+    mindmap_to_jira(conf)
+    assert len(fake_jira.issues) == 20
+    assert fake_jira.calls["PUT /rest/api/2/issue/{id}"] == 0
+    assert len(marked(fake_jira)) == 20
+    assert not any(state.get("marker") for _, state in conf.state.items())
+
+
+def test_cleanup_removes_every_label(fake_jira, mindmap, make_config):
+    conf = make_config(mindmap, journal_cleanup="true")
+    mindmap_to_jira(conf)
+    assert fake_jira.calls["PUT /rest/api/2/issue/{id}"] == 20
+    assert marked(fake_jira) == []
+    assert not any(state.get("marker") for _, state in conf.state.items())
+
+
+def test_label_removal_is_retried(fake_jira, mindmap, make_config, monkeypatch):
+    def failing(self, key, fields, update=None):
+        raise RuntimeError("503 Service Unavailable")
+
+    update_issue = JiraInterface.update_issue
+    monkeypatch.setattr(JiraInterface, "update_issue", failing)
+    mindmap_to_jira(make_config(mindmap, journal_cleanup="true"))
+    assert len(marked(fake_jira)) == 20
+    monkeypatch.setattr(JiraInterface, "update_issue", update_issue)
+    mindmap.write_text(mindmap.read_text() + "\n")
+    mindmap_to_jira(make_config(mindmap, journal_cleanup="true"))
+    assert len(fake_jira.issues) == 20
+    assert marked(fake_jira) == []
+
+
+def test_journal_off_sends_no_labels(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap, journal="false"))
+    assert all(not fields.get("labels") for fields in fake_jira.issues.values())
+    assert fake_jira.calls["PUT /rest/api/2/issue/{id}"] == 0
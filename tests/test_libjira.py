@@ -0,0 +1,46 @@
+import json
+
+from jira_freeplane.transport import TransportError
+
+PAYLOADS = [{"summary": "one"}, {"summary": "two"}, {"summary": "three"}]
+
+
+def answer(jira, monkeypatch, status, body):
+    """Make the bulk create request of ``jira`` answer ``body``."""
+
+    def request(method, path, data=None, **kwargs):
+        if status >= 400:
+            raise TransportError(status, json.dumps(body), path)
+        return body
+
+    monkeypatch.setattr(jira, "request", request)
+
+
+def test_bulk_request_error_fails_every_issue(mindmap, make_config, monkeypatch):
+    jira = make_config(mindmap).jira
+    answer(jira, monkeypatch, 400, {"errorMessages": ["Field reporter is invalid"]})
+    results = jira.submit_bulk(PAYLOADS)
+    assert results == [(None, "Field reporter is invalid")] * 3
+
+
+def test_bulk_element_errors(mindmap, make_config, monkeypatch):
+    jira = make_config(mindmap).jira
+    element = {"errorMessages": [], "errors": {"summary": "too long"}}
+    body = {
+        "issues": [{"key": "PROJ-1"}, {"key": "PROJ-2"}],
+        "errors": [{"status": 400, "elementErrors": element, "failedElementNumber": 1}],
+    }
+    answer(jira, monkeypatch, 201, body)
+    assert jira.submit_bulk(PAYLOADS) == [
+        ("PROJ-1", None),
+        (None, '{"summary": "too long"}'),
+        ("PROJ-2", None),
+    ]
+
+
+def test_bulk_response_missing_issues(mindmap, make_config, monkeypatch):
+    jira = make_config(mindmap).jira
+    answer(jira, monkeypatch, 201, {"issues": [{"key": "PROJ-1"}], "errors": []})
+    results = jira.submit_bulk(PAYLOADS)
+    assert results[0] == ("PROJ-1", None)
+    assert results[1:] == [(None, "not in the bulk create response")] * 2
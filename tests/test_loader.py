@@ -0,0 +1,77 @@
+import untangle
+
+from jira_freeplane import loader
+from jira_freeplane.loader import iter_mindmap
+from jira_freeplane.mm import untangle_records
+
+LATE_NOTE = """<map version="freeplane 1.9.0">
+<node TEXT="Root" ID="ID_1">
+<node TEXT="Epic" ID="ID_2" LINK="https://example.com/epic">
+<richcontent TYPE="NOTE">
+<html><head></head><body><p>early note</p></body></html>
+</richcontent>
+<node TEXT="Task" ID="ID_3">
+<node TEXT="Sub-task" ID="ID_4"/>
+<richcontent TYPE="NOTE">
+<html><head></head><body>
+<p>
+  late note
+</p>
+<p>
+  second line
+</p>
+</body></html>
+</richcontent>
+</node>
+</node>
+</node>
+</map>
+"""
+
+
+def records(items):
+    # notes are complete once the whole map has been read, checklist nodes
+    # below sub-tasks have none
+    items = list(items)
+    return [
+        (r.id, r.depth, r.parent_id, r.text, r.link, r.depth <= 3 and r.note.text)
+        for r in items
+    ]
+
+
+def untangled(path):
+    return records(untangle_records(untangle.parse(str(path)).map.node))
+
+
+def test_matches_untangle(mindmap):
+    streamed = records(iter_mindmap(mindmap))
+    assert len(streamed) == 1 + 20 + 12 * 3
+    assert streamed == untangled(mindmap)
+
+
+def test_note_after_children(tmp_path):
+    path = tmp_path / "late.mm"
+    path.write_text(LATE_NOTE)
+    streamed = records(iter_mindmap(path))
+    assert streamed == untangled(path)
+    assert streamed[2][-1] == "\nlate note\nsecond line"
+    assert streamed[1][-1] == "early note"
+
+
+def test_checklist_notes_are_not_read(tmp_path, monkeypatch):
+    path = tmp_path / "checklist.mm"
+    checklist = (
+        '<node TEXT="Sub-task" ID="ID_4"><node TEXT="Check" ID="ID_5">'
+        '<richcontent TYPE="NOTE"><html><body><p>unused</p></body></html>'
+        "</richcontent></node></node>"
+    )
+    path.write_text(LATE_NOTE.replace('<node TEXT="Sub-task" ID="ID_4"/>', checklist))
+    sources = []
+    note_source = loader.note_source
+    monkeypatch.setattr(
+        loader, "note_source", lambda elem: sources.append(1) or note_source(elem)
+    )
+    streamed = list(iter_mindmap(path))
+    assert [r.id for r in streamed] == ["ID_1", "ID_2", "ID_3", "ID_4", "ID_5"]
+    assert not streamed[4].note
+    assert len(sources) == 2
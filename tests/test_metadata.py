@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from jira_freeplane.libjira import JiraInterface
+from jira_freeplane.metadata import file_lock
+from jira_freeplane.schema import clear_schemas
+
+SRC = Path(__file__).absolute().parent.parent / "src"
+
+
+def test_lock_excludes_other_holders(tmp_path):
+    path = tmp_path / "entry.lock"
+    order = []
+    held = threading.Event()
+
+    def other():
+        held.wait()
+        with file_lock(path):
+            order.append("other")
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    with file_lock(path):
+        held.set()
+        thread.join(0.2)
+        order.append("first")
+    thread.join()
+    assert order == ["first", "other"]
+
+
+def test_lock_without_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    with file_lock(tmp_path / "entry.lock"):
+        pass
+
+
+def test_import_without_fcntl():
+    code = "import sys; sys.modules['fcntl'] = None; import jira_freeplane.runtime"
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        env=dict(os.environ, PYTHONPATH=str(SRC)),
+    )
+
+
+def age(path, seconds):
+    then = path.stat().st_mtime - seconds
+    os.utime(path, (then, then))
+
+
+def test_stale_entry_is_revalidated(fake_jira, tmp_path, compiled):
+    JiraInterface(tmp_path, fake_jira.url, transport="rest").schema("PROJ", "Task")
+    jira = JiraInterface(tmp_path, fake_jira.url, transport="rest", metadata_ttl=60)
+    entry = jira.metadata.path("PROJ", "Task")
+    age(entry, 3600)
+    clear_schemas()
+    calls = fake_jira.total_calls
+    jira.schema("PROJ", "Task")
+    # one single field page, and the entry is fresh again
+    assert fake_jira.total_calls == calls + 1
+    assert not jira.metadata.is_stale("PROJ", "Task")
+    # touching the entry keeps the compiled schema
+    assert compiled == ["Task"]
+
+
+def test_changed_entry_is_refetched(fake_jira, tmp_path, compiled):
+    JiraInterface(tmp_path, fake_jira.url, transport="rest").schema("PROJ", "Task")
+    jira = JiraInterface(tmp_path, fake_jira.url, transport="rest", metadata_ttl=60)
+    entry = jira.metadata.path("PROJ", "Task")
+    dat = json.loads(entry.read_text())
+    dat["total"] += 1
+    entry.write_text(json.dumps(dat))
+    age(entry, 3600)
+    clear_schemas()
+    calls = fake_jira.total_calls
+    jira.schema("PROJ", "Task")
+    assert fake_jira.total_calls > calls + 1
+    assert json.loads(entry.read_text())["total"] == dat["total"] - 1
+    # the server is back to the document the schema was compiled from
+    assert compiled == ["Task"]
+
+
+TYPES = ["Epic", "Task", "Sub-task"]
+
+
+def createmeta_calls(fake_jira):
+    return {
+        call: count for call, count in fake_jira.calls.items() if "createmeta" in call
+    }
+
+
+def test_warm_metadata_in_one_request(fake_jira, tmp_path):
+    jira = JiraInterface(
+        tmp_path, fake_jira.url, transport="rest", metadata_api="legacy"
+    )
+    jira.warm_metadata("PROJ", TYPES)
+    assert createmeta_calls(fake_jira) == {"GET /rest/api/2/issue/createmeta": 1}
+    for name in TYPES:
+        assert jira.metadata.path("PROJ", name).exists()
+    # the cache is split per issue type
+    assert jira.field_metadata("PROJ", "Epic")["customfield_10002"]["name"]
+    jira.warm_metadata("PROJ", TYPES)
+    assert sum(createmeta_calls(fake_jira).values()) == 1
+
+
+def test_warm_paged_metadata_concurrently(fake_jira, tmp_path):
+    jira = JiraInterface(tmp_path, fake_jira.url, transport="rest")
+    jira.warm_metadata("PROJ", TYPES)
+    calls = createmeta_calls(fake_jira)
+    assert calls["GET /rest/api/2/issue/createmeta/PROJ/issuetypes/{id}"] == 3
+    fake_jira.calls.clear()
+    fake_jira.latency = 0.2
+    cold = tmp_path / "cold"
+    cold.mkdir()
+    jira = JiraInterface(cold, fake_jira.url, transport="rest")
+    started = time.perf_counter()
+    jira.warm_metadata("PROJ", TYPES)
+    # the issue type list and one round for the three types, not four in a row
+    assert time.perf_counter() - started < 0.7
+    assert sum(createmeta_calls(fake_jira).values()) == 4
@@ -0,0 +1,42 @@
+import json
+import re
+
+from jira_freeplane.runtime import mindmap_to_jira, write_metrics
+
+SAMPLE = re.compile(r"^(\w+)(\{.*\})? (\S+)$")
+
+
+def samples(text):
+    """Samples of a prometheus textfile, by metric name and labels."""
+    found = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        found[(name, labels or "")] = float(value)
+    return found
+
+
+def test_run_report_and_textfile(fake_jira, mindmap, make_config, tmp_path):
+    textfile = tmp_path / "jira_freeplane.prom"
+    conf = make_config(mindmap, metrics_textfile=textfile)
+    mindmap_to_jira(conf)
+    write_metrics(conf, "sync")
+    report = json.loads(conf.metrics_file.read_text())
+    assert report["command"] == "sync"
+    assert report["counters"]["issues_created"] == 20
+    assert {"parse", "metadata", "create"} <= set(report["phases"])
+    assert report["requests"]["total"] == fake_jira.total_calls
+    assert report["requests"]["bytes_sent"] > 0
+
+    text = textfile.read_text()
+    assert "# TYPE jira_freeplane_request_duration_seconds histogram" in text
+    found = samples(text)
+    created = ("jira_freeplane_events_total", '{event="issues_created"}')
+    assert found[created] == 20
+    for path, dct in report["endpoints"].items():
+        labels = f'{{endpoint="{path}"}}'
+        count = found[("jira_freeplane_request_duration_seconds_count", labels)]
+        inf = f'{{endpoint="{path}",le="+Inf"}}'
+        bucket = found[("jira_freeplane_request_duration_seconds_bucket", inf)]
+        assert count == bucket == dct["requests"]
@@ -0,0 +1,70 @@
+from jira_freeplane.loader import iter_mindmap
+from jira_freeplane.mm import node_tree, subtask_body
+
+MAP = """<map version="freeplane 1.9.0">
+<node TEXT="Root" ID="ID_1">
+<node TEXT="Epic" ID="ID_2">
+<node TEXT="Task" ID="ID_3">
+<node TEXT="Sub-task" ID="ID_4" LINK="https://example.com/sub-task">
+<richcontent TYPE="NOTE">
+<html><head></head><body><p>Done when checked</p></body></html>
+</richcontent>
+<node TEXT="Check 1" ID="ID_5">
+<node TEXT="Check 1.1" ID="ID_6" LINK="https://example.com/check"/>
+<node TEXT="Check 1.2" ID="ID_7"/>
+</node>
+<node TEXT="first&#10;second&#10;third" ID="ID_8"/>
+</node>
+<node TEXT="Empty sub-task" ID="ID_9"/>
+</node>
+</node>
+</node>
+</map>
+"""
+
+
+def nodes_of(conf, text):
+    path = conf.mm_file
+    path.write_text(text)
+    return {node.id: node for node in node_tree(conf, iter_mindmap(path))}
+
+
+def test_subtask_body_matches_the_original_rendering(mindmap, make_config):
+    nodes = nodes_of(make_config(mindmap), MAP)
+    # link, checklist lines by relative depth, then the note
+    assert subtask_body(nodes["ID_4"]) == (
+        "\n\nhttps://example.com/sub-task"
+        "\n* Check 1"
+        "\n** [Check 1.1|https://example.com/check]"
+        "\n** Check 1.2"
+        "\n* {code}first\nsecond\nthird{code}"
+        "-----------------------------\n\n\nDone when checked"
+    )
+    assert subtask_body(nodes["ID_9"]) == ""
+
+
+def test_only_issue_nodes_are_materialized(mindmap, make_config):
+    nodes = nodes_of(make_config(mindmap), MAP)
+    assert list(nodes) == ["ID_1", "ID_2", "ID_3", "ID_4", "ID_9"]
+    tree = nodes["ID_4"].tree
+    # checklist nodes only live in the arrays
+    assert len(tree) == 9 and list(tree.nodes) == list(nodes)
+    assert list(tree.depths) == [0, 1, 2, 3, 4, 5, 5, 4, 3]
+    assert list(tree.parents) == [-1, 0, 1, 2, 3, 4, 4, 3, 2]
+    assert tree.checklist(nodes["ID_4"].index) == [
+        "* Check 1",
+        "** [Check 1.1|https://example.com/check]",
+        "** Check 1.2",
+        "* {code}first\nsecond\nthird{code}",
+    ]
+    assert tree.checklist(nodes["ID_9"].index) == []
+
+
+def test_trees_are_scoped_to_a_run(mindmap, make_config):
+    conf = make_config(mindmap)
+    first = nodes_of(conf, MAP)
+    second = nodes_of(conf, MAP.replace('TEXT="Epic"', 'TEXT="Renamed"'))
+    assert first["ID_2"].tree is not second["ID_2"].tree
+    assert first["ID_2"].text == "Epic"
+    assert second["ID_2"].text == "Renamed"
+    assert len(first["ID_2"].tree.nodes) == 5
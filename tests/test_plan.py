@@ -0,0 +1,83 @@
+import pytest
+
+from jira_freeplane.plan import PLAN_VERSION, read_plan, write_plan
+from jira_freeplane.runtime import load_nodes, mindmap_to_jira
+
+HEADER = {"op": "plan", "version": PLAN_VERSION}
+
+
+def test_plan_round_trip(tmp_path):
+    path = tmp_path / "map.plan.jsonl"
+    ops = [{"op": "create", "node": "ID_1"}, {"op": "link", "node": "ID_1"}]
+    counts = write_plan(path, HEADER, iter(ops))
+    assert counts["create"] == 1 and counts["link"] == 1
+    header, read = read_plan(path)
+    assert header == HEADER
+    assert list(read) == ops
+
+
+def test_failed_write_keeps_the_plan(tmp_path):
+    path = tmp_path / "map.plan.jsonl"
+    write_plan(path, HEADER, [{"op": "create", "node": "ID_1"}])
+    before = path.read_text()
+
+    def ops():
+        yield {"op": "create", "node": "ID_2"}
+        raise RuntimeError("planning failed")
+
+    with pytest.raises(RuntimeError):
+        write_plan(path, HEADER, ops())
+    assert path.read_text() == before
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+
+def test_retry_queue_per_mindmap(fake_jira, mindmap, make_config, monkeypatch):
+    create = fake_jira.create
+
+    def failing(fields):
+        if fields["summary"] == "Task 1.2":
+            return None, {"summary": "rejected"}
+        return create(fields)
+
+    monkeypatch.setattr(fake_jira, "create", failing)
+    conf = make_config(mindmap)
+    with pytest.raises(SystemExit, match="Failed to apply"):
+        mindmap_to_jira(conf)
+    assert conf.retry_file.exists()
+    header, ops = read_plan(conf.retry_file)
+    assert header["mm_file"] == str(mindmap)
+    # the failed task and its sub-tasks
+    assert len(list(ops)) == 3
+
+    # another mindmap of the same working directory succeeds
+    monkeypatch.setattr(fake_jira, "create", create)
+    other = mindmap.with_name("other.mm")
+    other.write_text(mindmap.read_text())
+    other_conf = make_config(other)
+    mindmap_to_jira(other_conf)
+    assert other_conf.retry_file != conf.retry_file
+    assert not other_conf.retry_file.exists()
+    assert conf.retry_file.exists()
+
+
+def epic_links(fake_jira):
+    return sorted(
+        (link["outwardIssue"]["key"], link["inwardIssue"]["key"])
+        for link in fake_jira.links
+    )
+
+
+@pytest.mark.parametrize("mode", ["batch", "embed"])
+def test_epics_are_linked_to_the_parent(fake_jira, mindmap, make_config, mode):
+    conf = make_config(mindmap, epic_link_mode=mode)
+    mindmap_to_jira(conf)
+    epics = [node for node in load_nodes(conf) if node.depth == 1]
+    assert all(node.state["is_linked"] for node in epics)
+    # the epic is the outward side, as with the baseline link call
+    parents = [(node.state["key"], "PROJ-0") for node in epics]
+    assert epic_links(fake_jira) == sorted(parents)
+    # embedded links need no request of their own
+    link_calls = fake_jira.calls["POST /rest/api/2/issueLink"]
+    assert link_calls == (2 if mode == "batch" else 0)
+    mindmap_to_jira(make_config(mindmap, epic_link_mode=mode))
+    assert len(fake_jira.links) == 2
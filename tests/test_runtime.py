@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from jira_freeplane import throttle
+from jira_freeplane.runtime import load_config, mindmap_to_jira, plan_mindmap
+from jira_freeplane.throttle import AdaptiveLimit, Throttle
+from jira_freeplane.transport import TransportError
+
+SRC = Path(__file__).absolute().parent.parent / "src"
+
+
+def test_unchanged_rerun_sends_no_requests(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    assert len(fake_jira.issues) == 20
+    before = fake_jira.total_calls
+    mindmap_to_jira(make_config(mindmap))
+    assert fake_jira.total_calls == before
+
+
+def test_saved_without_changes_sends_no_writes(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    before = dict(fake_jira.calls)
+    # a new file digest, the same content
+    mindmap.write_text(mindmap.read_text() + "\n")
+    mindmap_to_jira(make_config(mindmap))
+    writes = {
+        endpoint: count - before.get(endpoint, 0)
+        for endpoint, count in fake_jira.calls.items()
+        if endpoint.split()[0] in ("POST", "PUT") and "search" not in endpoint
+    }
+    assert not any(writes.values())
+
+
+def test_retry_after_is_followed(monkeypatch):
+    clock, waits = [0.0], []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(throttle.time, "sleep", sleep)
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TransportError(429, "Rate limit exceeded", retry_after="7")
+        return "ok"
+
+    # not idempotent: a 429 was never applied, so it is still retried
+    limits = Throttle(max_retries=5)
+    assert limits.call(request, idempotent=False, label="POST /issue") == "ok"
+    assert waits == [7.0, 7.0]
+    assert limits.retries == 2
+
+
+def test_retries_run_out(monkeypatch):
+    monkeypatch.setattr(throttle.time, "sleep", lambda _: None)
+
+    def request():
+        raise TransportError(429, "Rate limit exceeded", retry_after="0")
+
+    with pytest.raises(TransportError):
+        Throttle(max_retries=2).call(request, idempotent=True)
+
+
+def test_throttled_run_creates_every_issue(fake_jira, mindmap, make_config):
+    fake_jira.throttle_every = 4
+    fake_jira.retry_after = 0.01
+    conf = make_config(mindmap)
+    mindmap_to_jira(conf)
+    assert fake_jira.throttled > 0
+    assert len(fake_jira.issues) == 20
+    assert sum(stats.retries for stats in conf.metrics.endpoints.values())
+
+
+@pytest.mark.parametrize("idempotent, calls", [(False, 1), (True, 2)])
+def test_unavailable_is_retried_only_when_idempotent(monkeypatch, idempotent, calls):
+    monkeypatch.setattr(throttle.time, "sleep", lambda _: None)
+    sent = []
+
+    def request():
+        sent.append(1)
+        if len(sent) == 1:
+            # may have been applied, e.g. a bulk create during a reindex
+            raise TransportError(503, "Service Unavailable", retry_after="0")
+        return "ok"
+
+    limits = Throttle(max_retries=5)
+    if idempotent:
+        assert limits.call(request, idempotent, "GET search") == "ok"
+    else:
+        with pytest.raises(TransportError):
+            limits.call(request, idempotent, "POST issue/bulk")
+    assert len(sent) == calls
+
+
+def test_slow_endpoints_do_not_hold_the_limit_back():
+    limit = AdaptiveLimit(8)
+    limit.limit = 4.0
+    limit.acquire()
+    limit.release(0.01, False, "GET search")
+    for _ in range(8):
+        limit.acquire()
+        # a bulk create is slow compared to a search, but not to itself
+        limit.release(0.5, False, "POST issue/bulk")
+    assert limit.limit > 5
+    limit.acquire()
+    limit.release(5.0, False, "POST issue/bulk")
+    grown = limit.limit
+    limit.acquire()
+    limit.release(5.0, False, "POST issue/bulk")
+    assert limit.limit == grown
+
+
+def test_import_loads_no_heavy_dependencies():
+    heavy = ["jira", "requests", "simple_term_menu", "yaml", "untangle"]
+    code = (
+        "import json, sys; import jira_freeplane.runtime; "
+        f"print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith("JIRA_")}
+    env["PYTHONPATH"] = str(SRC)
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, check=True, capture_output=True
+    )
+    assert json.loads(out.stdout) == []
+
+
+def test_credentials_are_checked_on_first_use(
+    fake_jira, mindmap, make_config, monkeypatch, tmp_path
+):
+    mindmap_to_jira(make_config(mindmap))
+    for name in ["JIRA_USER", "JIRA_PASS", "JIRA_TOKEN"]:
+        monkeypatch.delenv(name, raising=False)
+    calls = fake_jira.total_calls
+    args = argparse.Namespace(config=str(tmp_path / "project.ini"), interactive=False)
+    conf = load_config(args, mindmap, offline=True)
+    try:
+        plan_mindmap(conf, tmp_path / "map.plan.jsonl")
+    finally:
+        conf.state.close()
+        conf.jira.close()
+    assert (tmp_path / "map.plan.jsonl").exists()
+    assert fake_jira.total_calls == calls
+    # a cold metadata cache needs jira, and so the credentials
+    with pytest.raises(SystemExit, match="JIRA_USER, JIRA_PASS or JIRA_TOKEN"):
+        make_config(mindmap, working_dir=tmp_path / "cold")
@@ -0,0 +1,65 @@
+import itertools
+import threading
+
+from jira_freeplane.runtime import mindmap_to_jira
+from jira_freeplane.scheduler import Job, Scheduler
+
+
+class FakeBulk:
+    """submit_bulk of a jira, recording the order issues are created in."""
+
+    def __init__(self):
+        self.created = []
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit_bulk(self, payloads, updates):
+        results = []
+        with self._lock:
+            for payload in payloads:
+                key = f"PROJ-{next(self._keys)}"
+                self.created.append((payload["ref"], payload["parent"], key))
+                results.append((key, None))
+        return results
+
+
+class RecordJob(Job):
+    def build(self, parent_key):
+        return {"ref": self.ref, "parent": parent_key}
+
+    def created(self, key):
+        pass
+
+
+def test_children_wait_for_their_parent():
+    # streamed children first, so the scheduler has to hold them back
+    jobs = [RecordJob(f"sub{i}", f"task{i % 3}", "sub") for i in range(9)]
+    jobs += [RecordJob(f"task{i}", "epic", "task") for i in range(3)]
+    jobs += [RecordJob("epic", None, "epic")]
+    jira = FakeBulk()
+    scheduler = Scheduler(jira, workers=4)  # type: ignore
+    scheduler.run(jobs)
+    created = {ref: key for ref, _, key in jira.created}
+    assert len(created) == len(jobs)
+    seen = set()
+    for ref, parent, key in jira.created:
+        job = next(job for job in jobs if job.ref == ref)
+        if job.parent_ref is not None:
+            assert job.parent_ref in seen
+            assert parent == created[job.parent_ref]
+        seen.add(ref)
+
+
+def test_parents_created_first_in_jira(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    # the fake numbers keys in creation order
+    number = {key: int(key.split("-")[1]) for key in fake_jira.issues}
+    children = 0
+    for key, fields in fake_jira.issues.items():
+        # sub-tasks name their task, tasks their epic
+        parent = (fields.get("parent") or {}).get("key")
+        parent = parent or fields.get("customfield_10001")
+        if parent:
+            children += 1
+            assert number[parent] < number[key]
+    assert children == 6 + 12
@@ -0,0 +1,56 @@
+import pytest
+
+from jira_freeplane.libjira import JiraInterface
+from jira_freeplane.runtime import mindmap_to_jira
+from jira_freeplane.schema import clear_schemas
+
+
+def client(fake_jira, tmp_path):
+    return JiraInterface(tmp_path, fake_jira.url, transport="rest")
+
+
+def test_schema_is_compiled_once(fake_jira, tmp_path, compiled):
+    jira = client(fake_jira, tmp_path)
+    schema = jira.schema("PROJ", "Task")
+    assert jira.schema("PROJ", "Task") is schema
+    assert compiled == ["Task"]
+    spec = schema.by_name["Component/s"]
+    assert spec.is_array and spec.allowed_values == {"api": "1", "ui": "2"}
+    assert schema.by_id["reporter"].is_user
+
+
+def test_compiled_schema_is_persisted(fake_jira, tmp_path, compiled):
+    schema = client(fake_jira, tmp_path).schema("PROJ", "Task")
+    clear_schemas()
+    calls = fake_jira.total_calls
+    # a new process, with the createmeta and compiled schema on disk
+    loaded = client(fake_jira, tmp_path).schema("PROJ", "Task")
+    assert loaded is not schema
+    assert loaded.fields == schema.fields
+    assert compiled == ["Task"]
+    assert fake_jira.total_calls == calls
+
+
+def test_payload_encodes_template_once(fake_jira, tmp_path):
+    template = client(fake_jira, tmp_path).payload_template(
+        {"Project": "PROJ", "Issue Type": "Task", "Component/s": ["api"]}
+    )
+    payload = template.encode({"Summary": "one"})
+    assert payload == {
+        "project": {"key": "PROJ"},
+        "issuetype": {"name": "Task"},
+        "components": [{"id": "1"}],
+        "summary": "one",
+    }
+    # the template is not changed by the overlay
+    assert "summary" not in template.encode({})
+
+
+def test_invalid_template_fails_before_any_write(
+    fake_jira, mindmap, make_config, write_templates, tmp_path
+):
+    write_templates(tmp_path / "wd", task="Component/s:\n- nope\n")
+    with pytest.raises(SystemExit, match="'nope' is not in allowed values"):
+        mindmap_to_jira(make_config(mindmap))
+    assert fake_jira.issues == {}
+    assert not [call for call in fake_jira.calls if call.split()[0] != "GET"]
@@ -0,0 +1,30 @@
+from jira_freeplane.runtime import mindmap_to_jira
+from jira_freeplane.state import IniStateStore, open_state_store
+
+
+def test_ini_state_migrates_to_sqlite(tmp_path):
+    ini = IniStateStore(tmp_path)
+    ini.put("ID_1", {"key": "PROJ-1", "is_linked": True, "content_hash": "abc"})
+    ini.put("ID_2", {"key": "PROJ-2"})
+    ini.set_meta("mm_hash", "123")
+    ini.commit()
+    store = open_state_store("sqlite", tmp_path)
+    try:
+        assert tmp_path.joinpath("state.db").exists()
+        assert not tmp_path.joinpath("state.db.tmp").exists()
+        assert store.get("ID_1")["key"] == "PROJ-1"
+        assert store.get("ID_1")["is_linked"]
+        assert store.get("ID_1")["content_hash"] == "abc"
+        assert store.get("ID_2")["key"] == "PROJ-2"
+        assert not store.get("ID_2")["is_linked"]
+        assert store.get_meta("mm_hash") == "123"
+    finally:
+        store.close()
+
+
+def test_issues_of_ini_state_are_not_recreated(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap, state_backend="ini"))
+    issues = dict(fake_jira.issues)
+    mindmap.write_text(mindmap.read_text() + "\n")
+    mindmap_to_jira(make_config(mindmap, state_backend="sqlite"))
+    assert fake_jira.issues == issues
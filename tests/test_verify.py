@@ -0,0 +1,86 @@
+import pytest
+
+from jira_freeplane.loader import iter_mindmap
+from jira_freeplane.mm import node_tree
+from jira_freeplane.runtime import mindmap_to_jira, verify_mindmap
+from jira_freeplane.verify import verify_issues
+
+
+# ids of the fake jira fields only set on epics, tasks and sub-tasks
+EPIC_NAME, EPIC_LINK, PARENT = "customfield_10002", "customfield_10001", "parent"
+
+
+def issues_with(fake_jira, field_id):
+    """Keys of the issues that have a value for a field."""
+    return [key for key, fields in fake_jira.issues.items() if fields.get(field_id)]
+
+
+def problems_of(conf):
+    return verify_issues(conf, node_tree(conf, iter_mindmap(conf.mm_file)))
+
+
+def test_verify_finds_every_issue(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    verify_mindmap(make_config(mindmap))
+    assert fake_jira.calls["POST /rest/api/2/search"] == 1
+
+
+def test_verify_reports_missing_and_moved(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    subtasks = issues_with(fake_jira, PARENT)
+    deleted = subtasks[0]
+    fake_jira.issues.pop(deleted)
+    task = fake_jira.issues[subtasks[1]]["parent"]["key"]
+    moved = fake_jira.move(task, "OPS")
+
+    problems = problems_of(make_config(mindmap))
+    assert len(problems["missing"]) == 1
+    assert problems["missing"][0].startswith(f"{deleted} does not exist")
+    assert len(problems["moved"]) == 1
+    assert problems["moved"][0].startswith(f"{task} was moved to {moved}")
+    # the sub-tasks of the moved task still have the right parent
+    assert problems["mismatched"] == []
+
+    with pytest.raises(SystemExit, match="1 missing, 1 moved, 0 mismatched"):
+        verify_mindmap(make_config(mindmap))
+
+
+def test_verify_reports_other_parent(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    subtask = issues_with(fake_jira, PARENT)[0]
+    fake_jira.issues[subtask]["parent"] = {"key": "PROJ-999"}
+    problems = problems_of(make_config(mindmap))
+    assert len(problems["mismatched"]) == 1
+    assert problems["mismatched"][0].startswith(f"{subtask} has parent PROJ-999")
+
+
+def test_verify_reports_other_epic(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    task = issues_with(fake_jira, EPIC_LINK)[0]
+    epic = fake_jira.issues[task][EPIC_LINK]
+    fake_jira.issues[task][EPIC_LINK] = "PROJ-999"
+    problems = problems_of(make_config(mindmap))
+    assert len(problems["mismatched"]) == 1
+    assert problems["mismatched"][0].startswith(f"{task} has epic PROJ-999, not {epic}")
+
+
+def test_verify_reports_unlinked_epic(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    epic = issues_with(fake_jira, EPIC_NAME)[0]
+    fake_jira.links = [
+        link
+        for link in fake_jira.links
+        if epic not in (link["inwardIssue"]["key"], link["outwardIssue"]["key"])
+    ]
+    problems = problems_of(make_config(mindmap))
+    assert len(problems["mismatched"]) == 1
+    assert problems["mismatched"][0].startswith(f"{epic} is not linked to PROJ-0")
+
+
+def test_verify_accepts_moved_epic(fake_jira, mindmap, make_config):
+    mindmap_to_jira(make_config(mindmap))
+    epic = issues_with(fake_jira, EPIC_NAME)[0]
+    fake_jira.move(epic, "OPS")
+    problems = problems_of(make_config(mindmap))
+    assert len(problems["moved"]) == 1
+    assert problems["mismatched"] == []
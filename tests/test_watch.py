@@ -0,0 +1,79 @@
+import pytest
+
+from jira_freeplane import runtime, watch
+from jira_freeplane.runtime import watch_mindmap
+from jira_freeplane.watch import watch_changes
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time of the watch module, sleeping advances it."""
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(watch.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    return now
+
+
+def test_burst_of_saves_is_synced_once(tmp_path, clock, monkeypatch):
+    def signature(_):
+        # saved at 5s and 6s, then left alone
+        if clock[0] < 5:
+            return (1, 10)
+        if clock[0] < 6:
+            return (2, 10)
+        return (3, 12)
+
+    monkeypatch.setattr(watch, "file_signature", signature)
+    changes = watch_changes(tmp_path / "map.mm", interval=1.0, debounce=2.0)
+    next(changes)
+    assert clock[0] == 0
+    next(changes)
+    # 2s after the last save
+    assert clock[0] == 8
+
+
+def test_removed_file_is_not_synced(tmp_path, clock, monkeypatch):
+    def signature(_):
+        # removed at 2s, written again at 10s
+        if clock[0] < 2:
+            return (1, 10)
+        if clock[0] < 10:
+            return None
+        return (2, 10)
+
+    monkeypatch.setattr(watch, "file_signature", signature)
+    changes = watch_changes(tmp_path / "map.mm", interval=1.0, debounce=2.0)
+    next(changes)
+    next(changes)
+    assert clock[0] == 12
+
+
+def test_saves_sync_only_changed_nodes(fake_jira, mindmap, make_config, monkeypatch):
+    planned = []
+    plan_ops = runtime.plan_ops
+
+    def recording(conf, nodes):
+        planned.append([node.text for node in nodes])
+        return plan_ops(conf, nodes)
+
+    def saves(path, interval, debounce):
+        yield
+        path.write_text(path.read_text().replace('"Task 1.2"', '"Task 1.2 renamed"'))
+        yield
+        # saved again without changes
+        path.write_text(path.read_text() + "\n")
+        yield
+
+    monkeypatch.setattr(runtime, "plan_ops", recording)
+    monkeypatch.setattr(runtime, "watch_changes", saves)
+    watch_mindmap(make_config(mindmap), 1.0, 2.0)
+    assert len(planned[0]) == 20
+    assert planned[1:] == [["Task 1.2 renamed"]]
+    assert len(fake_jira.issues) == 20
+    assert fake_jira.calls["PUT /rest/api/2/issue/{id}"] == 1
+    summaries = [fields["summary"] for fields in fake_jira.issues.values()]
+    assert summaries.count("Task 1.2 renamed") == 1